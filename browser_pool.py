@@ -0,0 +1,265 @@
+import asyncio
+import time
+
+try:
+    import psutil
+    ENABLE_PSUTIL = True
+except ImportError:
+    ENABLE_PSUTIL = False
+    print("警告: 未安装psutil库，无法按内存占用回收浏览器上下文")
+
+# 各查询类型对应的查询页面
+QUERY_PAGE_URLS = {
+    1: "https://cx.mem.gov.cn/special?index=0",
+    2: "https://cx.mem.gov.cn/safety?index=1"
+}
+
+def get_browser_rss_bytes() -> int:
+    """
+    获取浏览器相关进程的常驻内存总量（字节）
+
+    Playwright驱动和浏览器进程都是当前进程的子进程，未安装psutil时返回0
+    """
+    if not ENABLE_PSUTIL:
+        return 0
+
+    total = 0
+    try:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    except Exception:
+        return 0
+    return total
+
+class RssRecycleGate:
+    """
+    按浏览器内存占用回收上下文的节流与滞回
+
+    浏览器内存是整个进程树的总量，回收一个上下文通常不能使其立即降到上限以下；
+    因此超过上限后每隔 recycle_interval 秒最多回收一个上下文，直到内存降到 low_watermark 倍上限以下才解除，
+    内存只每隔 probe_interval 秒遍历一次进程树测量
+    """
+
+    def __init__(self, max_rss_bytes: int, probe_interval: float = 5.0, recycle_interval: float = 30.0,
+                 low_watermark: float = 0.9):
+        """
+        Args:
+            max_rss_bytes: 浏览器进程内存上限（字节），需要psutil
+            probe_interval: 两次测量内存的最短间隔（秒）
+            recycle_interval: 超过上限时两次按内存回收的最短间隔（秒）
+            low_watermark: 内存降到上限的该比例以下时解除回收状态
+        """
+        self.max_rss_bytes = max_rss_bytes
+        self.probe_interval = probe_interval
+        self.recycle_interval = recycle_interval
+        self.low_watermark = low_watermark
+        self._rss = 0
+        self._last_probe = None
+        self._last_recycle = None
+        self._over_limit = False
+        self.stats = {'probes': 0, 'memory_recycles': 0}
+
+    def should_recycle(self) -> bool:
+        """是否应因内存占用回收一个上下文（返回True即计为一次回收）"""
+        now = time.monotonic()
+        if self._last_probe is None or now - self._last_probe >= self.probe_interval:
+            self._rss = get_browser_rss_bytes()
+            self._last_probe = now
+            self.stats['probes'] += 1
+            if self._rss >= self.max_rss_bytes:
+                self._over_limit = True
+            elif self._rss < self.max_rss_bytes * self.low_watermark:
+                self._over_limit = False
+        if not self._over_limit:
+            return False
+        if self._last_recycle is not None and now - self._last_recycle < self.recycle_interval:
+            return False
+        self._last_recycle = now
+        self.stats['memory_recycles'] += 1
+        return True
+
+def should_recycle(query_count: int, max_queries: int = None, rss_gate: RssRecycleGate = None) -> bool:
+    """判断上下文是否达到回收条件（查询次数，或由 rss_gate 节流判断的浏览器内存占用）"""
+    if max_queries and query_count >= max_queries:
+        return True
+    if rss_gate and rss_gate.should_recycle():
+        return True
+    return False
+
+async def park_page(page, query_type: int):
+    """将页面预先停靠在指定查询类型的查询页面上"""
+    url = QUERY_PAGE_URLS.get(query_type)
+    if not url:
+        return
+    try:
+        await page.goto(url)
+        await page.wait_for_load_state("networkidle")
+    except Exception as e:
+        print(f"预热查询页面失败 ({url}): {e}")
+
+class BrowserPoolExhaustedError(Exception):
+    """上下文池中的上下文全部重建失败，已没有可用的上下文"""
+
+class PooledContext:
+    """
+    连接池中的一个浏览器上下文及其页面
+    """
+
+    def __init__(self, context, page, query_type: int):
+        self.context = context
+        self.page = page
+        self.query_type = query_type
+        self.query_count = 0
+        self.created_at = time.time()
+
+class BrowserContextPool:
+    """
+    浏览器上下文池
+    持有预热好的上下文和页面（已停靠在 special/safety 查询页），按查询分配页面，
+    并在达到查询次数或内存上限后回收重建上下文，使长时间批量查询的延迟保持平稳
+    """
+
+    def __init__(self, context_factory, size: int = 2, query_types: tuple = (1, 2),
+                 max_queries_per_context: int = 200, max_rss_bytes: int = None):
+        """
+        Args:
+            context_factory: 异步工厂函数，返回新的 (context, page)
+            size: 池中上下文数量
+            query_types: 预热时停靠的查询类型（轮流分配）
+            max_queries_per_context: 单个上下文最多服务的查询次数
+            max_rss_bytes: 浏览器进程内存上限（字节），需要psutil；超过后按 RssRecycleGate 的节流逐个回收
+        """
+        self.context_factory = context_factory
+        self.size = size
+        self.query_types = query_types
+        self.max_queries_per_context = max_queries_per_context
+        self.max_rss_bytes = max_rss_bytes
+        self.rss_gate = RssRecycleGate(max_rss_bytes) if max_rss_bytes else None
+
+        self._idle = []
+        # 可用上下文数量（重建失败的上下文不再计入）
+        self.capacity = size
+        self._condition = asyncio.Condition()
+        self._recycle_tasks = set()
+        self._closed = False
+
+        self.stats = {
+            'created_contexts': 0,
+            'recycled_contexts': 0,
+            'served_queries': 0,
+            'warm_hits': 0,
+            'lost_contexts': 0
+        }
+
+    async def _create_slot(self, query_type: int) -> PooledContext:
+        context, page = await self.context_factory()
+        await park_page(page, query_type)
+        self.stats['created_contexts'] += 1
+        return PooledContext(context, page, query_type)
+
+    async def start(self):
+        """预热所有上下文"""
+        slots = await asyncio.gather(*(
+            self._create_slot(self.query_types[index % len(self.query_types)])
+            for index in range(self.size)
+        ))
+        async with self._condition:
+            self._idle.extend(slots)
+            self._condition.notify_all()
+        print(f"浏览器上下文池已就绪: {self.size} 个预热上下文")
+
+    async def acquire(self, query_type: int) -> PooledContext:
+        """
+        获取一个空闲上下文，优先返回已停靠在对应查询页面的上下文
+
+        Raises:
+            BrowserPoolExhaustedError: 所有上下文都已重建失败
+        """
+        async with self._condition:
+            while not self._idle:
+                if self.capacity <= 0:
+                    raise BrowserPoolExhaustedError(f"{self.size} 个浏览器上下文全部重建失败")
+                await self._condition.wait()
+
+            for slot in self._idle:
+                if slot.query_type == query_type:
+                    self._idle.remove(slot)
+                    self.stats['warm_hits'] += 1
+                    return slot
+            return self._idle.pop(0)
+
+    async def release(self, slot: PooledContext, query_type: int = None):
+        """
+        归还上下文；达到回收条件时在后台重建，避免阻塞当前查询
+        """
+        slot.query_count += 1
+        self.stats['served_queries'] += 1
+        if query_type is not None:
+            slot.query_type = query_type
+
+        if not self._closed and should_recycle(slot.query_count, self.max_queries_per_context, self.rss_gate):
+            task = asyncio.ensure_future(self._recycle(slot))
+            self._recycle_tasks.add(task)
+            task.add_done_callback(self._recycle_tasks.discard)
+            return
+
+        async with self._condition:
+            self._idle.append(slot)
+            self._condition.notify()
+
+    async def _recycle(self, slot: PooledContext):
+        """关闭旧上下文并创建新的预热上下文；多次重建失败时缩小池容量，容量为0时唤醒等待者报错"""
+        print(f"回收浏览器上下文（已服务 {slot.query_count} 次查询）")
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+        new_slot = None
+        for attempt in range(3):
+            try:
+                new_slot = await self._create_slot(slot.query_type)
+                self.stats['recycled_contexts'] += 1
+                break
+            except Exception as e:
+                print(f"第 {attempt + 1} 次重建浏览器上下文失败: {e}")
+                await asyncio.sleep(1)
+        if not new_slot:
+            async with self._condition:
+                self.capacity -= 1
+                self.stats['lost_contexts'] += 1
+                print(f"浏览器上下文重建失败，上下文池可用数量降为 {self.capacity}/{self.size}")
+                self._condition.notify_all()
+            return
+
+        async with self._condition:
+            if self._closed:
+                await new_slot.context.close()
+                return
+            self._idle.append(new_slot)
+            self._condition.notify()
+
+    def get_statistics(self) -> dict:
+        """获取上下文池统计信息"""
+        stats = self.stats.copy()
+        stats['capacity'] = self.capacity
+        if self.rss_gate:
+            stats.update(self.rss_gate.stats)
+        stats['browser_rss_bytes'] = get_browser_rss_bytes()
+        return stats
+
+    async def close(self):
+        """关闭池中所有上下文"""
+        self._closed = True
+        if self._recycle_tasks:
+            await asyncio.gather(*self._recycle_tasks, return_exceptions=True)
+        async with self._condition:
+            slots, self._idle = self._idle, []
+        for slot in slots:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线验证码识别基准测试
+在已标注的验证码图片目录上运行 recognize_with_multiple_methods 的每个预处理方法/模型组合，
+统计各组合及整体识别的准确率、p50/p95耗时，并给出各组合的边际价值矩阵，用于裁剪又慢又无用的组合；
+同时以2折交叉验证评估字符模板快速识别及其与级联识别组合后的准确率和耗时，
+并按置信度分箱统计实际准确率（检验模型概率置信度是否可靠）
+
+标注方式（任选其一）：
+  1. 目录下的 labels.csv，两列：文件名,验证码
+  2. 文件名以验证码开头，例如 4821.png、4821_20240101.png
+
+用法: python captcha_benchmark.py [图片目录] [结果JSON路径]
+"""
+
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from digit_classifier import DigitClassifier
+from enhanced_captcha_recognizer import (AdaptiveComboPolicy, ConfidenceCalibrator, EnhancedCaptchaRecognizer,
+                                         PREPROCESS_METHODS)
+
+LABEL_FILE = 'labels.csv'
+FILENAME_LABEL_PATTERN = re.compile(r'^(\d{4})(?:[_\-.]|$)')
+
+def load_labeled_samples(image_dir: str) -> list:
+    """
+    读取已标注的验证码样本
+
+    Returns:
+        [(文件名, 标注, 图像数据), ...]，未标注的图片被跳过
+    """
+    labels = {}
+    label_path = os.path.join(image_dir, LABEL_FILE)
+    if os.path.exists(label_path):
+        with open(label_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[1].strip().isdigit():
+                    labels[row[0].strip()] = row[1].strip()
+
+    samples = []
+    skipped = 0
+    for path in sorted(glob.glob(os.path.join(image_dir, '*.png'))):
+        filename = os.path.basename(path)
+        label = labels.get(filename)
+        if label is None:
+            match = FILENAME_LABEL_PATTERN.match(filename)
+            label = match.group(1) if match else None
+        if label is None:
+            skipped += 1
+            continue
+        with open(path, 'rb') as f:
+            samples.append((filename, label, f.read()))
+
+    if skipped:
+        print(f"跳过 {skipped} 张未标注的图片")
+    return samples
+
+def percentile(values: list, p: float) -> float:
+    """计算百分位数（线性插值）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(values: list) -> dict:
+    """耗时统计（毫秒）"""
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0
+    }
+
+def run_combinations(recognizer: EnhancedCaptchaRecognizer, image_data: bytes) -> dict:
+    """
+    对单张验证码运行全部方法/模型组合
+
+    Returns:
+        {组合名: (4位数字结果或None, 置信度, 单独运行该组合的耗时)}，
+        耗时包含解码、该方法的预处理和模型推理
+    """
+    decode_start = time.perf_counter()
+    image = recognizer.decode_image(image_data)
+    decode_time = time.perf_counter() - decode_start
+    if image is None:
+        return {}
+
+    outcomes = {}
+    for method in PREPROCESS_METHODS:
+        preprocess_start = time.perf_counter()
+        processed = recognizer.preprocess_array(image, method)
+        model_input = recognizer._to_model_input(processed)
+        preprocess_time = time.perf_counter() - preprocess_start
+
+        for model_name in recognizer.ocr_models:
+            classify_start = time.perf_counter()
+            try:
+                result, confidence = recognizer._recognize_digits(model_name, model_input, processed)
+            except Exception:
+                result, confidence = None, 0.0
+            elapsed = decode_time + preprocess_time + time.perf_counter() - classify_start
+            outcomes[f"{method}_{model_name}"] = (result, confidence, elapsed)
+    return outcomes
+
+def vote(recognizer: EnhancedCaptchaRecognizer, outcomes: dict, combos: list):
+    """按 recognize_with_multiple_methods 的一致性规则，对指定组合的结果投票"""
+    results = [
+        (outcomes[combo][0], outcomes[combo][1], combo)
+        for combo in combos if combo in outcomes and outcomes[combo][0]
+    ]
+    if not results:
+        return None
+    with contextlib.redirect_stdout(io.StringIO()):
+        final_result, _ = recognizer._analyze_consistency_and_boost_confidence(results)
+    return final_result
+
+def reliability_table(confidences: list, corrects: list, bins: int = 5) -> list:
+    """按置信度分箱统计样本数、平均置信度和实际准确率"""
+    table = []
+    for index in range(bins):
+        low, high = index / bins, (index + 1) / bins
+        members = [(confidence, correct) for confidence, correct in zip(confidences, corrects)
+                   if low <= confidence < high or (index == bins - 1 and confidence == 1.0)]
+        if members:
+            table.append({
+                'range': f"{low:.1f}-{high:.1f}",
+                'count': len(members),
+                'mean_confidence': round(sum(confidence for confidence, _ in members) / len(members), 4),
+                'accuracy': round(sum(correct for _, correct in members) / len(members), 4)
+            })
+    return table
+
+def run_end_to_end(samples: list, cascade: bool) -> tuple:
+    """
+    以实际调用方式运行 recognize_with_multiple_methods（不使用快速识别），统计准确率和耗时
+
+    Returns:
+        (统计摘要, [(识别结果, 耗时), ...])
+    """
+    # 使用不读写文件的新策略和校准器，避免受线上学习结果影响（置信度即模型原始置信度）
+    recognizer = EnhancedCaptchaRecognizer(save_images=False, cascade=cascade, fast_path=False,
+                                           combo_policy=AdaptiveComboPolicy(weights_path=None),
+                                           calibrator=ConfidenceCalibrator(path=None))
+    outcomes = []
+    confidences = []
+    for _, label, image_data in samples:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result, confidence = recognizer.recognize_with_multiple_methods(image_data)
+        outcomes.append((result, time.perf_counter() - start))
+        confidences.append(confidence if result else 0.0)
+
+    corrects = [result == label for (result, _), (_, label, _) in zip(outcomes, samples)]
+    accepted = [correct for confidence, correct in zip(confidences, corrects)
+                if confidence >= recognizer.min_confidence]
+    summary = {
+        'accuracy': round(sum(corrects) / len(samples), 4),
+        # 低于阈值的结果不提交而直接刷新：提交比例及提交结果的准确率
+        'submit_rate': round(len(accepted) / len(samples), 4),
+        'submitted_accuracy': round(sum(accepted) / len(accepted), 4) if accepted else 0.0,
+        'reliability': reliability_table(confidences, corrects)
+    }
+    summary.update(latency_summary([elapsed for _, elapsed in outcomes]))
+    return summary, outcomes
+
+def evaluate_fast_path(samples: list, fallback_outcomes: list, margin: float) -> dict:
+    """
+    2折交叉验证评估字符模板快速识别：用一半样本训练模板，识别另一半
+
+    Args:
+        samples: 已标注样本
+        fallback_outcomes: 每个样本级联识别的 (识别结果, 耗时)，快速识别间隔不足时使用
+        margin: 快速识别结果被采用所需的最小近邻间隔
+
+    Returns:
+        快速识别单独及与级联识别组合后的准确率、覆盖率和耗时
+    """
+    images = [EnhancedCaptchaRecognizer.decode_image(image_data) for _, _, image_data in samples]
+    folds = [list(range(0, len(samples), 2)), list(range(1, len(samples), 2))]
+
+    fast = {}
+    for train, test in ((folds[0], folds[1]), (folds[1], folds[0])):
+        classifier = DigitClassifier(templates_path=None)
+        for index in train:
+            classifier.add_example(images[index], samples[index][1])
+        for index in test:
+            start = time.perf_counter()
+            result, result_margin = classifier.classify(images[index])
+            fast[index] = (result, result_margin, time.perf_counter() - start)
+
+    accepted = [index for index, (result, result_margin, _) in fast.items() if result and result_margin >= margin]
+    hybrid_correct = 0
+    hybrid_latencies = []
+    for index, (_, label, _) in enumerate(samples):
+        if index in accepted:
+            result, _, elapsed = fast[index]
+        else:
+            # 间隔不足：快速识别的耗时加上级联识别的耗时
+            result, elapsed = fallback_outcomes[index]
+            elapsed += fast[index][2]
+        hybrid_correct += result == label
+        hybrid_latencies.append(elapsed)
+
+    fast_path = {
+        'margin': margin,
+        'segmented': round(sum(result is not None for result, _, _ in fast.values()) / len(samples), 4),
+        'accuracy': round(sum(fast[index][0] == samples[index][1] for index in fast) / len(samples), 4),
+        'coverage': round(len(accepted) / len(samples), 4),
+        'accepted_accuracy': round(
+            sum(fast[index][0] == samples[index][1] for index in accepted) / len(accepted), 4
+        ) if accepted else 0.0
+    }
+    fast_path.update(latency_summary([elapsed for _, _, elapsed in fast.values()]))
+    hybrid = {'accuracy': round(hybrid_correct / len(samples), 4)}
+    hybrid.update(latency_summary(hybrid_latencies))
+    return {'fast_path': fast_path, 'hybrid': hybrid}
+
+def benchmark(image_dir: str, fast_path_margin: float = 0.25) -> dict:
+    """
+    运行离线基准测试
+
+    Args:
+        image_dir: 已标注验证码图片目录
+        fast_path_margin: 快速识别结果被采用所需的最小近邻间隔
+
+    Returns:
+        报告字典；没有已标注样本时返回None
+    """
+    samples = load_labeled_samples(image_dir)
+    if not samples:
+        print(f"{image_dir} 中没有已标注的验证码图片")
+        return None
+
+    recognizer = EnhancedCaptchaRecognizer(save_images=False, combo_policy=AdaptiveComboPolicy(weights_path=None))
+    combos = [f"{method}_{model_name}" for method in PREPROCESS_METHODS for model_name in recognizer.ocr_models]
+
+    # 预热：触发模型加载，避免计入第一张图片的耗时
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_combinations(recognizer, samples[0][2])
+
+    per_sample = []
+    for filename, label, image_data in samples:
+        outcomes = run_combinations(recognizer, image_data)
+        per_sample.append((filename, label, outcomes))
+
+    total = len(per_sample)
+    correct = {combo: [bool(outcomes.get(combo)) and outcomes[combo][0] == label
+                       for _, label, outcomes in per_sample] for combo in combos}
+
+    combo_report = {}
+    for combo in combos:
+        latencies = [outcomes[combo][2] for _, _, outcomes in per_sample if combo in outcomes]
+        combo_report[combo] = {'accuracy': round(sum(correct[combo]) / total, 4)}
+        combo_report[combo].update(latency_summary(latencies))
+
+    def ensemble_accuracy(selected: list) -> float:
+        hits = sum(vote(recognizer, outcomes, selected) == label for _, label, outcomes in per_sample)
+        return hits / total
+
+    # 边际价值：全部组合投票的准确率减去去掉该组合后的准确率
+    full_accuracy = ensemble_accuracy(combos)
+    for combo in combos:
+        without = ensemble_accuracy([other for other in combos if other != combo])
+        combo_report[combo]['marginal_accuracy'] = round(full_accuracy - without, 4)
+
+    # 边际价值矩阵：行组合识别正确、列组合识别错误的样本比例（行组合相对列组合的独有贡献）
+    matrix = {
+        row: {
+            column: round(sum(r and not c for r, c in zip(correct[row], correct[column])) / total, 4)
+            for column in combos
+        }
+        for row in combos
+    }
+
+    oracle_accuracy = sum(any(correct[combo][index] for combo in combos) for index in range(total)) / total
+
+    full_summary, _ = run_end_to_end(samples, cascade=False)
+    cascade_summary, cascade_outcomes = run_end_to_end(samples, cascade=True)
+
+    return {
+        'image_dir': image_dir,
+        'sample_count': total,
+        'combinations': combo_report,
+        'marginal_matrix': matrix,
+        'ensemble': {
+            'all_combinations_vote_accuracy': round(full_accuracy, 4),
+            'oracle_accuracy': round(oracle_accuracy, 4),
+            'full': full_summary,
+            'cascade': cascade_summary
+        },
+        'fast_path': evaluate_fast_path(samples, cascade_outcomes, fast_path_margin),
+        'failures': [
+            {'file': filename, 'label': label,
+             'results': {combo: outcomes[combo][0] for combo in combos if combo in outcomes}}
+            for filename, label, outcomes in per_sample
+            if vote(recognizer, outcomes, combos) != label
+        ],
+        'test_timestamp': datetime.now().isoformat()
+    }
+
+def print_report(report: dict):
+    """打印基准测试摘要"""
+    print("\n" + "=" * 70)
+    print("验证码识别离线基准测试")
+    print("=" * 70)
+    print(f"样本数量: {report['sample_count']}")
+
+    print(f"\n{'组合':<26}{'准确率':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'边际价值':>10}")
+    ranked = sorted(report['combinations'].items(), key=lambda item: -item[1]['accuracy'])
+    for combo, stats in ranked:
+        print(f"{combo:<26}{stats['accuracy']:>8.1%}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['marginal_accuracy']:>+10.1%}")
+
+    combos = [combo for combo, _ in ranked]
+    print("\n边际价值矩阵（行正确且列错误的样本比例）:")
+    print(' ' * 26 + ''.join(f"{index:>7}" for index in range(len(combos))))
+    for index, row in enumerate(combos):
+        cells = ''.join(f"{report['marginal_matrix'][row][column]:>7.1%}" for column in combos)
+        print(f"{index:>2} {row:<23}{cells}")
+
+    ensemble = report['ensemble']
+    print(f"\n全部组合投票准确率: {ensemble['all_combinations_vote_accuracy']:.1%}")
+    print(f"任一组合正确（上限）: {ensemble['oracle_accuracy']:.1%}")
+    for mode, label in (('full', '完整运行'), ('cascade', '级联提前结束')):
+        stats = ensemble[mode]
+        print(f"{label}: 准确率 {stats['accuracy']:.1%}，p50 {stats['p50_ms']:.2f}ms，p95 {stats['p95_ms']:.2f}ms，"
+              f"置信度达标提交 {stats['submit_rate']:.1%}（提交准确率 {stats['submitted_accuracy']:.1%}）")
+
+    print("\n级联识别置信度可靠性（置信度区间: 样本数，平均置信度 -> 实际准确率）:")
+    for row in ensemble['cascade']['reliability']:
+        print(f"  {row['range']}: {row['count']}，{row['mean_confidence']:.2f} -> {row['accuracy']:.1%}")
+
+    fast_path = report['fast_path']['fast_path']
+    hybrid = report['fast_path']['hybrid']
+    print(f"\n字符模板快速识别（2折交叉验证，间隔阈值 {fast_path['margin']}）:")
+    print(f"  切分成功率 {fast_path['segmented']:.1%}，准确率 {fast_path['accuracy']:.1%}，"
+          f"p50 {fast_path['p50_ms']:.2f}ms，p95 {fast_path['p95_ms']:.2f}ms")
+    print(f"  直接采用比例 {fast_path['coverage']:.1%}，其中准确率 {fast_path['accepted_accuracy']:.1%}")
+    print(f"快速识别+级联识别: 准确率 {hybrid['accuracy']:.1%}，p50 {hybrid['p50_ms']:.2f}ms，p95 {hybrid['p95_ms']:.2f}ms")
+    print("=" * 70)
+
+def main():
+    image_dir = sys.argv[1] if len(sys.argv) > 1 else "img"
+    report = benchmark(image_dir)
+    if not report:
+        return
+
+    print_report(report)
+
+    output_path = sys.argv[2] if len(sys.argv) > 2 else \
+        f"captcha_benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n详细结果已保存到: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+批量查询CSV流式读取
+逐行读取输入CSV，不将整个文件读入内存，并记录每行结束处的字节位置，
+用于在行数未知的大文件上按字节报告进度
+"""
+
+import csv
+import os
+
+class CsvRowStream:
+    """
+    csv.DictReader 的流式版本
+
+    迭代产生 (该行结束处的字节位置, 行字典)。文件以二进制方式读取后逐行解码，
+    因此可以准确统计已读取的字节数（文本模式迭代时无法使用 tell()）；
+    引号内含换行的字段由 csv 模块跨行拼接，字节位置仍为该记录最后一行的结尾
+    """
+
+    def __init__(self, csv_file: str, encoding: str = 'utf-8'):
+        """
+        Args:
+            csv_file: 输入CSV文件
+            encoding: 文件编码（开头的BOM会被去除）
+        """
+        self.csv_file = csv_file
+        self.encoding = encoding
+        self.total_bytes = os.path.getsize(csv_file)
+        self.offset = 0
+        self.rows = 0
+
+    def _lines(self, f):
+        for index, raw in enumerate(f):
+            self.offset += len(raw)
+            line = raw.decode(self.encoding)
+            yield line.lstrip('\ufeff') if index == 0 else line
+
+    def __iter__(self):
+        self.offset = 0
+        self.rows = 0
+        with open(self.csv_file, 'rb') as f:
+            for row in csv.DictReader(self._lines(f)):
+                self.rows += 1
+                yield self.offset, row
+
+    def format_progress(self, offset: int) -> str:
+        """将字节位置格式化为进度文本"""
+        percent = offset / self.total_bytes if self.total_bytes else 1.0
+        return f"{offset / 1048576:.1f}/{self.total_bytes / 1048576:.1f}MB ({percent:.1%})"
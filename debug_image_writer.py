@@ -0,0 +1,159 @@
+"""
+调试图片后台写入
+验证码原图、预处理图和查询截图由后台线程写入磁盘，查询流程只负责入队，不等待文件写入。
+支持按比例抽样、只保留失败样本、在内存中保留最近N组（失败时写出），队列满时丢弃并计数
+"""
+
+import os
+import queue
+import random
+import threading
+from collections import deque
+
+class DebugImageWriter:
+    """
+    调试图片后台写入器
+
+    以“组”为单位决定是否保存（同一次验证码识别的原图和各预处理图、同一次查询的截图），
+    调用方先用 decide() 判断是否需要生成图片，避免为不会保存的图片付出截图/编码开销
+    """
+
+    def __init__(self, sample_rate: float = 0.01, keep_failures: bool = True, ring_size: int = 0,
+                 max_queue: int = 64):
+        """
+        Args:
+            sample_rate: 成功样本的保存比例（1.0 全部保存，0 不保存）
+            keep_failures: 是否始终保存失败样本
+            ring_size: 大于0时在内存中保留最近 ring_size 组未被抽中的样本，出现失败（连同失败样本）或关闭时写出
+            max_queue: 写入队列上限，写入跟不上时丢弃新图片并计数
+        """
+        self.sample_rate = sample_rate
+        self.keep_failures = keep_failures
+        self.ring = deque(maxlen=ring_size) if ring_size > 0 else None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'groups': 0,          # 提交的样本组数
+            'accepted': 0,        # 被选中保存的组数
+            'written': 0,         # 写入的文件数
+            'dropped': 0,         # 队列满被丢弃的文件数
+            'write_errors': 0,    # 写入失败的文件数
+            'bytes_written': 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """是否可能保存任何图片"""
+        return self.sample_rate > 0 or self.keep_failures or self.ring is not None
+
+    def decide(self, failed: bool = False):
+        """
+        决定一组样本如何处理，调用方只在结果不为None时才生成图片
+
+        Args:
+            failed: 该组样本是否对应失败的识别/查询
+
+        Returns:
+            'write'（写入磁盘）、'ring'（暂存到环形缓冲）或 None（不保存）
+        """
+        with self._lock:
+            self.stats['groups'] += 1
+        # 环形缓冲模式下失败样本连同之前暂存的样本一起写出
+        if failed and (self.keep_failures or self.ring is not None):
+            return 'write'
+        if self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return 'write'
+        if self.ring is not None:
+            return 'ring'
+        return None
+
+    def save_group(self, images: list, decision: str, failed: bool = False) -> list:
+        """
+        提交一组图片
+
+        Args:
+            images: [(路径, 图片字节或返回字节的函数), ...]，函数在后台线程中调用（如PNG编码）
+            decision: decide() 的结果
+            failed: 该组样本是否失败（环形缓冲模式下失败时写出暂存的样本）
+
+        Returns:
+            将被写入的路径列表（暂存在环形缓冲或被丢弃的不计入）
+        """
+        if not images or decision is None:
+            return []
+        if decision == 'ring':
+            self.ring.append(images)
+            return []
+
+        with self._lock:
+            self.stats['accepted'] += 1
+        if failed:
+            self.flush_ring()
+        return [path for path, data in images if self._enqueue(path, data)]
+
+    def flush_ring(self, block: bool = False):
+        """写出环形缓冲中暂存的样本（block为True时等待队列空位而不丢弃）"""
+        if not self.ring:
+            return
+        while self.ring:
+            for path, data in self.ring.popleft():
+                self._enqueue(path, data, block)
+
+    def _enqueue(self, path: str, data, block: bool = False) -> bool:
+        self._ensure_thread()
+        try:
+            self._queue.put((path, data), block=block, timeout=5.0 if block else None)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+            return False
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='debug-image-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, data = item
+            try:
+                if callable(data):
+                    data = data()
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                with self._lock:
+                    self.stats['written'] += 1
+                    self.stats['bytes_written'] += len(data)
+            except Exception as e:
+                with self._lock:
+                    self.stats['write_errors'] += 1
+                print(f"保存调试图片失败 ({path}): {e}")
+
+    def get_statistics(self) -> dict:
+        """写入统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+    def close(self, timeout: float = 5.0):
+        """写出环形缓冲并等待队列写完"""
+        self.flush_ring(block=True)
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,279 @@
+"""
+4位数字验证码快速识别
+二值化后将验证码切分为4个字符，用从已验证验证码中学习的字符模板做k近邻分类。
+只有最近邻间隔（margin）足够大时才直接采用结果，否则交由ddddocr多模型组合识别
+"""
+
+import os
+import threading
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+# 验证码识别学习状态（字符模板、组合权重、置信度校准）的默认保存目录，位于查询结果目录下
+CAPTCHA_STATE_DIR = os.path.join('查询结果', 'captcha_state')
+
+# 字符模板默认保存文件
+DIGIT_TEMPLATES_FILE = os.path.join(CAPTCHA_STATE_DIR, 'captcha_digit_templates.npz')
+
+# 字符归一化尺寸
+GLYPH_SIZE = 16
+
+# 验证码字符数
+DIGIT_COUNT = 4
+
+def binarize(image: np.ndarray) -> np.ndarray:
+    """
+    二值化验证码（字符为True）
+
+    Args:
+        image: RGB或灰度数组
+
+    Returns:
+        bool数组
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # 去除细小噪点和干扰线
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    return mask > 0
+
+def _split_widest(boxes: list) -> list:
+    """将最宽的区域从中间切分为两个（处理粘连字符）"""
+    index = max(range(len(boxes)), key=lambda i: boxes[i][1] - boxes[i][0])
+    left, right = boxes[index]
+    middle = (left + right) // 2
+    return boxes[:index] + [(left, middle), (middle, right)] + boxes[index + 1:]
+
+def _merge_narrowest(boxes: list) -> list:
+    """将最窄的区域与相邻区域合并（处理断裂字符）"""
+    index = min(range(len(boxes)), key=lambda i: boxes[i][1] - boxes[i][0])
+    if index == 0:
+        neighbor = 1
+    elif index == len(boxes) - 1:
+        neighbor = index - 1
+    else:
+        # 与间距更小的一侧合并
+        gap_left = boxes[index][0] - boxes[index - 1][1]
+        gap_right = boxes[index + 1][0] - boxes[index][1]
+        neighbor = index - 1 if gap_left <= gap_right else index + 1
+    first, second = sorted((index, neighbor))
+    merged = (boxes[first][0], boxes[second][1])
+    return boxes[:first] + [merged] + boxes[second + 1:]
+
+def segment(mask: np.ndarray, count: int = DIGIT_COUNT) -> list:
+    """
+    按列投影将二值图切分为字符
+
+    Args:
+        mask: binarize 返回的bool数组
+        count: 字符数量
+
+    Returns:
+        字符bool数组列表（从左到右），切分失败返回空列表
+    """
+    columns = mask.sum(axis=0) > 0
+    if not columns.any():
+        return []
+
+    # 连续有字符像素的列组成一个区域
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], columns.astype(np.int8), [0]))))
+    boxes = [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+    # 去除过窄的噪点区域
+    min_width = max(2, mask.shape[1] // 50)
+    boxes = [box for box in boxes if box[1] - box[0] >= min_width] or boxes
+
+    while len(boxes) > count:
+        boxes = _merge_narrowest(boxes)
+    while len(boxes) < count:
+        if max(right - left for left, right in boxes) < 2:
+            return []
+        boxes = _split_widest(boxes)
+
+    glyphs = []
+    for left, right in boxes:
+        glyph = mask[:, left:right]
+        rows = np.flatnonzero(glyph.any(axis=1))
+        if rows.size == 0:
+            return []
+        glyphs.append(glyph[rows[0]:rows[-1] + 1])
+    return glyphs
+
+def normalize_glyph(glyph: np.ndarray, size: int = GLYPH_SIZE) -> np.ndarray:
+    """将字符按比例缩放并居中放入 size x size，返回展平的float32向量"""
+    height, width = glyph.shape
+    scale = (size - 2) / max(height, width)
+    resized = cv2.resize(glyph.astype(np.float32),
+                         (max(1, round(width * scale)), max(1, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    canvas = np.zeros((size, size), dtype=np.float32)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return canvas.ravel()
+
+def extract_features(image: np.ndarray) -> Optional[np.ndarray]:
+    """
+    提取验证码各字符的特征
+
+    Returns:
+        DIGIT_COUNT x (GLYPH_SIZE*GLYPH_SIZE) 的数组，切分失败返回None
+    """
+    glyphs = segment(binarize(image))
+    if len(glyphs) != DIGIT_COUNT:
+        return None
+    return np.stack([normalize_glyph(glyph) for glyph in glyphs])
+
+class DigitClassifier:
+    """
+    基于字符模板的k近邻数字分类器
+    模板来自提交后确认正确的验证码，每个数字最多保留 max_per_digit 个最新模板；
+    多个识别器（并发工作者）可共享同一个分类器
+    """
+
+    def __init__(self, templates_path: str = DIGIT_TEMPLATES_FILE, k: int = 3,
+                 min_per_digit: int = 3, max_per_digit: int = 200):
+        """
+        Args:
+            templates_path: 模板保存文件，为None时不持久化
+            k: 近邻数量
+            min_per_digit: 每个数字至少需要的模板数，不足时快速识别不可用
+            max_per_digit: 每个数字最多保留的模板数
+        """
+        self.templates_path = templates_path
+        self.k = k
+        self.min_per_digit = min_per_digit
+        self.max_per_digit = max_per_digit
+        self._templates = {str(digit): [] for digit in range(10)}
+        self._matrix = None
+        self._labels = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def ready(self) -> bool:
+        """每个数字都有足够模板时才可用于快速识别"""
+        return all(len(templates) >= self.min_per_digit for templates in self._templates.values())
+
+    def add_example(self, image: np.ndarray, text: str) -> bool:
+        """
+        用确认正确的验证码更新模板
+
+        Args:
+            image: RGB数组
+            text: 正确的4位数字
+
+        Returns:
+            是否成功切分并加入模板
+        """
+        if len(text) != DIGIT_COUNT or not text.isdigit():
+            return False
+        features = extract_features(image)
+        if features is None:
+            return False
+
+        with self._lock:
+            for digit, feature in zip(text, features):
+                templates = self._templates[digit]
+                templates.append(feature)
+                if len(templates) > self.max_per_digit:
+                    del templates[0]
+            self._matrix = None
+        return True
+
+    def _get_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """合并后的模板矩阵和标签（模板变化后重建）"""
+        with self._lock:
+            if self._matrix is None:
+                features, labels = [], []
+                for digit, templates in self._templates.items():
+                    features.extend(templates)
+                    labels.extend([digit] * len(templates))
+                self._matrix = np.array(features, dtype=np.float32).reshape(-1, GLYPH_SIZE * GLYPH_SIZE)
+                self._labels = np.array(labels)
+            return self._matrix, self._labels
+
+    def classify(self, image: np.ndarray) -> Tuple[Optional[str], float]:
+        """
+        识别验证码
+
+        Args:
+            image: RGB数组
+
+        Returns:
+            (4位数字, margin)，margin 为各字符中最小的最近邻间隔：
+            (最近的其他数字距离 - 最近的预测数字距离) / 最近的其他数字距离，范围0~1；
+            模板不足或切分失败返回 (None, 0.0)
+        """
+        if not self.ready:
+            return None, 0.0
+        features = extract_features(image)
+        if features is None:
+            return None, 0.0
+
+        matrix, labels = self._get_matrix()
+        # 欧氏距离平方：|a|^2 - 2ab + |b|^2
+        distances = (
+            (features ** 2).sum(axis=1)[:, None]
+            - 2 * features @ matrix.T
+            + (matrix ** 2).sum(axis=1)[None, :]
+        )
+        distances = np.sqrt(np.maximum(distances, 0))
+
+        text = []
+        margin = 1.0
+        for row in distances:
+            nearest_labels = labels[np.argsort(row)[:self.k]]
+            votes = {}
+            for label in nearest_labels:
+                votes[label] = votes.get(label, 0) + 1
+            # 票数相同时取距离最近的数字
+            digit = max(nearest_labels, key=lambda label: votes[label])
+
+            best = row[labels == digit].min()
+            other = row[labels != digit].min()
+            margin = min(margin, (other - best) / other if other > 0 else 0.0)
+            text.append(digit)
+
+        return ''.join(text), max(0.0, float(margin))
+
+    def get_statistics(self) -> dict:
+        """各数字的模板数量"""
+        with self._lock:
+            return {digit: len(templates) for digit, templates in self._templates.items()}
+
+    def load(self):
+        """从模板文件恢复"""
+        if not self.templates_path or not os.path.exists(self.templates_path):
+            return
+        try:
+            with np.load(self.templates_path) as data:
+                with self._lock:
+                    for digit in self._templates:
+                        if digit in data.files:
+                            self._templates[digit] = list(data[digit][-self.max_per_digit:])
+                    self._matrix = None
+            print(f"已加载验证码字符模板: {self.templates_path}")
+        except Exception as e:
+            print(f"加载验证码字符模板失败: {e}")
+
+    def save(self):
+        """保存模板到文件"""
+        if not self.templates_path:
+            return
+        with self._lock:
+            snapshot = {
+                digit: np.array(templates, dtype=np.float32).reshape(-1, GLYPH_SIZE * GLYPH_SIZE)
+                for digit, templates in self._templates.items()
+            }
+        if not any(len(templates) for templates in snapshot.values()):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.templates_path) or '.', exist_ok=True)
+            temp_path = f"{self.templates_path}.tmp.npz"
+            np.savez_compressed(temp_path, **snapshot)
+            os.replace(temp_path, self.templates_path)
+        except Exception as e:
+            print(f"保存验证码字符模板失败: {e}")
@@ -1,13 +1,608 @@
 import asyncio
 import os
 import base64
-import io
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import ddddocr
+import json
+import random
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
+from debug_image_writer import DebugImageWriter
+from digit_classifier import CAPTCHA_STATE_DIR, DigitClassifier
+
+# 添加Pillow兼容性代码（旧版ddddocr依赖Image.ANTIALIAS）
+if not hasattr(Image, 'ANTIALIAS'):
+    Image.ANTIALIAS = Image.LANCZOS
+
+# PIL ImageFilter.SMOOTH 卷积核，用于锐度调整
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+# 预处理方法（按计算成本从低到高）
+PREPROCESS_METHODS = ('standard', 'denoise', 'enhance', 'threshold')
+
+# 较昂贵的预处理方法，级联模式下只在前面的结果不一致时运行
+EXPENSIVE_METHODS = ('enhance', 'threshold')
+
+# 验证码图片URL特征，用于从网络响应中截获验证码图片
+CAPTCHA_URL_PATTERNS = ('captcha', 'verify', 'yzm', 'code', 'kaptcha')
+
+# 方法/模型组合自适应权重的默认保存文件
+COMBO_WEIGHTS_FILE = os.path.join(CAPTCHA_STATE_DIR, 'captcha_combo_weights.json')
+
+# 置信度校准统计的默认保存文件
+CONFIDENCE_CALIBRATION_FILE = os.path.join(CAPTCHA_STATE_DIR, 'captcha_confidence_calibration.json')
+
+# OCR模型配置：名称 -> ddddocr.DdddOcr 参数
+OCR_MODEL_SPECS = {
+    # 标准模型
+    'standard': {'show_ad': False},
+    # 数字+字母模型
+    'alpha_numeric': {'show_ad': False, 'beta': True}
+}
+
+class OcrModelRegistry:
+    """
+    OCR模型注册表
+    进程内共享，每个ONNX模型只在首次使用时加载一次并记录加载耗时。
+    ONNX Runtime 会话创建的线程池不能安全地跨fork使用，多进程时应以spawn方式创建子进程，
+    由各子进程自行加载（或在子进程启动时调用 preload()），不要在父进程加载后fork
+    """
+    
+    def __init__(self, specs: dict = None):
+        self.specs = specs or OCR_MODEL_SPECS
+        self._models = {}
+        self._lock = threading.Lock()
+        self.load_times = {}
+    
+    def get(self, name: str):
+        """获取模型，未加载时加载"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = ddddocr.DdddOcr(**self.specs[name])
+                self.load_times[name] = time.perf_counter() - start
+                self._models[name] = model
+                print(f"已加载OCR模型 {name}，耗时 {self.load_times[name]:.2f}秒")
+        return model
+    
+    def names(self) -> list:
+        """已配置的模型名称"""
+        return list(self.specs)
+    
+    def preload(self, names: list = None):
+        """预先加载模型（在子进程启动时调用，避免首次识别时等待加载）"""
+        for name in names or self.names():
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"加载OCR模型 {name} 失败: {e}")
+    
+    def get_statistics(self) -> dict:
+        """获取模型加载统计"""
+        return {
+            'loaded_models': list(self._models),
+            'load_times': dict(self.load_times),
+            'total_load_time': sum(self.load_times.values())
+        }
+
+class LazyOcrModels(Mapping):
+    """按名称访问注册表中的模型，首次访问时才加载"""
+    
+    def __init__(self, registry: OcrModelRegistry):
+        self.registry = registry
+    
+    def __getitem__(self, name):
+        if name not in self.registry.specs:
+            raise KeyError(name)
+        return self.registry.get(name)
+    
+    def __iter__(self):
+        return iter(self.registry.names())
+    
+    def __len__(self):
+        return len(self.registry.specs)
+
+# 进程内共享的默认模型注册表
+OCR_MODEL_REGISTRY = OcrModelRegistry()
+
+def preload_ocr_models(names: list = None) -> dict:
+    """预先加载默认注册表中的模型，返回加载统计"""
+    OCR_MODEL_REGISTRY.preload(names)
+    return OCR_MODEL_REGISTRY.get_statistics()
+
+class OcrDispatcher:
+    """
+    验证码识别调度器
+    将图像预处理和模型推理放到有界线程池中执行（onnxruntime推理时会释放GIL），
+    等待执行的任务数达到上限时调用方需排队等待（背压），避免大量并发页面互相阻塞，
+    并分别统计排队等待时间和计算时间
+    """
+    
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        """
+        Args:
+            max_workers: 线程池大小，默认 min(4, CPU核数)
+            max_pending: 允许同时提交（执行中+排队）的任务数，默认为线程池大小的2倍
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.max_workers * 2
+        self._executor = None
+        self._semaphores = {}
+        
+        self.stats = {
+            'tasks': 0,
+            'queue_wait_time': 0.0,  # 排队等待总时间（秒）
+            'compute_time': 0.0,     # 计算总时间（秒）
+            'max_queue_wait': 0.0
+        }
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ocr')
+        return self._executor
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 信号量与事件循环绑定，每个事件循环各自创建
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_pending)
+            self._semaphores = {loop: semaphore}
+        return semaphore
+    
+    async def run(self, func, *args):
+        """
+        在线程池中执行函数
+        
+        Returns:
+            (函数返回值, 排队等待时间, 计算时间)
+        """
+        loop = asyncio.get_running_loop()
+        submit_time = time.perf_counter()
+        timing = {}
+        
+        def job():
+            timing['start'] = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timing['end'] = time.perf_counter()
+        
+        async with self._get_semaphore():
+            result = await loop.run_in_executor(self._get_executor(), job)
+        
+        queue_wait = timing['start'] - submit_time
+        compute_time = timing['end'] - timing['start']
+        self.stats['tasks'] += 1
+        self.stats['queue_wait_time'] += queue_wait
+        self.stats['compute_time'] += compute_time
+        self.stats['max_queue_wait'] = max(self.stats['max_queue_wait'], queue_wait)
+        return result, queue_wait, compute_time
+    
+    def get_statistics(self) -> dict:
+        """获取调度统计信息"""
+        stats = self.stats.copy()
+        if stats['tasks'] > 0:
+            stats['avg_queue_wait'] = stats['queue_wait_time'] / stats['tasks']
+            stats['avg_compute_time'] = stats['compute_time'] / stats['tasks']
+        return stats
+    
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# 进程内共享的默认调度器，所有识别器共用同一个有界线程池
+DEFAULT_OCR_DISPATCHER = OcrDispatcher()
+
+class AdaptiveComboPolicy:
+    """
+    方法/模型组合的自适应选择策略（Thompson采样）
+    
+    每个组合的成功率以 Beta(成功+1, 失败+1) 表示，成功/失败来自提交查询后的验证码对错反馈：
+    答案正确时，给出该答案的组合记成功、给出其他答案的组合记失败；
+    答案明确错误时，只有给出该答案的组合记失败。
+    每次识别按采样成功率减去耗时惩罚排序（反馈不足的昂贵方法仍排在廉价方法之后），
+    反馈足够多且采样成功率过低的组合直接跳过，
+    采样的随机性保证被跳过的组合仍有机会重新评估。学习到的权重可保存到JSON文件，供下次运行继续使用。
+    多个识别器（并发工作者）可共享同一个策略对象。
+    """
+    
+    def __init__(self, weights_path: str = COMBO_WEIGHTS_FILE, time_penalty: float = 2.0,
+                 prune_threshold: float = 0.2, min_feedback: int = 20, save_every: int = 20):
+        """
+        Args:
+            weights_path: 权重保存文件，为None时不持久化
+            time_penalty: 耗时惩罚系数（每秒平均耗时扣减的采样成功率）
+            prune_threshold: 采样成功率低于该值的组合被跳过
+            min_feedback: 组合至少获得多少次反馈后才可能被跳过
+            save_every: 每收到多少次反馈保存一次权重
+        """
+        self.weights_path = weights_path
+        self.time_penalty = time_penalty
+        self.prune_threshold = prune_threshold
+        self.min_feedback = min_feedback
+        self.save_every = save_every
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._feedback_since_save = 0
+        self.load()
+    
+    def _get_stats(self, combo: str) -> dict:
+        stats = self.stats.setdefault(combo, {})
+        for key in ('runs', 'agreements', 'successes', 'failures'):
+            stats.setdefault(key, 0)
+        stats.setdefault('total_time', 0.0)
+        return stats
+    
+    def order(self, combinations: list, expensive: set, min_count: int) -> list:
+        """
+        对组合进行采样排序并跳过表现差的组合
+        
+        Args:
+            combinations: [(方法, 模型名称), ...]
+            expensive: 昂贵预处理方法集合（反馈不足 min_feedback 次时排在廉价方法之后）
+            min_count: 至少保留的组合数量
+            
+        Returns:
+            排序并裁剪后的组合列表
+        """
+        scored = []
+        with self._lock:
+            for method, model_name in combinations:
+                stats = self._get_stats(f"{method}_{model_name}")
+                successes, failures = stats['successes'], stats['failures']
+                sample = random.betavariate(successes + 1, failures + 1)
+                avg_time = stats['total_time'] / stats['runs'] if stats['runs'] else 0.0
+                score = sample - self.time_penalty * avg_time
+                proven = successes + failures >= self.min_feedback
+                pruned = proven and sample < self.prune_threshold
+                # 反馈不足的昂贵方法仍排在廉价方法之后
+                deferred = method in expensive and not proven
+                scored.append((pruned, deferred, -score, method, model_name))
+        
+        scored.sort(key=lambda item: item[:3])
+        kept = [(method, model_name) for pruned, _, _, method, model_name in scored if not pruned]
+        if len(kept) < min_count:
+            kept = [(method, model_name) for _, _, _, method, model_name in scored[:min_count]]
+        return kept
+    
+    def record_run(self, executed: list, final_result: Optional[str]):
+        """记录各组合的运行次数、与最终结果一致次数和耗时"""
+        with self._lock:
+            for combo, result, elapsed in executed:
+                stats = self._get_stats(combo)
+                stats['runs'] += 1
+                stats['total_time'] += elapsed
+                if final_result and result == final_result:
+                    stats['agreements'] += 1
+    
+    def record_feedback(self, combo_results: dict, answer: str, correct: bool):
+        """
+        根据提交结果更新各组合的成功/失败次数
+        
+        Args:
+            combo_results: {组合名: 该组合的识别结果或None}
+            answer: 提交的验证码
+            correct: 验证码是否正确
+        """
+        with self._lock:
+            for combo, result in combo_results.items():
+                stats = self._get_stats(combo)
+                if correct:
+                    stats['successes' if result == answer else 'failures'] += 1
+                elif result == answer:
+                    stats['failures'] += 1
+            self._feedback_since_save += 1
+            should_save = self.save_every and self._feedback_since_save >= self.save_every
+        
+        if should_save:
+            self.save()
+    
+    def load(self):
+        """从权重文件恢复统计"""
+        if not self.weights_path or not os.path.exists(self.weights_path):
+            return
+        try:
+            with open(self.weights_path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            with self._lock:
+                self.stats = {combo: dict(values) for combo, values in stats.items()}
+            print(f"已加载验证码组合权重: {self.weights_path}")
+        except Exception as e:
+            print(f"加载验证码组合权重失败: {e}")
+    
+    def save(self):
+        """保存统计到权重文件（先写临时文件再替换，避免中断时损坏）"""
+        if not self.weights_path:
+            return
+        with self._lock:
+            snapshot = {combo: dict(values) for combo, values in self.stats.items()}
+            self._feedback_since_save = 0
+        try:
+            os.makedirs(os.path.dirname(self.weights_path) or '.', exist_ok=True)
+            temp_path = f"{self.weights_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.weights_path)
+        except Exception as e:
+            print(f"保存验证码组合权重失败: {e}")
+    
+    def get_statistics(self) -> dict:
+        """各组合的反馈成功率和平均耗时"""
+        with self._lock:
+            return {
+                combo: {
+                    'feedback': stats['successes'] + stats['failures'],
+                    'success_rate': (stats['successes'] + 1) / (stats['successes'] + stats['failures'] + 2),
+                    'avg_time': stats['total_time'] / stats['runs'] if stats['runs'] else 0.0
+                }
+                for combo, stats in self.stats.items()
+            }
+
+def perceptual_hash(image: np.ndarray, hash_size: int = 16) -> str:
+    """
+    计算验证码图像的感知哈希（DCT低频分量与中位数比较）
+    重新编码、轻微缩放或压缩后的同一张验证码得到相同的哈希
+    
+    Args:
+        image: RGB或灰度数组
+        hash_size: 低频分量边长，哈希长度为 hash_size*hash_size 位
+        
+    Returns:
+        十六进制哈希字符串
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    resized = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+    low_frequency = cv2.dct(resized.astype(np.float32))[:hash_size, :hash_size]
+    bits = low_frequency > np.median(low_frequency)
+    return np.packbits(bits).tobytes().hex()
+
+# 字符集指纹 -> [空白符列, 数字0-9列]，各模型字符集顺序不同，每次输出的字符集列表都是新对象
+_DIGIT_COLUMNS = {}
+
+def _digit_columns(charset: list) -> Optional[list]:
+    """空白符（''）和数字0-9在字符集中的列号，字符集缺少数字时返回None"""
+    key = (len(charset), tuple(charset[1:9]))
+    columns = _DIGIT_COLUMNS.get(key)
+    if columns is None or any(charset[column] != char for column, char in zip(columns, ['', *'0123456789'])):
+        try:
+            columns = [charset.index(char) for char in ['', *'0123456789']]
+        except ValueError:
+            return None
+        _DIGIT_COLUMNS[key] = columns
+    return columns
+
+def decode_digit_probabilities(output) -> Optional[Tuple[str, float]]:
+    """
+    将ddddocr的概率输出按贪心CTC解码为数字串
+    每一帧只在空白符和数字0-9之间取最大概率，合并连续相同的输出并去掉空白符；
+    每个字符的概率取其所在各帧的最大值，整体置信度为各字符概率之积
+    
+    Args:
+        output: classification(..., probability=True) 的返回值，
+                支持 {'probabilities', 'charset'}（1.5+）和 {'probability', 'charsets'}（旧版）
+        
+    Returns:
+        (数字串, 置信度)，输出格式无法识别时返回None
+    """
+    if not isinstance(output, dict):
+        return None
+    probabilities = output.get('probabilities', output.get('probability'))
+    charset = output.get('charset', output.get('charsets'))
+    if probabilities is None or not charset:
+        return None
+    columns = _digit_columns(list(charset))
+    if columns is None:
+        return None
+    
+    digits, confidences = [], []
+    previous = 0
+    for frame in probabilities:
+        # (1, C) 的帧取出批次维度；只读取11列，避免转换整个字符集的概率
+        while len(frame) == 1:
+            frame = frame[0]
+        scores = [frame[column] for column in columns]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        if best != 0:
+            if best != previous:
+                digits.append(str(best - 1))
+                confidences.append(float(scores[best]))
+            else:
+                confidences[-1] = max(confidences[-1], float(scores[best]))
+        previous = best
+    
+    return ''.join(digits), float(np.prod(confidences)) if confidences else 0.0
+
+class CaptchaAnswerCache:
+    """
+    已确认正确的验证码答案缓存（LRU）
+    以解码后图像的感知哈希为键，只存入提交后确认正确的答案；
+    缓存答案被网站判为错误时立即删除。可选保存到JSON文件，多个识别器可共享同一个缓存
+    """
+    
+    def __init__(self, max_size: int = 10000, path: str = None):
+        """
+        Args:
+            max_size: 最多缓存的答案数量
+            path: 持久化文件，为None时只在内存中缓存
+        """
+        self.max_size = max_size
+        self.path = path
+        self._answers = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+        self.load()
+    
+    def get(self, key: str) -> Optional[str]:
+        """查找答案，命中时移动到最近使用位置"""
+        with self._lock:
+            self.stats['lookups'] += 1
+            answer = self._answers.get(key)
+            if answer is not None:
+                self._answers.move_to_end(key)
+                self.stats['hits'] += 1
+            return answer
+    
+    def put(self, key: str, answer: str):
+        """存入确认正确的答案"""
+        with self._lock:
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            self.stats['stores'] += 1
+            while len(self._answers) > self.max_size:
+                self._answers.popitem(last=False)
+                self.stats['evictions'] += 1
+    
+    def invalidate(self, key: str):
+        """删除被判错误的答案"""
+        with self._lock:
+            if self._answers.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+    
+    def get_statistics(self) -> dict:
+        """缓存统计（含命中率）"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._answers)
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+    
+    def load(self):
+        """从文件恢复缓存"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                answers = json.load(f)
+            with self._lock:
+                self._answers = OrderedDict(list(answers.items())[-self.max_size:])
+            print(f"已加载验证码答案缓存: {self.path} ({len(self._answers)} 条)")
+        except Exception as e:
+            print(f"加载验证码答案缓存失败: {e}")
+    
+    def save(self):
+        """保存缓存到文件（按使用顺序，最近使用的在后）"""
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = dict(self._answers)
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"保存验证码答案缓存失败: {e}")
+
+class ConfidenceCalibrator:
+    """
+    识别置信度校准
+    按识别来源（'ensemble' 组合识别、'fast_path' 快速识别）和原始置信度分箱，
+    统计提交后验证码实际正确的比例；校准值为以原始置信度为先验的平滑正确率：
+    (正确数 + prior_strength * 原始置信度) / (提交数 + prior_strength)，没有反馈时等于原始置信度。
+    多个识别器（并发工作者）可共享同一个校准器
+    """
+    
+    def __init__(self, path: str = CONFIDENCE_CALIBRATION_FILE, bins: int = 10,
+                 prior_strength: float = 5.0, save_every: int = 20):
+        """
+        Args:
+            path: 统计保存文件，为None时不持久化
+            bins: 原始置信度（0~1）的分箱数量
+            prior_strength: 原始置信度作为先验的等效样本数
+            save_every: 每收到多少次反馈保存一次
+        """
+        self.path = path
+        self.bins = bins
+        self.prior_strength = prior_strength
+        self.save_every = save_every
+        # {来源: {分箱序号: {'correct': 正确数, 'total': 提交数}}}
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._feedback_since_save = 0
+        self.load()
+    
+    def _bin(self, raw: float) -> str:
+        return str(min(self.bins - 1, max(0, int(raw * self.bins))))
+    
+    def calibrate(self, raw: float, source: str = 'ensemble') -> float:
+        """将原始置信度转换为估计的正确概率"""
+        with self._lock:
+            counts = self.stats.get(source, {}).get(self._bin(raw))
+            if not counts:
+                return raw
+            return (counts['correct'] + self.prior_strength * raw) / (counts['total'] + self.prior_strength)
+    
+    def update(self, raw: float, correct: bool, source: str = 'ensemble'):
+        """记录一次提交结果"""
+        with self._lock:
+            counts = self.stats.setdefault(source, {}).setdefault(self._bin(raw), {'correct': 0, 'total': 0})
+            counts['total'] += 1
+            if correct:
+                counts['correct'] += 1
+            self._feedback_since_save += 1
+            should_save = self.save_every and self._feedback_since_save >= self.save_every
+        
+        if should_save:
+            self.save()
+    
+    def get_statistics(self) -> dict:
+        """各来源、各置信度区间的提交数和实际正确率"""
+        with self._lock:
+            return {
+                source: {
+                    f"{int(index) / self.bins:.1f}-{(int(index) + 1) / self.bins:.1f}": {
+                        'total': counts['total'],
+                        'accuracy': counts['correct'] / counts['total'] if counts['total'] else 0.0
+                    }
+                    for index, counts in sorted(bins.items(), key=lambda item: int(item[0]))
+                }
+                for source, bins in self.stats.items()
+            }
+    
+    def load(self):
+        """从文件恢复统计"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            with self._lock:
+                self.stats = {source: {index: dict(counts) for index, counts in bins.items()}
+                              for source, bins in stats.items()}
+            print(f"已加载验证码置信度校准: {self.path}")
+        except Exception as e:
+            print(f"加载验证码置信度校准失败: {e}")
+    
+    def save(self):
+        """保存统计到文件"""
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = {source: {index: dict(counts) for index, counts in bins.items()}
+                        for source, bins in self.stats.items()}
+            self._feedback_since_save = 0
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"保存验证码置信度校准失败: {e}")
 
 class EnhancedCaptchaRecognizer:
     """
@@ -15,30 +610,272 @@ class EnhancedCaptchaRecognizer:
     解决当前验证码识别率低的问题
     """
     
-    def __init__(self):
+    # 各页面截获的验证码图片响应 {page: {url: Future[bytes]}}，所有识别器共享
+    _captured_images = {}
+    
+    def __init__(self, save_images: bool = True, ocr_dispatcher: OcrDispatcher = None,
+                 cascade: bool = True, consensus_k: int = 2, consensus_threshold: float = 0.8,
+                 model_registry: 'OcrModelRegistry' = None, combo_policy: AdaptiveComboPolicy = None,
+                 fast_path: bool = True, fast_path_margin: float = 0.25, digit_classifier: DigitClassifier = None,
+                 answer_cache: CaptchaAnswerCache = None, debug_writer: DebugImageWriter = None,
+                 use_model_probability: bool = True, calibrator: ConfidenceCalibrator = None,
+                 min_confidence: float = 0.3):
+        """
+        Args:
+            save_images: 是否将验证码图片及预处理图片保存到img目录（由 debug_writer 抽样后在后台写入）
+            ocr_dispatcher: 识别任务调度器，默认使用进程内共享的 DEFAULT_OCR_DISPATCHER
+            cascade: 是否启用级联识别（结果一致后提前结束）
+            consensus_k: 提前结束所需的一致结果数量
+            consensus_threshold: 提前结束所需的平均置信度
+            model_registry: OCR模型注册表，默认使用进程内共享的 OCR_MODEL_REGISTRY
+            combo_policy: 组合自适应选择策略，默认创建新的 AdaptiveComboPolicy（读取 COMBO_WEIGHTS_FILE）
+            fast_path: 是否启用字符模板快速识别（模板由确认正确的验证码训练）
+            fast_path_margin: 快速识别结果被直接采用所需的最小近邻间隔，低于该值时运行ddddocr组合
+            digit_classifier: 快速识别分类器，默认创建新的 DigitClassifier（读取 DIGIT_TEMPLATES_FILE）
+            answer_cache: 已确认答案的感知哈希缓存，默认创建只在内存中的 CaptchaAnswerCache
+            debug_writer: 调试图片后台写入器，默认创建新的 DebugImageWriter（抽样1%并保留识别失败的样本）
+            use_model_probability: 是否使用模型逐字符概率计算置信度（每次识别约多10ms），
+                                   为False时使用基于结果格式的启发式置信度
+            calibrator: 置信度校准器，默认创建新的 ConfidenceCalibrator（读取 CONFIDENCE_CALIBRATION_FILE）
+            min_confidence: 校准后置信度低于该值的结果不提交，get_captcha_from_page 返回None以便立即刷新验证码
+        """
+        self.model_registry = model_registry or OCR_MODEL_REGISTRY
         self.ocr_models = self._initialize_ocr_models()
         self.img_dir = "img"
+        self.save_images = save_images
+        self.debug_writer = (debug_writer or DebugImageWriter()) if save_images else None
+        self.ocr_dispatcher = ocr_dispatcher or DEFAULT_OCR_DISPATCHER
+        
+        # 级联识别配置和各方法/模型组合的自适应选择策略
+        self.cascade = cascade
+        self.consensus_k = consensus_k
+        self.consensus_threshold = consensus_threshold
+        self.combo_policy = combo_policy or AdaptiveComboPolicy()
+        
+        # 字符模板快速识别
+        self.fast_path_margin = fast_path_margin
+        self.digit_classifier = (digit_classifier or DigitClassifier()) if fast_path else None
+        self.fast_path_stats = {'attempts': 0, 'accepted': 0, 'rejected': 0, 'total_time': 0.0}
+        
+        # 已确认正确答案的感知哈希缓存
+        self.answer_cache = answer_cache or CaptchaAnswerCache()
+        
+        # 模型概率置信度及其按提交结果的校准
+        self.use_model_probability = use_model_probability
+        self.calibrator = calibrator or ConfidenceCalibrator()
+        self.min_confidence = min_confidence
+        
+        # 最近识别结果等待提交后的反馈
+        # {最终结果: {'combos': {组合名: 结果}, 'image': 数组, 'image_hash': 感知哈希,
+        #             'source': 'cache'|'fast_path'|'ensemble', 'raw_confidence': 校准前置信度}}
+        self._pending_feedback = OrderedDict()
+        
+        # ddddocr是否支持直接传入PIL图像（旧版本只接受字节）
+        self._models_accept_images = True
         os.makedirs(self.img_dir, exist_ok=True)
         
-    def _initialize_ocr_models(self):
-        """初始化多个OCR模型"""
-        models = {}
+    @classmethod
+    def attach_network_capture(cls, page, max_images: int = 8):
+        """
+        监听页面的验证码图片响应，识别时直接使用响应内容，无需截图
+        
+        Args:
+            page: Playwright页面对象
+            max_images: 每个页面保留的最近验证码响应数量
+        """
+        captured = {}
+        cls._captured_images[page] = captured
+        
+        def handle_response(response):
+            try:
+                if response.request.resource_type != 'image':
+                    return
+                url = response.url
+                if not any(pattern in url.lower() for pattern in CAPTCHA_URL_PATTERNS):
+                    return
+                captured.pop(url, None)
+                captured[url] = asyncio.ensure_future(response.body())
+                while len(captured) > max_images:
+                    captured.pop(next(iter(captured))).cancel()
+            except Exception:
+                pass
+        
+        page.on("response", handle_response)
+        page.on("close", lambda _: cls._captured_images.pop(page, None))
+        
+    async def _get_captured_image(self, page, url: str) -> Optional[bytes]:
+        """获取页面已截获的验证码图片内容"""
+        future = self._captured_images.get(page, {}).get(url)
+        if future is None:
+            return None
         try:
-            # 标准模型
-            models['standard'] = ddddocr.DdddOcr(show_ad=False)
+            return await asyncio.wait_for(asyncio.shield(future), 2)
+        except Exception:
+            return None
+        
+    def _save_debug_images(self, save_path: str, image_data: bytes, processed_cache: dict, failed: bool):
+        """将验证码原图和各预处理图作为一组交给后台写入器（PNG编码在写入线程中进行）"""
+        decision = self.debug_writer.decide(failed)
+        if decision is None:
+            return
+        
+        images = [(save_path, image_data)]
+        for method, entry in processed_cache.items():
+            if entry is not None:
+                images.append((
+                    save_path.replace('.png', f'_{method}.png'),
+                    lambda processed=entry[0]: self.encode_png(processed)
+                ))
+        self.debug_writer.save_group(images, decision, failed)
+        
+    def _initialize_ocr_models(self):
+        """
+        获取OCR模型：模型由进程内共享的注册表在首次使用时加载，
+        创建多个识别器不会重复加载模型
+        """
+        return LazyOcrModels(self.model_registry)
+    
+    @staticmethod
+    def decode_image(image_data: bytes) -> Optional[np.ndarray]:
+        """
+        将验证码图像数据解码为RGB数组（整个识别流程只解码一次）
+        
+        Returns:
+            HxWx3 的uint8数组，解码失败返回None
+        """
+        buffer = np.frombuffer(image_data, dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    @staticmethod
+    def _adjust_contrast(image: np.ndarray, factor: float) -> np.ndarray:
+        """调整对比度（与PIL ImageEnhance.Contrast一致：以灰度均值为中心缩放）"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        mean = np.full_like(image, int(gray.mean() + 0.5))
+        return cv2.addWeighted(image, factor, mean, 1.0 - factor, 0)
+    
+    @staticmethod
+    def _adjust_sharpness(image: np.ndarray, factor: float) -> np.ndarray:
+        """调整锐度（与PIL ImageEnhance.Sharpness一致：与平滑图像线性外推，边缘像素保持不变）"""
+        smooth = cv2.filter2D(image, -1, SMOOTH_KERNEL, borderType=cv2.BORDER_REPLICATE)
+        smooth[0, :], smooth[-1, :], smooth[:, 0], smooth[:, -1] = image[0, :], image[-1, :], image[:, 0], image[:, -1]
+        return cv2.addWeighted(image, factor, smooth, 1.0 - factor, 0)
+    
+    def preprocess_array(self, image: np.ndarray, method: str = 'standard') -> np.ndarray:
+        """
+        对已解码的图像数组进行预处理（全部为OpenCV/NumPy向量化操作）
+        
+        Args:
+            image: decode_image 返回的RGB数组
+            method: 预处理方法 ('standard', 'denoise', 'enhance', 'threshold')
             
-            # 数字+字母模型
-            models['alpha_numeric'] = ddddocr.DdddOcr(show_ad=False, beta=True)
+        Returns:
+            处理后的数组（RGB或灰度）
+        """
+        if method == 'standard':
+            # 标准处理：调整大小和对比度
+            height, width = image.shape[:2]
+            if width < 100 or height < 40:
+                # 放大小图片
+                image = cv2.resize(image, (width * 2, height * 2), interpolation=cv2.INTER_LANCZOS4)
             
-            # 自定义模型（如果有训练好的模型）
-            # models['custom'] = ddddocr.DdddOcr(show_ad=False, det=False, ocr=False)
-            # models['custom'].set_ranges(0)  # 设置为数字+字母
+            # 增强对比度
+            return self._adjust_contrast(image, 1.5)
             
-            print(f"已初始化 {len(models)} 个OCR模型")
-        except Exception as e:
-            print(f"初始化OCR模型失败: {e}")
+        elif method == 'denoise':
+            # 降噪处理
+            image = cv2.medianBlur(image, 3)
+            
+            # 转换为灰度图
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            
+            # 增强锐度
+            return self._adjust_sharpness(image, 2.0)
+            
+        elif method == 'enhance':
+            # 增强处理：调整亮度和对比度后转换为灰度
+            image = cv2.convertScaleAbs(image, alpha=1.2)
+            image = self._adjust_contrast(image, 1.8)
+            return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            
+        elif method == 'threshold':
+            # 二值化处理
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            
+            # 高斯模糊
+            gray = cv2.GaussianBlur(gray, (3, 3), 0)
             
-        return models
+            # 自适应阈值
+            gray = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                cv2.THRESH_BINARY, 11, 2
+            )
+            
+            # 形态学操作去噪
+            kernel = np.ones((2, 2), np.uint8)
+            return cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
+        
+        return image
+    
+    @staticmethod
+    def encode_png(image: np.ndarray) -> bytes:
+        """将RGB或灰度数组编码为PNG"""
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        return cv2.imencode('.png', image)[1].tobytes()
+    
+    def _to_model_input(self, image: np.ndarray):
+        """
+        将数组转换为OCR模型输入：优先直接传入PIL图像（零编解码），
+        旧版ddddocr不支持时退回PNG字节
+        """
+        if self._models_accept_images:
+            return Image.fromarray(image)
+        return self.encode_png(image)
+    
+    def _classify(self, model_name: str, model_input, image: np.ndarray, probability: bool = False):
+        """
+        调用OCR模型识别，旧版ddddocr不接受PIL图像时自动切换为PNG字节
+        
+        Returns:
+            识别文本；probability为True时返回ddddocr的概率输出字典
+        """
+        kwargs = {'probability': True} if probability else {}
+        try:
+            return self.ocr_models[model_name].classification(model_input, **kwargs)
+        except TypeError:
+            if not self._models_accept_images:
+                raise
+            self._models_accept_images = False
+            return self.ocr_models[model_name].classification(self.encode_png(image), **kwargs)
+    
+    def _recognize_digits(self, model_name: str, model_input, image: np.ndarray) -> Tuple[Optional[str], float]:
+        """
+        用单个模型识别4位数字验证码
+        
+        优先在模型逐帧概率中只考虑数字解码，置信度为各字符概率之积；
+        模型没有概率输出时退回文本结果（只保留数字）和启发式置信度
+        
+        Returns:
+            (4位数字, 置信度)，结果不是4位数字时返回 (None, 0.0)
+        """
+        if self.use_model_probability:
+            output = self._classify(model_name, model_input, image, probability=True)
+            decoded = decode_digit_probabilities(output)
+            if decoded is not None:
+                digits, confidence = decoded
+                return (digits, confidence) if len(digits) == 4 else (None, 0.0)
+            text = output.get('text', '') if isinstance(output, dict) else output
+        else:
+            text = self._classify(model_name, model_input, image)
+        
+        # 过滤结果：只保留数字，且长度为4位
+        digits = ''.join(c for c in (text or '') if c.isdigit())
+        if len(digits) != 4:
+            return None, 0.0
+        return digits, self._calculate_confidence(digits)
     
     def preprocess_image(self, image_data: bytes, method: str = 'standard') -> bytes:
         """
@@ -52,133 +889,230 @@ class EnhancedCaptchaRecognizer:
             处理后的图像数据
         """
         try:
-            # 将bytes转换为PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            
-            if method == 'standard':
-                # 标准处理：调整大小和对比度
-                if image.size[0] < 100 or image.size[1] < 40:
-                    # 放大小图片
-                    image = image.resize((image.size[0] * 2, image.size[1] * 2), Image.LANCZOS)
-                
-                # 增强对比度
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.5)
-                
-            elif method == 'denoise':
-                # 降噪处理
-                image = image.filter(ImageFilter.MedianFilter(size=3))
-                
-                # 转换为灰度图
-                if image.mode != 'L':
-                    image = image.convert('L')
-                    
-                # 增强锐度
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(2.0)
-                
-            elif method == 'enhance':
-                # 增强处理
-                # 转换为RGB
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                    
-                # 调整亮度
-                enhancer = ImageEnhance.Brightness(image)
-                image = enhancer.enhance(1.2)
-                
-                # 调整对比度
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.8)
-                
-                # 转换为灰度
-                image = image.convert('L')
-                
-            elif method == 'threshold':
-                # 二值化处理
-                # 转换为numpy数组
-                img_array = np.array(image)
-                if len(img_array.shape) == 3:
-                    img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-                    
-                # 高斯模糊
-                img_array = cv2.GaussianBlur(img_array, (3, 3), 0)
-                
-                # 自适应阈值
-                img_array = cv2.adaptiveThreshold(
-                    img_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY, 11, 2
-                )
-                
-                # 形态学操作去噪
-                kernel = np.ones((2, 2), np.uint8)
-                img_array = cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, kernel)
-                
-                # 转换回PIL Image
-                image = Image.fromarray(img_array)
-            
-            # 将处理后的图像转换为bytes
-            output = io.BytesIO()
-            image.save(output, format='PNG')
-            return output.getvalue()
+            image = self.decode_image(image_data)
+            if image is None:
+                raise ValueError("无法解码图像数据")
+            return self.encode_png(self.preprocess_array(image, method))
             
         except Exception as e:
             print(f"图像预处理失败 ({method}): {e}")
             return image_data  # 返回原始数据
     
-    def recognize_with_multiple_methods(self, image_data: bytes, save_path: str = None) -> Tuple[str, float]:
+    def recognize_with_multiple_methods(self, image_data: bytes, save_path: str = None, cascade: bool = None) -> Tuple[str, float]:
         """
         使用多种方法识别验证码
         
+        级联模式下按自适应策略（根据提交反馈学习的成功率和耗时）排序依次运行各方法/模型组合，
+        一旦有 consensus_k 个组合结果一致且平均置信度达到 consensus_threshold 即提前结束，
+        较昂贵的 enhance/threshold 预处理只在前面的结果不一致时才会运行
+        
         Args:
             image_data: 图像数据
-            save_path: 保存路径（可选）
+            save_path: 调试图片保存路径（可选，原图和各预处理图由 debug_writer 抽样后在后台写入）
+            cascade: 是否使用级联提前结束，默认使用 self.cascade
             
         Returns:
-            (识别结果, 置信度)
+            (识别结果, 校准后的置信度)
         """
+        processed_cache = {}
+        result, confidence = self._recognize(image_data, cascade, processed_cache)
+        
+        if save_path and self.debug_writer is not None:
+            self._save_debug_images(save_path, image_data, processed_cache,
+                                    failed=not result or confidence < self.min_confidence)
+        
+        return result, confidence
+        
+    def _recognize(self, image_data: bytes, cascade: Optional[bool], processed_cache: dict) -> Tuple[str, float]:
+        """recognize_with_multiple_methods 的识别过程，各方法的预处理结果保存在 processed_cache 中"""
+        if cascade is None:
+            cascade = self.cascade
+        
         results = []
+        executed = []
+        
+        # 只解码一次，各预处理方法均基于同一个数组
+        image = self.decode_image(image_data)
+        if image is None:
+            print("无法解码验证码图像数据")
+            return None, 0.0
+        
+        # 同一张验证码已确认过答案时直接返回
+        image_hash = perceptual_hash(image)
+        cached_answer = self.answer_cache.get(image_hash)
+        if cached_answer:
+            print(f"验证码答案缓存命中: {cached_answer}")
+            self._remember_for_feedback([], cached_answer, image, image_hash, source='cache')
+            return cached_answer, 0.95
         
-        # 预处理方法列表
-        preprocess_methods = ['standard', 'denoise', 'enhance', 'threshold']
+        # 快速识别：字符模板分类的近邻间隔足够大时直接采用，不运行ddddocr
+        fast_result = self._recognize_fast_path(image)
+        if fast_result:
+            result, raw_confidence = fast_result
+            self._remember_for_feedback([], result, image, image_hash, source='fast_path',
+                                        raw_confidence=raw_confidence)
+            return result, self.calibrator.calibrate(raw_confidence, 'fast_path')
         
-        for method in preprocess_methods:
+        combinations = self._ordered_combinations() if cascade else [
+            (method, model_name) for method in PREPROCESS_METHODS for model_name in self.ocr_models
+        ]
+        for method, model_name in combinations:
+            combo = f"{method}_{model_name}"
+            combo_start = time.perf_counter()
+            
+            # 每种预处理只执行一次，多个模型共用
+            if method not in processed_cache:
+                try:
+                    processed = self.preprocess_array(image, method)
+                    processed_cache[method] = (processed, self._to_model_input(processed))
+                except Exception as e:
+                    print(f"预处理方法 {method} 失败: {e}")
+                    processed_cache[method] = None
+            
+            if processed_cache[method] is None:
+                continue
+            processed, model_input = processed_cache[method]
+            
+            digit_result = None
             try:
-                # 预处理图像
-                processed_data = self.preprocess_image(image_data, method)
-                
-                # 保存预处理后的图像（用于调试）
-                if save_path:
-                    debug_path = save_path.replace('.png', f'_{method}.png')
-                    with open(debug_path, 'wb') as f:
-                        f.write(processed_data)
-                
-                # 使用不同的OCR模型识别
-                for model_name, ocr_model in self.ocr_models.items():
-                    try:
-                        result = ocr_model.classification(processed_data)
-                        # 过滤结果：只保留数字，且长度为4位
-                        if result:
-                            # 提取数字字符
-                            digit_result = ''.join(c for c in result if c.isdigit())
-                            if len(digit_result) == 4:  # 验证码必须是4位数字
-                                confidence = self._calculate_confidence(digit_result)
-                                results.append((digit_result, confidence, f"{method}_{model_name}"))
-                                print(f"方法 {method}_{model_name} 识别结果: {digit_result} (置信度: {confidence:.2f})")
-                    except Exception as e:
-                        print(f"模型 {model_name} 识别失败: {e}")
-                        
+                digit_result, confidence = self._recognize_digits(model_name, model_input, processed)
+                if digit_result:
+                    results.append((digit_result, confidence, combo))
+                    print(f"方法 {combo} 识别结果: {digit_result} (置信度: {confidence:.2f})")
             except Exception as e:
-                print(f"预处理方法 {method} 失败: {e}")
+                print(f"模型 {model_name} 识别失败: {e}")
+            
+            executed.append((combo, digit_result, time.perf_counter() - combo_start))
+            
+            if cascade and self._has_consensus(results):
+                print(f"已有 {self.consensus_k} 个方法结果一致，提前结束（运行 {len(executed)} 个组合）")
+                break
         
         if not results:
+            self._update_combo_stats(executed, None)
             return None, 0.0
         
         # 分析结果一致性，提高置信度
-        final_result, final_confidence = self._analyze_consistency_and_boost_confidence(results)
+        final_result, raw_confidence = self._analyze_consistency_and_boost_confidence(results)
+        self._update_combo_stats(executed, final_result)
+        self._remember_for_feedback(executed, final_result, image, image_hash, raw_confidence=raw_confidence)
         
+        final_confidence = self.calibrator.calibrate(raw_confidence, 'ensemble')
+        if abs(final_confidence - raw_confidence) >= 0.01:
+            print(f"置信度校准: {raw_confidence:.2f} -> {final_confidence:.2f}")
         return final_result, final_confidence
         
+    def _recognize_fast_path(self, image: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        使用字符模板快速识别
+        
+        Returns:
+            (识别结果, 置信度)，分类器不可用或近邻间隔不足时返回None
+        """
+        if self.digit_classifier is None or not self.digit_classifier.ready:
+            return None
+        
+        start = time.perf_counter()
+        try:
+            result, margin = self.digit_classifier.classify(image)
+        except Exception as e:
+            print(f"快速识别失败: {e}")
+            return None
+        self.fast_path_stats['attempts'] += 1
+        self.fast_path_stats['total_time'] += time.perf_counter() - start
+        
+        if not result or margin < self.fast_path_margin:
+            return None
+        
+        self.fast_path_stats['accepted'] += 1
+        confidence = min(0.95, 0.8 + margin / 2)
+        print(f"快速识别结果: {result} (间隔: {margin:.2f}，置信度: {confidence:.2f})")
+        return result, confidence
+        
+    def _ordered_combinations(self) -> list:
+        """
+        由自适应策略按采样成功率和耗时排列方法/模型组合，并跳过反馈表明基本无效的组合
+        （至少保留 consensus_k 个组合）
+        """
+        combinations = [(method, model_name) for method in PREPROCESS_METHODS for model_name in self.ocr_models]
+        return self.combo_policy.order(combinations, set(EXPENSIVE_METHODS), self.consensus_k)
+        
+    def _has_consensus(self, results: list) -> bool:
+        """判断是否已有足够多的结果一致且置信度达标"""
+        confidences = {}
+        for result, confidence, _ in results:
+            confidences.setdefault(result, []).append(confidence)
+        
+        for values in confidences.values():
+            if len(values) >= self.consensus_k and sum(values) / len(values) >= self.consensus_threshold:
+                return True
+        return False
+        
+    def _update_combo_stats(self, executed: list, final_result: Optional[str]):
+        """记录各组合的运行次数、与最终结果一致次数和耗时"""
+        self.combo_policy.record_run(executed, final_result)
+        
+    def _remember_for_feedback(self, executed: list, final_result: str, image: np.ndarray, image_hash: str,
+                               source: str = 'ensemble', raw_confidence: float = None, max_pending: int = 32):
+        """保存本次各组合的输出和图像，提交查询后由 record_feedback 更新策略、字符模板、答案缓存和置信度校准"""
+        self._pending_feedback.pop(final_result, None)
+        self._pending_feedback[final_result] = {
+            'combos': {combo: result for combo, result, _ in executed},
+            'image': image,
+            'image_hash': image_hash,
+            'source': source,
+            'raw_confidence': raw_confidence
+        }
+        while len(self._pending_feedback) > max_pending:
+            self._pending_feedback.popitem(last=False)
+        
+    def record_feedback(self, captcha_text: str, correct: bool):
+        """
+        记录提交验证码后的对错反馈
+        
+        只应在结果确定时调用：查询成功（答案正确）或网站明确提示验证码错误；
+        无法判断对错的情况（超时、页面异常）不要调用
+        
+        Args:
+            captcha_text: 提交的验证码
+            correct: 验证码是否正确
+        """
+        pending = self._pending_feedback.pop(captcha_text, None)
+        if not pending:
+            return
+        
+        if pending['combos']:
+            self.combo_policy.record_feedback(pending['combos'], captcha_text, correct)
+        if pending['source'] == 'fast_path' and not correct:
+            self.fast_path_stats['rejected'] += 1
+        if pending['raw_confidence'] is not None:
+            self.calibrator.update(pending['raw_confidence'], correct, pending['source'])
+        
+        if correct:
+            self.answer_cache.put(pending['image_hash'], captcha_text)
+            # 确认正确的验证码作为字符模板（缓存命中的图像已学习过）
+            if self.digit_classifier is not None and pending['source'] != 'cache':
+                self.digit_classifier.add_example(pending['image'], captcha_text)
+        elif pending['source'] == 'cache':
+            self.answer_cache.invalidate(pending['image_hash'])
+        
+    async def recognize_async(self, image_data: bytes, save_path: str = None) -> Tuple[str, float]:
+        """
+        异步识别验证码：在调度器线程池中执行多方法识别，不阻塞事件循环
+        
+        Args:
+            image_data: 图像数据
+            save_path: 保存路径（可选）
+            
+        Returns:
+            (识别结果, 置信度)
+        """
+        (result, confidence), queue_wait, compute_time = await self.ocr_dispatcher.run(
+            self.recognize_with_multiple_methods, image_data, save_path
+        )
+        print(f"验证码识别排队 {queue_wait * 1000:.0f}ms，计算 {compute_time * 1000:.0f}ms")
+        return result, confidence
+        
     def _analyze_consistency_and_boost_confidence(self, results: list) -> Tuple[str, float]:
         """
         分析多种方法识别结果的一致性，如果一致且置信度>0.5则提高置信度
@@ -274,86 +1208,143 @@ class EnhancedCaptchaRecognizer:
         
         return min(1.0, final_confidence)
     
-    async def get_captcha_from_page(self, page, save_filename: str = None) -> Tuple[Optional[str], Optional[bytes]]:
+    async def fetch_captcha_image(self, page) -> Optional[bytes]:
         """
-        从页面获取验证码并识别
+        获取页面当前验证码的图像数据（全部在内存中完成，不经过磁盘）
         
         Args:
             page: Playwright页面对象
-            save_filename: 保存文件名
             
         Returns:
-            (识别结果, 图像数据)
+            图像数据，获取失败返回None
         """
+        # 尝试多种选择器获取验证码
+        selectors = [
+            '.yzm-style-img',
+            'img[src*="captcha"]',
+            'img[src*="verify"]',
+            'img[alt*="验证码"]',
+            '.captcha-img',
+            '.verify-img'
+        ]
+        
+        captcha_element = None
+        for selector in selectors:
+            try:
+                captcha_element = await page.query_selector(selector)
+                if captcha_element:
+                    print(f"使用选择器 {selector} 找到验证码元素")
+                    break
+            except Exception:
+                continue
+        
+        if not captcha_element:
+            print("无法找到验证码元素")
+            return None
+        
+        image_data = None
+        
         try:
-            # 尝试多种选择器获取验证码
-            selectors = [
-                '.yzm-style-img',
-                'img[src*="captcha"]',
-                'img[src*="verify"]',
-                'img[alt*="验证码"]',
-                '.captcha-img',
-                '.verify-img'
-            ]
-            
-            captcha_element = None
-            for selector in selectors:
-                try:
-                    captcha_element = await page.query_selector(selector)
-                    if captcha_element:
-                        print(f"使用选择器 {selector} 找到验证码元素")
-                        break
-                except Exception:
-                    continue
-            
-            if not captcha_element:
-                print("无法找到验证码元素")
-                return None, None
-            
-            # 获取验证码图片数据
-            image_data = None
-            
-            # 方法1: 直接截图
+            src = await captcha_element.evaluate("el => el.currentSrc || el.src || ''")
+        except Exception:
+            src = None
+        
+        # 方法1: 解码base64数据
+        if src and src.startswith('data:image'):
+            try:
+                base64_data = src.split(',', 1)[1]
+                image_data = base64.b64decode(base64_data)
+                print("从base64获取验证码数据")
+            except Exception as e:
+                print(f"base64方法失败: {e}")
+        
+        # 方法2: 使用截获的验证码图片网络响应
+        if not image_data and src:
+            image_data = await self._get_captured_image(page, src)
+            if image_data:
+                print("从网络响应获取验证码数据")
+        
+        # 方法3: 元素截图（仅在内存中）
+        if not image_data:
             try:
-                if save_filename:
-                    screenshot_path = os.path.join(self.img_dir, save_filename)
-                    await captcha_element.screenshot(path=screenshot_path)
-                    with open(screenshot_path, 'rb') as f:
-                        image_data = f.read()
-                    print(f"验证码截图已保存: {screenshot_path}")
+                image_data = await captcha_element.screenshot()
+                print("从元素截图获取验证码数据")
             except Exception as e:
                 print(f"截图方法失败: {e}")
+        
+        if not image_data:
+            print("无法获取验证码图片数据")
+            return None
+        return image_data
+    
+    async def get_captcha_from_page(self, page, save_filename: str = None) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        从页面获取验证码并识别
+        
+        Args:
+            page: Playwright页面对象
+            save_filename: 保存文件名
             
-            # 方法2: 获取base64数据
-            if not image_data:
-                try:
-                    src = await captcha_element.get_attribute('src')
-                    if src and src.startswith('data:image'):
-                        base64_data = src.split(',')[1]
-                        image_data = base64.b64decode(base64_data)
-                        print("从base64获取验证码数据")
-                except Exception as e:
-                    print(f"base64方法失败: {e}")
-            
+        Returns:
+            (识别结果, 图像数据)
+        """
+        try:
+            image_data = await self.fetch_captcha_image(page)
             if not image_data:
-                print("无法获取验证码图片数据")
                 return None, None
             
-            # 使用增强识别方法
-            save_path = os.path.join(self.img_dir, save_filename) if save_filename else None
-            result, confidence = self.recognize_with_multiple_methods(image_data, save_path)
+            # 可选：识别完成后由后台写入器抽样保存验证码图片
+            save_path = None
+            if self.save_images and save_filename:
+                save_path = os.path.join(self.img_dir, save_filename)
+            
+            # 使用增强识别方法（在线程池中执行）
+            result, confidence = await self.recognize_async(image_data, save_path)
             
-            if result and confidence > 0.5:  # 降低置信度阈值，配合新的置信度提升机制
+            # 校准后置信度低于阈值时不提交，调用方直接刷新验证码，省去一次注定失败的提交
+            if result and confidence >= self.min_confidence:
                 print(f"验证码识别成功: {result} (置信度: {confidence:.2f})")
                 return result, image_data
             else:
-                print(f"验证码识别置信度较低: {result} (置信度: {confidence:.2f})")
+                print(f"验证码识别置信度较低: {result} (置信度: {confidence:.2f} < {self.min_confidence:.2f})")
                 return None, image_data
                 
         except Exception as e:
             print(f"获取验证码失败: {e}")
             return None, None
     
+    async def refresh_captcha(self, page, timeout: int = 1500) -> bool:
+        """
+        点击刷新验证码，并等待新图片加载完成
+        
+        Args:
+            page: Playwright页面对象
+            timeout: 最长等待时间（毫秒），超时后直接继续
+            
+        Returns:
+            是否检测到新验证码加载完成
+        """
+        try:
+            old_src = await page.get_attribute('.yzm-style-img', 'src')
+        except Exception:
+            old_src = None
+        
+        await page.click('.yzm-style-img')
+        
+        try:
+            # 等待图片地址变化且加载完成
+            await page.wait_for_function(
+                """(oldSrc) => {
+                    const img = document.querySelector('.yzm-style-img');
+                    return !!img && img.src !== oldSrc && img.complete && img.naturalWidth > 0;
+                }""",
+                arg=old_src,
+                timeout=timeout
+            )
+            return True
+        except Exception:
+            return False
+    
     async def refresh_and_recognize(self, page, max_attempts: int = 5) -> Optional[str]:
         """
         刷新验证码并尝试识别
@@ -372,8 +1363,7 @@ class EnhancedCaptchaRecognizer:
                 # 刷新验证码
                 if attempt > 0:
                     try:
-                        await page.click('.yzm-style-img')
-                        await page.wait_for_timeout(1000)
+                        await self.refresh_captcha(page, timeout=1000)
                         print("已刷新验证码")
                     except Exception as e:
                         print(f"刷新验证码失败: {e}")
@@ -398,7 +1388,7 @@ class EnhancedCaptchaRecognizer:
 # 使用示例
 if __name__ == "__main__":
     # 测试代码
-    recognizer = EnhancedCaptchaRecognizer()
+    recognizer = EnhancedCaptchaRecognizer(debug_writer=DebugImageWriter(sample_rate=1.0))
     
     # 测试图片文件
     test_image_path = "img/captcha_1.png"
@@ -408,5 +1398,6 @@ if __name__ == "__main__":
         
         result, confidence = recognizer.recognize_with_multiple_methods(image_data, "test_output.png")
         print(f"测试结果: {result}, 置信度: {confidence}")
+        recognizer.debug_writer.close()
     else:
         print(f"测试图片不存在: {test_image_path}")
\ No newline at end of file
@@ -155,11 +155,12 @@ async def example_csv_batch_query():
         print(f"查询失败: {stats['failed_queries']}")
         print(f"成功率: {stats['success_rate']:.1f}%")
         
-        # 保存结果
-        json_file, csv_file = checker.save_results()
-        print(f"\n结果文件:")
-        print(f"详细结果: {json_file}")
-        print(f"汇总表格: {csv_file}")
+        # 批量查询结束时已由进度日志生成报告（save_results 只导出逐条查询的结果）
+        json_file = checker.last_batch_result_path
+        if json_file:
+            print(f"\n结果文件:")
+            print(f"详细结果: {json_file}")
+            print(f"汇总表格: {os.path.splitext(json_file)[0]}.csv")
         
     except Exception as e:
         print(f"CSV批量查询过程中出现错误: {e}")
@@ -0,0 +1,225 @@
+import asyncio
+import base64
+import time
+from datetime import datetime
+from query_api import (
+    API_BASE_URL, API_ENDPOINTS, QUERY_FIELDS, ContractChangedError, classify_api_payload
+)
+
+try:
+    import aiohttp
+    ENABLE_AIOHTTP = True
+except ImportError:
+    ENABLE_AIOHTTP = False
+    print("警告: 未安装aiohttp库，无法使用直连接口查询模式")
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+class HttpQueryEngine:
+    """
+    直连接口查询引擎
+    不启动浏览器，直接调用验证码和查询接口；每个引擎拥有独立的Cookie会话，
+    多个引擎可共享同一个连接池。接口返回不符合约定时抛出 ContractChangedError，
+    由调用方回退到浏览器查询
+    """
+
+    def __init__(self, captcha_recognizer, base_url: str = API_BASE_URL, endpoints: dict = None,
+                 max_connections: int = 10, timeout: int = 15, max_captcha_attempts: int = 5,
+                 connector=None, fields: dict = None, record_keys: tuple = None):
+        """
+        Args:
+            captcha_recognizer: EnhancedCaptchaRecognizer 实例
+            base_url: 接口根地址（可指向本地模拟服务）
+            endpoints: 接口路径，默认使用 query_api.API_ENDPOINTS
+            max_connections: 连接池最大连接数
+            timeout: 单次请求超时（秒）
+            max_captcha_attempts: 验证码最大尝试次数
+            connector: 共享的 aiohttp.TCPConnector，为空时自行创建
+            fields: 覆盖 query_api.QUERY_FIELDS 中的请求字段名（如 {'cert_number': 'idCard'}）
+            record_keys: 承载记录列表的返回字段，默认使用 query_api.RECORD_LIST_KEYS
+        """
+        if not ENABLE_AIOHTTP:
+            raise ImportError("直连接口查询模式需要安装aiohttp: pip install aiohttp")
+
+        self.captcha_recognizer = captcha_recognizer
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = endpoints or API_ENDPOINTS
+        self.fields = dict(QUERY_FIELDS, **(fields or {}))
+        self.record_keys = record_keys
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_captcha_attempts = max_captcha_attempts
+        self.connector = connector
+        self._owns_connector = connector is None
+        self.session = None
+
+    async def start(self):
+        """创建HTTP会话（需在事件循环中调用）"""
+        if self.session:
+            return
+        if self.connector is None:
+            self.connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=self._owns_connector,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                'User-Agent': DEFAULT_USER_AGENT,
+                'Referer': f"{self.base_url}/"
+            }
+        )
+
+    def clone(self, captcha_recognizer) -> 'HttpQueryEngine':
+        """创建共享连接池、拥有独立Cookie会话的新引擎"""
+        return HttpQueryEngine(
+            captcha_recognizer,
+            base_url=self.base_url,
+            endpoints=self.endpoints,
+            max_connections=self.max_connections,
+            timeout=self.timeout,
+            max_captcha_attempts=self.max_captcha_attempts,
+            connector=self.connector,
+            fields=self.fields,
+            record_keys=self.record_keys
+        )
+
+    async def close(self):
+        """关闭HTTP会话"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def fetch_captcha(self):
+        """
+        获取验证码图片
+
+        Returns:
+            (图像数据, 验证码标识)
+        """
+        url = f"{self.base_url}{self.endpoints['captcha']}"
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise ContractChangedError(f"验证码接口返回状态码 {response.status}")
+
+            content_type = response.headers.get('Content-Type', '')
+            if content_type.startswith('image/'):
+                return await response.read(), None
+
+            try:
+                payload = await response.json(content_type=None)
+            except Exception:
+                raise ContractChangedError(f"验证码接口返回了无法识别的内容: {content_type}")
+
+        data = payload.get('data') if isinstance(payload, dict) else None
+        if not isinstance(data, dict) or not data.get('img'):
+            raise ContractChangedError(f"验证码接口返回格式无法识别: {str(payload)[:200]}")
+
+        img = data['img']
+        if img.startswith('data:image'):
+            img = img.split(',', 1)[1]
+        return base64.b64decode(img), data.get('uuid')
+
+    async def submit_query(self, cert_type: str, cert_number: str, name: str, query_type: int,
+                           captcha_text: str, captcha_id: str = None) -> dict:
+        """提交查询请求并分类返回结果"""
+        url = f"{self.base_url}{self.endpoints['query'][query_type]}"
+        body = {
+            self.fields['cert_type']: cert_type,
+            self.fields['cert_number']: cert_number,
+            self.fields['name']: name,
+            self.fields['captcha']: captcha_text
+        }
+        if captcha_id:
+            body[self.fields['captcha_id']] = captcha_id
+
+        async with self.session.post(url, json=body) as response:
+            if response.status != 200:
+                raise ContractChangedError(f"查询接口返回状态码 {response.status}")
+            try:
+                payload = await response.json(content_type=None)
+            except Exception:
+                raise ContractChangedError("查询接口未返回JSON")
+
+        classification = classify_api_payload(payload, self.record_keys)
+        classification['payload'] = payload
+        return classification
+
+    async def query_single_certificate(self, cert_type: str, cert_number: str, name: str, query_type: int = 1) -> dict:
+        """
+        查询单个证书（与 ImprovedCertificateChecker.query_single_certificate 返回格式一致）
+
+        Raises:
+            ContractChangedError: 接口返回不符合约定或内容无法处理
+        """
+        await self.start()
+        start_time = time.time()
+        captcha_time = 0.0
+        result_time = 0.0
+        attempts = 0
+
+        result = {
+            'cert_number': cert_number,
+            'name': name,
+            'query_type': query_type,
+            'query_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'captcha_failed',
+            'data': '验证码识别失败',
+            'screenshots': [],
+            'engine': 'http'
+        }
+
+        try:
+            for attempt in range(self.max_captcha_attempts):
+                attempts += 1
+
+                captcha_start = time.time()
+                image_data, captcha_id = await self.fetch_captcha()
+                captcha_text, confidence = await self.captcha_recognizer.recognize_async(image_data)
+                captcha_time += time.time() - captcha_start
+
+                if not captcha_text or confidence < self.captcha_recognizer.min_confidence:
+                    print(f"第 {attempt + 1} 次验证码识别置信度较低，重新获取")
+                    continue
+
+                query_start = time.time()
+                classification = await self.submit_query(
+                    cert_type, cert_number, name, query_type, captcha_text, captcha_id
+                )
+                result_time += time.time() - query_start
+
+                if classification['status'] == 'captcha_wrong':
+                    print(f"验证码 {captcha_text} 错误，重新获取")
+                    self.captcha_recognizer.record_feedback(captcha_text, False)
+                    continue
+                
+                self.captcha_recognizer.record_feedback(captcha_text, True)
+
+                result['status'] = classification['status']
+                if classification['status'] == 'found':
+                    result['data'] = classification['data']
+                elif classification['status'] == 'input_error':
+                    result['data'] = f"查询失败: {classification['message']}"
+                else:
+                    result['data'] = '查询成功，但未查询到相关信息'
+                break
+
+        except ContractChangedError:
+            raise
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # 验证码base64解码失败（binascii.Error）、字段缺失或类型不符等，同样视为接口已变化
+            raise ContractChangedError(f"接口返回内容无法处理: {e!r}") from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result['status'] = 'error'
+            result['data'] = str(e)
+
+        result['captcha_attempts'] = attempts
+        result['query_duration'] = {
+            'total_time': round(time.time() - start_time, 2),
+            'navigation_time': 0,
+            'selection_time': 0,
+            'input_time': 0,
+            'captcha_time': round(captcha_time, 2),
+            'result_time': round(result_time, 2)
+        }
+        return result
@@ -4,8 +4,17 @@ import csv
 import time
 import json
 from datetime import datetime
-from playwright.async_api import async_playwright
-from enhanced_captcha_recognizer import EnhancedCaptchaRecognizer
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from debug_image_writer import DebugImageWriter
+from enhanced_captcha_recognizer import CaptchaAnswerCache, EnhancedCaptchaRecognizer
+from browser_pool import BrowserContextPool, RssRecycleGate, park_page, should_recycle
+from csv_stream import CsvRowStream
+from result_sink import (JsonlResultSink, journal_path_for, latest_journal_for, load_completed_rows,
+                         rotate_existing, write_csv_report, write_json_report)
+from resource_blocker import ResourceBlocker
+from result_cache import ResultCache, normalize_cert_number
+from screenshot_policy import ScreenshotPolicy
+from query_api import ContractChangedError, QueryResponseListener, classify_api_payload
 
 # 添加Pillow兼容性代码
 try:
@@ -22,27 +31,188 @@ except ImportError:
     ENABLE_BS4 = False
     print("警告: 未安装BeautifulSoup库，无法使用HTML解析功能")
 
+# 可累加的统计计数字段（合并并发工作者或分片进程的统计信息时使用）
+COUNTER_STAT_KEYS = (
+    'total_queries',
+    'successful_queries',
+    'failed_queries',
+    'captcha_attempts',
+    'captcha_successes',
+    'found_results',
+    'not_found_results',
+    'input_error_results',
+    'unknown_results',
+    'blocked_requests',
+    'estimated_bytes_saved',
+    'loaded_bytes',
+    'cache_hits',
+    'duplicate_rows'
+)
+
+def merge_statistics(target: dict, source: dict) -> dict:
+    """将 source 中的统计计数累加到 target，并重新计算验证码成功率"""
+    for key in COUNTER_STAT_KEYS:
+        target[key] = target.get(key, 0) + source.get(key, 0)
+    if target.get('captcha_attempts', 0) > 0:
+        target['captcha_success_rate'] = target['captcha_successes'] / target['captcha_attempts']
+    return target
+
+# 结果CSV的列
+RESULT_CSV_FIELDS = [
+    'cert_number', 'name', 'query_type', 'status', 'query_time',
+    'response_time', 'captcha_attempts', 'error_message', 'cached', 'duplicate'
+]
+
+# 流式批量查询时保留用于去重的已完成记录条数（只保留结果在进度日志中的位置，内存占用有上限）
+STREAM_DEDUPE_LIMIT = 10000
+
+# 断点续查时可选择重新查询的结果状态（其余状态视为已完成）
+RETRYABLE_STATUSES = ('captcha_failed', 'error')
+
+def save_batch_report(result_path: str, jsonl_paths: list, statistics: dict, latest_only: bool = False) -> str:
+    """
+    由JSONL结果文件逐条生成批量查询JSON报告和同名CSV（不将全部结果读入内存）
+    
+    Args:
+        result_path: 报告JSON路径，CSV保存在同名 .csv 文件
+        jsonl_paths: 结果JSONL文件列表（按顺序合并）
+        statistics: 统计信息
+        latest_only: 每个CSV行（row 字段）只保留最后一次结果并按行号输出（断点续查时使用）
+        
+    Returns:
+        报告JSON路径
+    """
+    write_json_report(jsonl_paths, result_path, 'results', {
+        'query_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'statistics': statistics
+    }, count_key='total_count', latest_only=latest_only)
+    write_csv_report(jsonl_paths, os.path.splitext(result_path)[0] + '.csv', RESULT_CSV_FIELDS, latest_only)
+    return result_path
+
+# 证件类型下拉选项
+DROPDOWN_OPTION_SELECTOR = ".ant-select-item-option, .ant-select-dropdown li, [role='option']"
+
+# 处于展开状态的下拉框
+OPEN_DROPDOWN_SELECTOR = ".ant-select-dropdown:not(.ant-select-dropdown-hidden)"
+
+# 查询结果或提示信息已渲染的标志元素
+RESULT_READY_SELECTOR = (
+    ".ant-message-notice, .ant-notification-notice, .ant-table, table, "
+    ".ant-result, .ant-empty, .no-data, .empty-result, .no-result"
+)
+
+# 提交查询前已存在的结果元素被标记为旧元素，等待时只匹配提交后新渲染的元素
+STALE_RESULT_ATTRIBUTE = "data-stale-result"
+FRESH_RESULT_SELECTOR = ", ".join(
+    f"{selector.strip()}:not([{STALE_RESULT_ATTRIBUTE}])" for selector in RESULT_READY_SELECTOR.split(",")
+)
+
+# 提交查询后等待查询接口响应或结果渲染的总时长（秒）
+SUBMIT_RESULT_TIMEOUT = 2.0
+
 class ImprovedCertificateChecker:
     """
     改进版证书查询器
     集成增强型验证码识别功能
     """
     
-    def __init__(self):
+    def __init__(self, max_queries_per_context: int = 200, max_context_rss_bytes: int = None,
+                 block_resources: bool = False, resource_blocker: ResourceBlocker = None,
+                 engine: str = 'browser', http_engine_options: dict = None, captcha_cache_path: str = None,
+                 debug_image_options: dict = None, captcha_min_confidence: float = 0.3,
+                 result_cache_path: str = None, result_cache_ttls: dict = None, bypass_result_cache: bool = False,
+                 screenshot_options: dict = None, api_url_patterns: tuple = None, api_fields: dict = None,
+                 api_record_keys: tuple = None, shared_from: 'ImprovedCertificateChecker' = None):
+        """
+        Args:
+            max_queries_per_context: 批量查询时单个浏览器上下文最多服务的查询次数，达到后回收重建
+            max_context_rss_bytes: 浏览器进程内存上限（字节），超过后回收上下文（需要psutil）
+            block_resources: 是否拦截查询流程不需要的图片、字体和统计脚本（默认关闭；网站自身的图片和接口调用
+                             按主机名放行，验证码改由其他域名提供时需通过 resource_blocker 的 allow_rules 放行）
+            resource_blocker: 自定义拦截策略，默认使用 ResourceBlocker()
+            engine: 查询引擎，'browser' 使用浏览器查询，'http' 直连查询接口并在接口变化时回退到浏览器
+            http_engine_options: 传给 HttpQueryEngine 的参数（如 base_url 指向本地模拟服务）
+            captcha_cache_path: 已确认验证码答案缓存的保存文件，为None时只在内存中缓存
+            debug_image_options: 传给 DebugImageWriter 的参数（验证码调试图片和查询截图的抽样策略），
+                                 默认抽样1%并保留失败样本
+            captcha_min_confidence: 验证码校准后置信度低于该值时不提交，直接刷新验证码重新识别
+            result_cache_path: 查询结果缓存（SQLite）文件，有效期内重复查询同一个人时直接返回缓存结果；
+                               为None时不使用缓存
+            result_cache_ttls: 各结果状态的缓存有效期（秒），覆盖 result_cache.DEFAULT_RESULT_TTLS
+            bypass_result_cache: 不读取缓存（每次都查询网站），新结果仍写入缓存
+            screenshot_options: 传给 ScreenshotPolicy 的参数（截图模式、格式、质量、最大宽度），
+                                默认按 debug_image_options 的抽样策略保存PNG整页截图
+            api_url_patterns: 查询接口URL特征（浏览器查询据此捕获接口响应），默认使用 query_api.API_ENDPOINTS
+                              中的查询接口路径；query_api 中的接口约定是未经验证的推测值，网站实际不同时在此覆盖
+            api_fields: 覆盖直连查询的请求字段名（query_api.QUERY_FIELDS）
+            api_record_keys: 查询接口返回中承载记录列表的字段，默认使用 query_api.RECORD_LIST_KEYS
+            shared_from: 创建并发查询工作者时传入批量查询的主查询器，工作者直接使用其浏览器、
+                         拦截策略、调试图片写入器、结果缓存和验证码学习组件，不再读取文件、创建目录；
+                         此时忽略其余参数
+        """
+        self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
-        self.captcha_recognizer = EnhancedCaptchaRecognizer()
+        self.user_agent = None
+        
+        # 上下文回收策略
+        self.max_queries_per_context = max_queries_per_context
+        self.max_context_rss_bytes = max_context_rss_bytes
+        self._rss_gate = RssRecycleGate(max_context_rss_bytes) if max_context_rss_bytes else None
+        self._context_query_count = 0
         
-        # 创建保存文件的目录
+        self._screenshot_time = 0.0
+        self._api_classification = None
+        self._captcha_rejected = False
+        self._result_element = None
+        self.headless = False
+        self.http_engine = None
+        # 直连引擎停用标志和回退浏览器的启动锁，主查询器与所有工作者共享同一份
+        self._parent = shared_from
+        self._engine_state = shared_from._engine_state if shared_from is not None else {
+            'http_disabled': False, 'browser_lock': None
+        }
+        # 工作者回退到浏览器查询时在共享浏览器中自行创建的上下文
+        self._owns_context = False
         self.img_dir = "img"
         self.output_dir = "output"
         self.results_dir = "查询结果"
         
-        for directory in [self.img_dir, self.output_dir, self.results_dir]:
-            os.makedirs(directory, exist_ok=True)
-            
-        print(f"已创建目录: {self.img_dir}, {self.output_dir}, {self.results_dir}")
+        if shared_from is not None:
+            self._share_components(shared_from)
+        else:
+            # 资源拦截策略
+            self.resource_blocker = (resource_blocker or ResourceBlocker()) if block_resources else None
+            # 调试图片（验证码、查询截图）由后台写入器抽样保存，不阻塞查询流程
+            self.debug_writer = DebugImageWriter(**(debug_image_options or {}))
+            self.screenshot_policy = ScreenshotPolicy(**(screenshot_options or {}))
+            self.captcha_recognizer = EnhancedCaptchaRecognizer(
+                answer_cache=CaptchaAnswerCache(path=captcha_cache_path),
+                debug_writer=self.debug_writer,
+                min_confidence=captcha_min_confidence
+            )
+            self.result_cache = None
+            if result_cache_path:
+                self.result_cache = ResultCache(result_cache_path, ttls=result_cache_ttls, bypass=bypass_result_cache)
+            
+            # 查询接口响应监听（根据接口JSON分类结果，页面HTML解析仅作兜底）
+            self.response_listener = QueryResponseListener(url_patterns=api_url_patterns)
+            self.api_record_keys = api_record_keys
+            
+            # 直连接口查询引擎
+            if engine == 'http':
+                from http_query_engine import HttpQueryEngine
+                http_engine_options = dict(http_engine_options or {})
+                http_engine_options.setdefault('fields', api_fields)
+                http_engine_options.setdefault('record_keys', api_record_keys)
+                self.http_engine = HttpQueryEngine(self.captcha_recognizer, **http_engine_options)
+            
+            # 创建保存文件的目录
+            for directory in [self.img_dir, self.output_dir, self.results_dir]:
+                os.makedirs(directory, exist_ok=True)
+                
+            print(f"已创建目录: {self.img_dir}, {self.output_dir}, {self.results_dir}")
         
         # 查询统计
         self.stats = {
@@ -57,15 +227,34 @@ class ImprovedCertificateChecker:
             'found_results': 0,        # 查询成功且找到信息
             'not_found_results': 0,    # 查询成功但未找到信息
             'input_error_results': 0,  # 输入信息有误
-            'unknown_results': 0       # 无法确定结果类型
+            'unknown_results': 0,      # 无法确定结果类型
+            'blocked_requests': 0,     # 拦截的非必要请求数
+            'estimated_bytes_saved': 0, # 拦截节省的估算流量（字节）
+            'loaded_bytes': 0,         # 启用拦截时按content-length统计的实际加载流量（字节）
+            'cache_hits': 0,           # 直接使用缓存结果的查询数
+            'duplicate_rows': 0        # 与之前记录重复、复用其结果的CSV行数
         }
         
-        # 存储查询结果
+        # 存储查询结果（流式批量查询时不在内存中保留），同时逐条追加到本次会话的JSONL结果文件
         self.query_results = []
+        # 工作者的结果由批量查询汇总，工作者本身不保留
+        self.keep_query_results = shared_from is None
+        self.result_sink = None
+        self.last_batch_result_path = None
     
     async def initialize(self, headless: bool = False):
-        """初始化浏览器"""
-        playwright = await async_playwright().start()
+        """初始化浏览器（直连接口模式下只创建HTTP会话，浏览器在需要回退时再启动）"""
+        self.headless = headless
+        if self.http_engine:
+            await self.http_engine.start()
+            print("已启用直连接口查询模式")
+            return
+        await self._launch_browser(headless)
+        
+    async def _launch_browser(self, headless: bool = False):
+        """启动浏览器并打开网站首页"""
+        self.playwright = await async_playwright().start()
+        playwright = self.playwright
         browser_type = os.getenv("BROWSER", "chromium").lower()
         ua = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         if browser_type == "firefox":
@@ -98,20 +287,111 @@ class ImprovedCertificateChecker:
                 ]
             )
         
-        self.context = await self.browser.new_context(
-            user_agent=ua,
+        self.user_agent = ua
+        self.context, self.page = await self._open_context()
+        
+        await self.page.goto("https://cx.mem.gov.cn/")
+        print("浏览器已初始化并打开网站首页")
+        
+    async def _open_context(self):
+        """在已启动的浏览器中创建新的上下文和页面"""
+        context = await self.browser.new_context(
+            user_agent=self.user_agent,
             viewport={'width': 1366, 'height': 768},
             locale='zh-CN',
             timezone_id='Asia/Shanghai'
         )
         
-        self.page = await self.context.new_page()
+        page = await context.new_page()
         
         # 设置页面超时
-        self.page.set_default_timeout(30000)
+        page.set_default_timeout(30000)
         
-        await self.page.goto("https://cx.mem.gov.cn/")
-        print("浏览器已初始化并打开网站首页")
+        # 拦截非必要资源
+        if self.resource_blocker:
+            await self.resource_blocker.attach(page)
+        
+        # 监听查询接口响应和验证码图片响应
+        self.response_listener.attach(page)
+        EnhancedCaptchaRecognizer.attach_network_capture(page)
+        
+        return context, page
+        
+    def _create_worker(self) -> 'ImprovedCertificateChecker':
+        """
+        创建并发查询工作者
+        
+        工作者共享当前浏览器，拥有独立的验证码识别器和统计信息，
+        每次查询时从上下文池领取页面
+        """
+        return ImprovedCertificateChecker(shared_from=self)
+        
+    def _share_components(self, parent: 'ImprovedCertificateChecker'):
+        """工作者使用主查询器的浏览器和各共享组件，验证码识别器只持有自己的待反馈记录"""
+        self.browser = parent.browser
+        self.user_agent = parent.user_agent
+        self.headless = parent.headless
+        self.resource_blocker = parent.resource_blocker
+        self.response_listener = parent.response_listener
+        self.api_record_keys = parent.api_record_keys
+        self.debug_writer = parent.debug_writer
+        self.screenshot_policy = parent.screenshot_policy
+        self.result_cache = parent.result_cache
+        # 共享组合选择策略、快速识别模板、答案缓存和置信度校准，所有工作者的验证码反馈汇总学习
+        recognizer = parent.captcha_recognizer
+        self.captcha_recognizer = EnhancedCaptchaRecognizer(
+            combo_policy=recognizer.combo_policy,
+            fast_path=recognizer.digit_classifier is not None,
+            digit_classifier=recognizer.digit_classifier,
+            answer_cache=recognizer.answer_cache,
+            debug_writer=parent.debug_writer,
+            calibrator=recognizer.calibrator,
+            min_confidence=recognizer.min_confidence
+        )
+        if parent.http_engine:
+            self.http_engine = parent.http_engine.clone(self.captcha_recognizer)
+        
+    @property
+    def _http_engine_disabled(self) -> bool:
+        """直连引擎是否已停用（接口变化后主查询器和所有工作者一起回退到浏览器查询）"""
+        return self._engine_state['http_disabled']
+        
+    @_http_engine_disabled.setter
+    def _http_engine_disabled(self, value: bool):
+        self._engine_state['http_disabled'] = value
+        
+    async def _fall_back_to_browser(self):
+        """
+        停用直连引擎并准备浏览器查询：整个批量查询只启动一个浏览器（由主查询器持有），
+        工作者在其中创建各自的上下文
+        """
+        self._http_engine_disabled = True
+        root = self._parent or self
+        if self._engine_state['browser_lock'] is None:
+            self._engine_state['browser_lock'] = asyncio.Lock()
+        async with self._engine_state['browser_lock']:
+            if not root.browser:
+                await root._launch_browser(root.headless)
+        if self is not root and not self.page:
+            self.browser = root.browser
+            self.user_agent = root.user_agent
+            self.context, self.page = await self._open_context()
+            self._owns_context = True
+        
+    async def _recycle_context_if_needed(self, query_type: int):
+        """逐条查询模式下，达到回收条件时重建当前上下文并停靠在查询页面"""
+        self._context_query_count += 1
+        if not self.context or not should_recycle(self._context_query_count, self.max_queries_per_context, self._rss_gate):
+            return
+        
+        print(f"回收浏览器上下文（已服务 {self._context_query_count} 次查询）")
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+        self.context, self.page = await self._open_context()
+        await park_page(self.page, query_type)
+        self._context_query_count = 0
         
     async def navigate_to_search_page(self, query_type: int):
         """
@@ -206,8 +486,11 @@ class ImprovedCertificateChecker:
                 if not dropdown_clicked:
                     raise Exception("无法找到证件类型下拉框")
                 
-                # 减少等待时间，等待下拉选项出现
-                await self.page.wait_for_timeout(500)
+                # 等待下拉选项渲染出来
+                await self._wait_until(
+                    self.page.wait_for_selector(DROPDOWN_OPTION_SELECTOR, state="visible", timeout=500),
+                    "下拉选项出现"
+                )
                 
                 # 多种方式尝试选择证件类型
                 option_selectors = [
@@ -234,8 +517,11 @@ class ImprovedCertificateChecker:
                         continue
                 
                 if option_selected:
-                    # 验证选择是否成功，减少等待时间
-                    await self.page.wait_for_timeout(300)
+                    # 等待下拉框收起，表示选择已生效
+                    await self._wait_until(
+                        self.page.wait_for_selector(OPEN_DROPDOWN_SELECTOR, state="hidden", timeout=300),
+                        "下拉框收起"
+                    )
                     return
                 else:
                     raise Exception(f"无法找到证件类型选项: {cert_type}")
@@ -243,8 +529,7 @@ class ImprovedCertificateChecker:
             except Exception as e:
                 print(f"第 {attempt + 1} 次选择证件类型失败: {str(e)}")
                 if attempt < max_attempts - 1:
-                    print("等待1秒后重试...")
-                    await self.page.wait_for_timeout(1000)
+                    print("刷新页面后重试...")
                     # 尝试刷新页面或重新导航，设置超时
                     try:
                         await self.page.reload(timeout=5000)
@@ -270,12 +555,49 @@ class ImprovedCertificateChecker:
             print(f"输入证件信息时出错: {str(e)}")
             raise
             
-    async def solve_captcha_with_retry(self, max_attempts: int = 5) -> bool:
+    async def _prefetch_captcha(self) -> dict:
+        """
+        在选择证件类型、输入证件信息的同时获取并识别验证码
+        
+        Returns:
+            {'text': 识别结果, 'src': 识别时的验证码图片地址, 'elapsed': 耗时}
+        """
+        start = time.time()
+        text = None
+        src = None
+        try:
+            # 等待验证码图片加载完成
+            await self._wait_until(
+                self.page.wait_for_function(
+                    """() => {
+                        const img = document.querySelector('.yzm-style-img');
+                        return !!img && img.complete && img.naturalWidth > 0;
+                    }""",
+                    timeout=2000
+                ),
+                "验证码图片加载"
+            )
+            src = await self._get_captcha_src()
+            filename = f"captcha_{int(time.time())}_0.png"
+            text, _ = await self.captcha_recognizer.get_captcha_from_page(self.page, filename)
+        except Exception as e:
+            print(f"预先识别验证码失败: {e}")
+        return {'text': text, 'src': src, 'elapsed': time.time() - start}
+        
+    async def _get_captcha_src(self):
+        """获取当前验证码图片地址（用于判断验证码是否已变化）"""
+        try:
+            return await self.page.get_attribute('.yzm-style-img', 'src')
+        except Exception:
+            return None
+            
+    async def solve_captcha_with_retry(self, max_attempts: int = 5, prefetched: dict = None) -> bool:
         """
         使用增强识别器解决验证码，支持重试
         
         Args:
             max_attempts: 最大尝试次数
+            prefetched: _prefetch_captcha 的结果；验证码未变化时第一次尝试直接使用其识别结果
             
         Returns:
             是否成功解决验证码
@@ -289,16 +611,21 @@ class ImprovedCertificateChecker:
                 timestamp = int(time.time())
                 filename = f"captcha_{timestamp}_{attempt}.png"
                 
-                captcha_result = await self.captcha_recognizer.get_captcha_from_page(
-                    self.page, filename
-                )
+                if attempt == 0 and prefetched and prefetched['src'] \
+                        and prefetched['src'] == await self._get_captcha_src():
+                    captcha_result = (prefetched['text'], None)
+                else:
+                    if attempt == 0 and prefetched and prefetched['src']:
+                        print("验证码在填写表单期间已变化，重新识别")
+                    captcha_result = await self.captcha_recognizer.get_captcha_from_page(
+                        self.page, filename
+                    )
                 
                 if not captcha_result[0]:  # 识别失败
                     if attempt < max_attempts - 1:
                         # 刷新验证码
                         try:
-                            await self.page.click('.yzm-style-img')
-                            await self.page.wait_for_timeout(1500)
+                            await self.captcha_recognizer.refresh_captcha(self.page, timeout=1500)
                             print("已刷新验证码")
                         except Exception as e:
                             print(f"刷新验证码失败: {e}")
@@ -316,14 +643,17 @@ class ImprovedCertificateChecker:
                 if await self._submit_and_check():
                     print(f"验证码识别成功: {captcha_text}")
                     self.stats['captcha_successes'] += 1
+                    self.captcha_recognizer.record_feedback(captcha_text, True)
                     return True
                 else:
+                    # 只有网站明确提示验证码错误时才作为负反馈，超时等不确定情况不计入
+                    if self._captcha_rejected:
+                        self.captcha_recognizer.record_feedback(captcha_text, False)
                     print(f"验证码 {captcha_text} 可能错误，尝试重新识别")
                     if attempt < max_attempts - 1:
                         # 刷新验证码
                         try:
-                            await self.page.click('.yzm-style-img')
-                            await self.page.wait_for_timeout(1500)
+                            await self.captcha_recognizer.refresh_captcha(self.page, timeout=1500)
                         except Exception:
                             pass
                     
@@ -354,21 +684,48 @@ class ImprovedCertificateChecker:
             raise Exception("无法找到验证码输入框")
             
         await captcha_input.fill("")
-        await self.page.wait_for_timeout(300)
         await captcha_input.fill(captcha_text)
-        await self.page.wait_for_timeout(500)
+        
+        # 等待输入框的值与验证码一致（前端框架完成数据绑定）
+        await self._wait_until(
+            self.page.wait_for_function(
+                "([element, value]) => element.value === value",
+                arg=[captcha_input, captcha_text],
+                timeout=500
+            ),
+            "验证码输入生效"
+        )
         
     async def _submit_and_check(self) -> bool:
         """提交查询并检查是否成功（区分验证码错误和查询结果）"""
         try:
             # 记录当前URL，用于检测页面跳转
             current_url = self.page.url
-            
-            # 点击查询按钮
+            self._api_classification = None
+            self._captcha_rejected = False
+            self.response_listener.arm(self.page)
+            
+            # 标记提交前已存在的结果元素，避免旧的表格等元素被当作本次查询结果
+            await self.page.evaluate(
+                "([selector, attribute]) => document.querySelectorAll(selector)"
+                ".forEach(element => element.setAttribute(attribute, ''))",
+                [RESULT_READY_SELECTOR, STALE_RESULT_ATTRIBUTE]
+            )
             await self.page.click("button:has-text('查询')")
             
-            # 等待页面响应
-            await self.page.wait_for_timeout(2000)
+            # 查询接口响应和结果渲染在同一个时限内竞争，任一先完成即继续
+            payload = await self._wait_for_submit_outcome(SUBMIT_RESULT_TIMEOUT)
+            
+            # 优先根据查询接口返回的JSON判断
+            api_classification = self._classify_api_payload(payload)
+            if api_classification:
+                if api_classification['status'] == 'captcha_wrong':
+                    print(f"查询接口返回验证码错误: {api_classification['message']}")
+                    self._captcha_rejected = True
+                    return False
+                print(f"查询接口返回结果: {api_classification['status']}")
+                self._api_classification = api_classification
+                return True
             
             # 首先检查是否有验证码相关的错误提示
             captcha_error_indicators = [
@@ -380,6 +737,7 @@ class ImprovedCertificateChecker:
             for error_text in captcha_error_indicators:
                 if error_text in page_content:
                     print(f"检测到验证码错误提示: {error_text}")
+                    self._captcha_rejected = True
                     return False
             
             # 检查特定的验证码错误元素
@@ -397,6 +755,7 @@ class ImprovedCertificateChecker:
                         error_text = await error_element.inner_text()
                         if "验证码" in error_text:
                             print(f"检测到验证码错误元素: {error_text}")
+                            self._captcha_rejected = True
                             return False
                 except Exception:
                     continue
@@ -444,16 +803,104 @@ class ImprovedCertificateChecker:
             print(f"提交查询时出错: {e}")
             return False
             
-
+    async def _wait_for_submit_outcome(self, timeout: float):
+        """
+        提交查询后在同一个时限内等待查询接口响应或新的结果元素渲染，任一先完成即返回
+        
+        Returns:
+            捕获到的查询接口JSON，未捕获到（超时或页面先渲染出结果）时返回None
+        """
+        payload_task = asyncio.ensure_future(self.response_listener.wait_for_payload(self.page, timeout))
+        render_task = asyncio.ensure_future(
+            self.page.wait_for_selector(FRESH_RESULT_SELECTOR, state="attached", timeout=timeout * 1000)
+        )
+        try:
+            await asyncio.wait([payload_task, render_task], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (payload_task, render_task):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(payload_task, render_task, return_exceptions=True)
+        
+        if payload_task.done() and not payload_task.cancelled() and payload_task.exception() is None:
+            if payload_task.result() is not None:
+                return payload_task.result()
+        if not render_task.cancelled() and render_task.exception() is None:
+            return None
+        print("等待查询接口响应和查询结果渲染超时，继续检查页面")
+        return None
+        
+    def _classify_api_payload(self, payload):
+        """
+        根据捕获到的查询接口JSON分类查询结果
+        
+        Returns:
+            分类结果，未捕获到接口响应或返回格式无法识别时返回None
+        """
+        if payload is None:
+            return None
+        try:
+            return classify_api_payload(payload, self.api_record_keys)
+        except ContractChangedError as e:
+            print(f"查询接口返回格式无法识别，改为解析页面: {e}")
+            return None
+            
+    async def _wait_until(self, waiter, description: str) -> bool:
+        """
+        等待页面条件满足，超时作为兜底直接继续
+        
+        Args:
+            waiter: Playwright等待协程（需自带timeout上限）
+            description: 等待内容描述，用于日志
+            
+        Returns:
+            条件是否在超时前满足
+        """
+        try:
+            await waiter
+            return True
+        except PlaywrightTimeoutError:
+            print(f"等待{description}超时，继续执行")
+            return False
             
     async def get_query_result(self, cert_number: str, name: str) -> dict:
-        """获取查询结果 - 增强版"""
+        """获取查询结果 - 增强版（结果确定后按抽样策略保存截图）"""
+        self._result_element = None
+        result = await self._classify_query_result(cert_number, name)
+        await self._save_result_screenshots(result, cert_number, name)
+        self._result_element = None
+        return result
+        
+    async def _save_result_screenshots(self, result: dict, cert_number: str, name: str):
+        """
+        保存查询截图：由截图策略决定是否截图及截哪些区域（抽样模式下由调试图片写入器决定），
+        截图在页面上完成后交给后台线程缩放、编码和写入
+        """
+        self._screenshot_time = 0.0
+        failed = result['status'] not in ('found', 'not_found')
+        decision = self.screenshot_policy.decide(failed, self.debug_writer)
+        if decision is None:
+            return
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        prefix = os.path.join(self.output_dir, f"{name}_{cert_number[-6:]}_{timestamp}")
+        start = time.time()
+        images = await self.screenshot_policy.capture(self.page, self._result_element, prefix)
+        self._screenshot_time = time.time() - start
+        
+        result.setdefault('screenshots', []).extend(self.debug_writer.save_group(images, decision, failed))
+        
+    async def _classify_query_result(self, cert_number: str, name: str) -> dict:
+        """确定查询结果类型和数据"""
         import re
         
         try:
-            # 确保页面完全加载
+            # 确保页面完全加载，并等待动态结果内容渲染
             await self.page.wait_for_load_state("networkidle")
-            await self.page.wait_for_timeout(3000)  # 额外等待动态内容
+            await self._wait_until(
+                self.page.wait_for_selector(FRESH_RESULT_SELECTOR, state="attached", timeout=3000),
+                "查询结果渲染"
+            )
             
             # 检查是否还在加载中
             loading_selectors = [".loading", ".spinner", "[class*='loading']", ".ant-spin"]
@@ -473,11 +920,21 @@ class ImprovedCertificateChecker:
                 'screenshots': []
             }
             
-            # 保存页面截图
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = os.path.join(self.output_dir, f"{name}_{cert_number[-6:]}_{timestamp}_截图.png")
-            await self.page.screenshot(path=screenshot_path, full_page=True)
-            result['screenshots'].append(screenshot_path)
+            
+            # 已从查询接口JSON得到分类结果时，无需解析页面
+            api_classification, self._api_classification = self._api_classification, None
+            if api_classification:
+                result['status'] = api_classification['status']
+                result['classified_by'] = 'api'
+                if api_classification['status'] == 'found':
+                    result['data'] = api_classification['data']
+                elif api_classification['status'] == 'input_error':
+                    result['data'] = f"查询失败: {api_classification['message']}"
+                else:
+                    result['data'] = '查询成功，但未查询到相关信息'
+                print(f"根据查询接口返回确定结果: {result['status']}")
+                return result
             
             # 获取页面内容
             page_content = await self.page.content()
@@ -504,14 +961,8 @@ class ImprovedCertificateChecker:
                 result['status'] = 'found'
                 result['data'] = result_confidence['data']
                 
-                # 保存结果截图
-                if result_confidence['element']:
-                    try:
-                        result_screenshot_path = os.path.join(self.output_dir, f"{name}_{cert_number[-6:]}_{timestamp}_结果截图.png")
-                        await result_confidence['element'].screenshot(path=result_screenshot_path)
-                        result['screenshots'].append(result_screenshot_path)
-                    except Exception:
-                        pass
+                # 结果区域截图由 _save_result_screenshots 按抽样策略保存
+                self._result_element = result_confidence['element']
                 
                 # 转换为结构化数据
                 if ENABLE_BS4 and result_confidence['data_type'] == 'table':
@@ -800,8 +1251,105 @@ class ImprovedCertificateChecker:
             print(f"解析表格数据失败: {e}")
             return []
             
+    def _update_result_stats(self, status: str, total_time: float):
+        """按查询结果类型更新详细统计"""
+        if status == 'found':
+            self.stats['successful_queries'] += 1
+            self.stats['found_results'] += 1
+            print(f"查询成功(找到信息): {status}，总耗时: {total_time:.2f}秒")
+        elif status == 'not_found':
+            self.stats['successful_queries'] += 1
+            self.stats['not_found_results'] += 1
+            print(f"查询成功(未找到信息): {status}，总耗时: {total_time:.2f}秒")
+        elif status == 'input_error':
+            self.stats['failed_queries'] += 1
+            self.stats['input_error_results'] += 1
+            print(f"查询失败(输入错误): {status}，总耗时: {total_time:.2f}秒")
+        elif status == 'unknown':
+            self.stats['failed_queries'] += 1
+            self.stats['unknown_results'] += 1
+            print(f"查询完成(结果未知): {status}，总耗时: {total_time:.2f}秒")
+        else:
+            self.stats['failed_queries'] += 1
+            print(f"查询失败: {status}，总耗时: {total_time:.2f}秒")
+            
+    async def _query_via_http(self, cert_type: str, cert_number: str, name: str, query_type: int):
+        """
+        通过直连接口查询；接口返回不符合约定时停用所有工作者的直连引擎并回退到共享浏览器
+        
+        Returns:
+            查询结果，需要回退到浏览器查询时返回None
+        """
+        start_time = time.time()
+        if self.stats['start_time'] is None:
+            self.stats['start_time'] = start_time
+        
+        try:
+            print(f"\n开始查询(直连接口): {name} - {cert_number}")
+            result = await self.http_engine.query_single_certificate(cert_type, cert_number, name, query_type)
+        except ContractChangedError as e:
+            if not self._http_engine_disabled:
+                print(f"查询接口返回格式已变化，回退到浏览器查询: {e}")
+            await self._fall_back_to_browser()
+            return None
+        
+        self.stats['total_queries'] += 1
+        self.stats['captcha_attempts'] += result.get('captcha_attempts', 0)
+        if result['status'] not in ('captcha_failed', 'error'):
+            self.stats['captcha_successes'] += 1
+        self._update_result_stats(result['status'], time.time() - start_time)
+        
+        if self.stats['start_time']:
+            self.stats['total_time'] = time.time() - self.stats['start_time']
+        
+        self._remember_result(result)
+        return result
+        
+    def _cached_result(self, cert_type: str, cert_number: str, name: str, query_type: int):
+        """查找有效期内的缓存结果，命中时计入统计并保存到结果列表"""
+        if not self.result_cache:
+            return None
+        result = self.result_cache.get(cert_type, cert_number, name, query_type)
+        if result is None:
+            return None
+        
+        if self.stats['start_time'] is None:
+            self.stats['start_time'] = time.time()
+        self.stats['total_queries'] += 1
+        self.stats['cache_hits'] += 1
+        print(f"\n使用缓存结果: {name} - {cert_number}（缓存于 {result['cached_at']}）")
+        self._update_result_stats(result['status'], 0.0)
+        if self.stats['start_time']:
+            self.stats['total_time'] = time.time() - self.stats['start_time']
+        
+        self._remember_result(result)
+        return result
+        
     async def query_single_certificate(self, cert_type: str, cert_number: str, name: str, query_type: int = 1) -> dict:
-        """查询单个证书"""
+        """
+        查询单个证书
+        
+        启用结果缓存时优先返回有效期内的缓存结果（带 cached=True），否则查询网站并将结果写入缓存
+        """
+        result = self._cached_result(cert_type, cert_number, name, query_type)
+        if result is not None:
+            return result
+        return await self._query_and_cache(cert_type, cert_number, name, query_type)
+        
+    async def _query_and_cache(self, cert_type: str, cert_number: str, name: str, query_type: int) -> dict:
+        """查询网站并将结果写入缓存"""
+        result = await self._query_site(cert_type, cert_number, name, query_type)
+        if self.result_cache:
+            self.result_cache.put(cert_type, cert_number, name, query_type, result)
+        return result
+        
+    async def _query_site(self, cert_type: str, cert_number: str, name: str, query_type: int) -> dict:
+        """查询网站（启用直连接口引擎时优先直连查询）"""
+        if self.http_engine and not self._http_engine_disabled:
+            result = await self._query_via_http(cert_type, cert_number, name, query_type)
+            if result is not None:
+                return result
+        
         # 开始计时
         start_time = time.time()
         
@@ -813,27 +1361,41 @@ class ImprovedCertificateChecker:
             self.stats['total_queries'] += 1
             print(f"\n开始查询: {name} - {cert_number}")
             
+            # 清零上一次查询遗留的拦截统计
+            self._pop_network_stats()
+            
             # 导航到查询页面计时
             nav_start = time.time()
             await self.navigate_to_search_page(query_type)
             nav_time = time.time() - nav_start
             print(f"导航到查询页面耗时: {nav_time:.2f}秒")
             
-            # 选择证件类型计时
-            select_start = time.time()
-            await self.select_certificate_type(cert_type)
-            select_time = time.time() - select_start
-            print(f"选择证件类型耗时: {select_time:.2f}秒")
-            
-            # 输入证件信息计时
-            input_start = time.time()
-            await self.input_certificate_info(cert_number, name)
-            input_time = time.time() - input_start
-            print(f"输入证件信息耗时: {input_time:.2f}秒")
-            
-            # 解决验证码计时
+            # 验证码随页面加载，获取和识别与选择证件类型、输入证件信息并行进行
+            prefetch_task = asyncio.ensure_future(self._prefetch_captcha())
+            try:
+                # 选择证件类型计时
+                select_start = time.time()
+                await self.select_certificate_type(cert_type)
+                select_time = time.time() - select_start
+                print(f"选择证件类型耗时: {select_time:.2f}秒")
+                
+                # 输入证件信息计时
+                input_start = time.time()
+                await self.input_certificate_info(cert_number, name)
+                input_time = time.time() - input_start
+                print(f"输入证件信息耗时: {input_time:.2f}秒")
+            except BaseException:
+                prefetch_task.cancel()
+                raise
+            
+            # 解决验证码计时（含等待预先识别完成的时间，即验证码在关键路径上的耗时）
             captcha_start = time.time()
-            if await self.solve_captcha_with_retry():
+            prefetched = await prefetch_task
+            prefetch_wait_time = time.time() - captcha_start
+            overlap_time = max(0.0, prefetched['elapsed'] - prefetch_wait_time)
+            print(f"预先识别验证码耗时: {prefetched['elapsed']:.2f}秒，其中 {overlap_time:.2f}秒与表单填写重叠")
+            
+            if await self.solve_captcha_with_retry(prefetched=prefetched):
                 captcha_time = time.time() - captcha_start
                 print(f"验证码识别耗时: {captcha_time:.2f}秒")
                 
@@ -841,6 +1403,7 @@ class ImprovedCertificateChecker:
                 result_start = time.time()
                 result = await self.get_query_result(cert_number, name)
                 result_time = time.time() - result_start
+                result['query_type'] = query_type
                 print(f"获取查询结果耗时: {result_time:.2f}秒")
                 
                 # 计算总耗时
@@ -851,36 +1414,23 @@ class ImprovedCertificateChecker:
                     'selection_time': round(select_time, 2),
                     'input_time': round(input_time, 2),
                     'captcha_time': round(captcha_time, 2),
-                    'result_time': round(result_time, 2)
+                    'captcha_prefetch_time': round(prefetched['elapsed'], 2),
+                    'captcha_overlap_time': round(overlap_time, 2),
+                    'result_time': round(result_time, 2),
+                    'screenshot_time': round(self._screenshot_time, 2)
                 }
                 
                 # 更新详细统计
-                if result['status'] == 'found':
-                    self.stats['successful_queries'] += 1
-                    self.stats['found_results'] += 1
-                    print(f"查询成功(找到信息): {result['status']}，总耗时: {total_time:.2f}秒")
-                elif result['status'] == 'not_found':
-                    self.stats['successful_queries'] += 1
-                    self.stats['not_found_results'] += 1
-                    print(f"查询成功(未找到信息): {result['status']}，总耗时: {total_time:.2f}秒")
-                elif result['status'] == 'input_error':
-                    self.stats['failed_queries'] += 1
-                    self.stats['input_error_results'] += 1
-                    print(f"查询失败(输入错误): {result['status']}，总耗时: {total_time:.2f}秒")
-                elif result['status'] == 'unknown':
-                    self.stats['failed_queries'] += 1
-                    self.stats['unknown_results'] += 1
-                    print(f"查询完成(结果未知): {result['status']}，总耗时: {total_time:.2f}秒")
-                else:
-                    self.stats['failed_queries'] += 1
-                    print(f"查询失败: {result['status']}，总耗时: {total_time:.2f}秒")
+                self._update_result_stats(result['status'], total_time)
                 
                 # 更新总用时
                 if self.stats['start_time']:
                     self.stats['total_time'] = time.time() - self.stats['start_time']
                 
+                result['network'] = self._pop_network_stats()
+                
                 # 将查询结果添加到结果列表
-                self.query_results.append(result)
+                self._remember_result(result)
                 
                 # 查询完成后返回证照类型选择页面
                 await self.return_to_certificate_selection_page(query_type)
@@ -900,6 +1450,7 @@ class ImprovedCertificateChecker:
                 captcha_failed_result = {
                     'cert_number': cert_number,
                     'name': name,
+                    'query_type': query_type,
                     'query_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                     'status': 'captcha_failed',
                     'data': '验证码识别失败',
@@ -910,12 +1461,16 @@ class ImprovedCertificateChecker:
                         'selection_time': round(select_time, 2),
                         'input_time': round(input_time, 2),
                         'captcha_time': round(captcha_time, 2),
+                        'captcha_prefetch_time': round(prefetched['elapsed'], 2),
+                        'captcha_overlap_time': round(overlap_time, 2),
                         'result_time': 0
                     }
                 }
                 
+                captcha_failed_result['network'] = self._pop_network_stats()
+                
                 # 将验证码失败结果添加到结果列表
-                self.query_results.append(captcha_failed_result)
+                self._remember_result(captcha_failed_result)
                 return captcha_failed_result
                 
         except Exception as e:
@@ -934,6 +1489,7 @@ class ImprovedCertificateChecker:
             error_result = {
                 'cert_number': cert_number,
                 'name': name,
+                'query_type': query_type,
                 'query_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'status': 'error',
                 'data': str(e),
@@ -948,11 +1504,35 @@ class ImprovedCertificateChecker:
                 }
             }
             
+            error_result['network'] = self._pop_network_stats()
+            
             # 将错误结果添加到结果列表
-            self.query_results.append(error_result)
+            self._remember_result(error_result)
             return error_result
             
-    async def batch_query_from_csv(self, csv_file: str, cert_type: str = "身份证", default_query_type: int = 1, delay: int = 3) -> list:
+    def _remember_result(self, result: dict):
+        """保存查询结果到 self.query_results 和会话JSONL结果文件（批量查询时结果只写入进度日志，不保留）"""
+        if not self.keep_query_results:
+            return
+        self.query_results.append(result)
+        if self.result_sink is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.result_sink = JsonlResultSink(os.path.join(self.results_dir, f"query_results_{timestamp}.jsonl"))
+        self.result_sink.write(result)
+            
+    def _pop_network_stats(self) -> dict:
+        """获取当前页面本次查询的拦截统计，并累加到总统计"""
+        if not self.resource_blocker or not self.page:
+            return {}
+        network_stats = self.resource_blocker.pop_page_stats(self.page)
+        self.stats['blocked_requests'] += network_stats['blocked_requests']
+        self.stats['estimated_bytes_saved'] += network_stats['estimated_bytes_saved']
+        self.stats['loaded_bytes'] += network_stats['loaded_bytes']
+        return network_stats
+        
+    async def batch_query_from_csv(self, csv_file: str, cert_type: str = "身份证", default_query_type: int = 1, delay: int = 3, concurrency: int = 1, result_path: str = None,
+                                   stream: bool = False, max_in_flight: int = None, resume: bool = False,
+                                   retry_failed: bool = True, journal_path: str = None) -> list:
         """从CSV文件批量查询
         
         CSV文件格式:
@@ -965,6 +1545,27 @@ class ImprovedCertificateChecker:
         2 - 安全生产知识和管理能力考核合格信息查询
         
         如果CSV中没有查询类型列，则使用default_query_type
+        
+        concurrency 大于1时启用多页面并发模式，每个页面独立领取记录查询，
+        delay 为每个页面两次查询之间的间隔
+        
+        result_path 指定结果JSON的保存路径，默认保存到查询结果目录下带时间戳的文件
+        
+        每条结果完成后立即追加到进度日志 journal_path（JSONL，批量fsync；默认为查询结果目录下
+        以输入CSV命名、带时间戳的新文件），结束时（包括中途出错）由日志逐条生成报告JSON和同名CSV，
+        进程崩溃时已完成的结果仍保留在日志中
+        
+        每条结果带有其在CSV中的行号（row，从1开始），resume 为True时读取该CSV最近一次运行的进度日志
+        （或指定的 journal_path），跳过已有结果且 (证件号码, 姓名, 查询类型) 一致的行，新结果追加到同一个日志，报告包含之前和本次的全部结果
+        （每行取最后一次结果，按行号顺序；统计信息只含本次查询）；
+        retry_failed 为True时上次结果为 captcha_failed/error 的行重新查询。
+        resume 为False时从头开始：默认写入新的日志，指定的 journal_path 已存在时先改名保留，不会覆盖之前的结果
+        
+        stream 为True时启用流式模式：逐行读取CSV，已读取但结果尚未写出的记录不超过 max_in_flight 条
+        （默认 concurrency 的4倍），结果只写入JSONL而不在内存中保留（返回空列表），
+        进度按已处理的字节位置报告；内存占用与文件大小无关。
+        与 resume 同时使用时例外：已完成的行号及其记录、生成报告时每行最后一次结果的位置索引
+        都保存在内存中，占用随日志中的行数增长（每行约一两百字节）
         """
         results = []
         
@@ -974,70 +1575,376 @@ class ImprovedCertificateChecker:
             batch_start_time = time.time()
             self.stats['start_time'] = batch_start_time
             
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                certificates = list(reader)
-                
-            print(f"从 {csv_file} 读取到 {len(certificates)} 条记录")
-            
-            for i, cert in enumerate(certificates, 1):
-                print(f"\n进度: {i}/{len(certificates)}")
+            if not result_path:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                result_path = os.path.join(self.results_dir, f"batch_query_results_{timestamp}.json")
+            
+            # 每条结果完成后立即追加到进度日志，结束时由日志生成报告JSON和CSV
+            if journal_path:
+                rotated = None if resume else rotate_existing(journal_path)
+                if rotated:
+                    print(f"进度日志 {journal_path} 已存在，已改名保留为 {rotated}")
+            elif resume:
+                journal_path = latest_journal_for(csv_file, self.results_dir)
+                if not journal_path:
+                    print(f"断点续查: 没有找到 {csv_file} 的进度日志，从头开始")
+            journal_path = journal_path or journal_path_for(csv_file, self.results_dir)
+            completed_rows = {}
+            if resume:
+                completed_rows = load_completed_rows(journal_path, RETRYABLE_STATUSES if retry_failed else ())
+                print(f"断点续查: 进度日志 {journal_path} 中已完成 {len(completed_rows)} 行，"
+                      f"证件号码、姓名和查询类型与日志一致的行将跳过")
+            batch_sink = JsonlResultSink(journal_path, append=resume)
+            # 批量查询的结果只写入进度日志（由其生成批量报告），不再写入会话JSONL结果文件
+            self.keep_query_results = False
+            try:
+                if stream:
+                    rows = CsvRowStream(csv_file)
+                    print(f"流式读取 {csv_file}（{rows.total_bytes / 1048576:.1f}MB），最多 {max_in_flight or concurrency * 4} 条记录同时在处理中")
+                    await self._run_worker_pool(rows, cert_type, default_query_type, delay, concurrency,
+                                                on_result=batch_sink.write, read_result=batch_sink.read,
+                                                max_in_flight=max_in_flight,
+                                                format_progress=rows.format_progress, completed_rows=completed_rows,
+                                                dedupe_limit=STREAM_DEDUPE_LIMIT)
+                else:
+                    await self._run_batch_in_memory(csv_file, cert_type, default_query_type, delay, concurrency,
+                                                    results, batch_sink, completed_rows)
+            finally:
+                self.keep_query_results = True
+                batch_sink.close()
                 
-                cert_number = cert.get('证件号码', '').strip()
-                name = cert.get('姓名', '').strip()
+                # 计算总用时
+                if self.stats['start_time']:
+                    self.stats['total_time'] = time.time() - self.stats['start_time']
+                    print(f"\n批量查询总用时: {self.stats['total_time']:.2f}秒")
                 
-                # 跳过表头数据（如果证件号码字段就是"证件号码"，说明这是表头）
-                if cert_number == '证件号码' or name == '姓名':
-                    print(f"跳过表头记录: {cert}")
+                # 由JSONL生成批量查询报告（中途出错时也保存已完成的结果）
+                self.last_batch_result_path = save_batch_report(result_path, [batch_sink.path], self.get_statistics(),
+                                                                latest_only=resume)
+                print(f"\n批量查询完成，本次 {batch_sink.count} 条结果，报告已保存到: {result_path}（进度日志: {batch_sink.path}）")
+            return results
+            
+        except Exception as e:
+            print(f"批量查询失败: {e}")
+            return results
+            
+    async def _run_batch_in_memory(self, csv_file: str, cert_type: str, default_query_type: int, delay: int,
+                                   concurrency: int, results: list, batch_sink: JsonlResultSink, completed_rows: dict):
+        """读取整个CSV后逐条或并发查询，跳过 completed_rows 中的行，结果（带行号 row）追加到 results 并写入 batch_sink"""
+        # utf-8-sig 去除Excel保存的CSV开头的BOM（与 CsvRowStream 一致），否则第一列表头无法匹配
+        with open(csv_file, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            certificates = list(reader)
+            
+        print(f"从 {csv_file} 读取到 {len(certificates)} 条记录")
+        
+        if concurrency > 1:
+            if not certificates:
+                return
+            
+            def record(result: dict) -> int:
+                results.append(result)
+                return batch_sink.write(result)
+            
+            await self._run_worker_pool(
+                enumerate(certificates, 1), cert_type, default_query_type, delay,
+                min(concurrency, len(certificates)), on_result=record, read_result=batch_sink.read,
+                format_progress=lambda position: f"第 {position}/{len(certificates)} 行",
+                completed_rows=completed_rows
+            )
+            return
+        
+        # 本批次已查询记录的结果在进度日志中的位置，重复记录从日志读回复用（内存中不保留结果本身）
+        seen_offsets = {}
+        for i, cert in enumerate(certificates, 1):
+            print(f"\n进度: {i}/{len(certificates)}")
+            
+            parsed = self._parse_csv_row(cert, default_query_type)
+            if not parsed or self._is_completed_row(completed_rows, i, parsed):
+                continue
+            cert_number, name, query_type = parsed
+            
+            if parsed in seen_offsets:
+                result = dict(self._duplicate_result(batch_sink.read(seen_offsets[parsed])), row=i)
+                results.append(result)
+                batch_sink.write(result)
+                continue
+            
+            print(f"查询: {name} ({cert_number}) - 查询类型: {query_type}")
+            result = await self.query_single_certificate(cert_type, cert_number, name, query_type)
+            result = dict(result, row=i)
+            results.append(result)
+            seen_offsets[parsed] = batch_sink.write(result)
+            if result.get('cached'):
+                continue
+            await self._recycle_context_if_needed(query_type)
+            
+            # 延时避免请求过于频繁
+            if i < len(certificates):
+                print(f"等待 {delay} 秒后继续下一个查询...")
+                await asyncio.sleep(delay)
+            
+    @staticmethod
+    def _is_completed_row(completed_rows: dict, row: int, parsed: tuple) -> bool:
+        """断点续查时该行是否已完成：行号在进度日志中且记录一致（CSV被修改过的行重新查询）"""
+        if not completed_rows or row not in completed_rows:
+            return False
+        if completed_rows[row] != parsed:
+            print(f"第 {row} 行与进度日志中的记录不一致（CSV可能已修改），重新查询")
+            return False
+        return True
+        
+    def _duplicate_result(self, result: dict) -> dict:
+        """复用同一记录已有的查询结果（标记 duplicate=True），计入重复记录统计"""
+        self.stats['duplicate_rows'] += 1
+        print(f"重复记录，复用已有结果: {result.get('name')} ({result.get('cert_number')})")
+        return dict(result, duplicate=True)
+        
+    def _parse_csv_row(self, cert: dict, default_query_type: int):
+        """
+        解析CSV中的一行记录
+        
+        证件号码去除所有空白并将校验位 x 转为大写，姓名去除首尾空白，
+        因此不同来源的同一个人得到相同的 (证件号码, 姓名, 查询类型)，用于识别重复记录
+        
+        Returns:
+            (证件号码, 姓名, 查询类型)，表头或无效记录返回None
+        """
+        cert_number = normalize_cert_number(cert.get('证件号码') or '')
+        name = (cert.get('姓名') or '').strip()
+        
+        # 跳过表头数据（如果证件号码字段就是"证件号码"，说明这是表头）
+        if cert_number == '证件号码' or name == '姓名':
+            print(f"跳过表头记录: {cert}")
+            return None
+        
+        # 从CSV中读取查询类型，如果没有则使用默认值
+        query_type_str = (cert.get('查询类型') or str(default_query_type)).strip()
+        try:
+            query_type = int(query_type_str)
+            if query_type not in [1, 2]:
+                print(f"警告: 无效的查询类型 {query_type}，使用默认值 {default_query_type}")
+                query_type = default_query_type
+        except ValueError:
+            print(f"警告: 查询类型格式错误 '{query_type_str}'，使用默认值 {default_query_type}")
+            query_type = default_query_type
+        
+        if not cert_number or not name:
+            print(f"跳过无效记录: {cert}")
+            return None
+        
+        return cert_number, name, query_type
+        
+    async def _run_worker_pool(self, records, cert_type: str, default_query_type: int, delay: int, concurrency: int,
+                               on_result=None, max_in_flight: int = None, format_progress=None,
+                               completed_rows: dict = None, dedupe_limit: int = None, read_result=None) -> list:
+        """
+        多页面并发批量查询
+        
+        在当前浏览器内创建 concurrency 个工作者，各自从队列领取记录，
+        从上下文池领取预热页面执行 query_single_certificate。
+        记录由生产者从 records（(位置, CSV行) 的可迭代对象，可以是流式读取的生成器）逐条解析入队，
+        已入队但结果尚未按原始顺序输出的记录不超过 max_in_flight 条（默认 concurrency 的4倍），
+        提前完成的结果在重排缓冲中等待前面的记录，因此内存占用与记录总数无关。
+        
+        重复记录（解析后的 (证件号码, 姓名, 查询类型) 相同）不再入队查询，而是等待同一记录的查询结果，
+        复制到自己在原始顺序中的位置输出。指定 read_result 时已输出的结果只保留其在结果文件中的位置，
+        之后出现的重复记录再从文件读回。
+        
+        Args:
+            on_result: 按原始顺序接收每条结果的回调，为None时收集为列表返回
+            format_progress: 将已按顺序输出的最后一条记录的位置格式化为进度文本
+            completed_rows: 已完成的CSV行（records 中的第几条，从1开始）及其记录，断点续查时跳过记录一致的行
+            dedupe_limit: 最多保留多少条已完成记录供后续重复记录复用（超出时丢弃最早的），
+                          为None时整批去重；正在查询中的重复记录始终合并
+            read_result: 按 on_result 的返回值（结果在文件中的位置）读回结果的函数，如 JsonlResultSink.read；
+                         为None时已完成的结果保留在内存中供重复记录复用
+            
+        Returns:
+            结果列表（指定 on_result 时为空列表）
+        """
+        max_in_flight = max(max_in_flight or concurrency * 4, concurrency)
+        window = asyncio.Semaphore(max_in_flight)
+        queue = asyncio.Queue()
+        queued = 0
+        producer_done = False
+        
+        print(f"启动 {concurrency} 个并发查询页面")
+        workers = [self._create_worker() for _ in range(concurrency)]
+        
+        # 多预热一个上下文，回收重建期间其他工作者无需等待（直连接口模式下不使用浏览器）
+        pool = None
+        if self.browser:
+            pool = BrowserContextPool(
+                self._open_context,
+                size=concurrency + 1,
+                max_queries_per_context=self.max_queries_per_context,
+                max_rss_bytes=self.max_context_rss_bytes
+            )
+            await pool.start()
+        
+        results = []
+        reorder_buffer = {}
+        next_index = 0
+        completed = 0
+        # 记录 -> 其查询结果的Future，重复记录等待同一个Future
+        query_futures = {}
+        # 记录 -> 已输出的结果在结果文件中的位置（指定 read_result 时）
+        written_offsets = {}
+        fan_out_tasks = set()
+        
+        async def fan_out(index: int, position, row: int, future: asyncio.Future):
+            emit(index, position, row, self._duplicate_result(await future))
+        
+        async def produce():
+            nonlocal queued, producer_done
+            index = 0
+            for row, (position, cert) in enumerate(records, 1):
+                parsed = self._parse_csv_row(cert, default_query_type)
+                if not parsed or self._is_completed_row(completed_rows, row, parsed):
                     continue
+                await window.acquire()
+                if parsed in query_futures:
+                    task = asyncio.ensure_future(fan_out(index, position, row, query_futures[parsed]))
+                    fan_out_tasks.add(task)
+                    task.add_done_callback(fan_out_tasks.discard)
+                elif parsed in written_offsets:
+                    emit(index, position, row, self._duplicate_result(read_result(written_offsets[parsed])))
+                else:
+                    query_futures[parsed] = asyncio.get_running_loop().create_future()
+                    queue.put_nowait((index, position, row, parsed))
+                    queued += 1
+                index += 1
+            producer_done = True
+            for _ in workers:
+                queue.put_nowait(None)
+        
+        def emit(index: int, position, row: int, result: dict, parsed: tuple = None):
+            """结果（加上CSV行号）进入重排缓冲，按原始顺序输出并释放窗口；parsed 为首次查询的记录"""
+            nonlocal next_index
+            reorder_buffer[index] = (position, dict(result, row=row), parsed)
+            last_position = None
+            while next_index in reorder_buffer:
+                last_position, ordered, first = reorder_buffer.pop(next_index)
+                if on_result:
+                    offset = on_result(ordered)
+                    if read_result and first is not None:
+                        # 结果已写入文件，之后的重复记录从文件读回，内存中只保留位置
+                        written_offsets[first] = offset
+                        del query_futures[first]
+                        if dedupe_limit is not None and len(written_offsets) > dedupe_limit:
+                            del written_offsets[next(iter(written_offsets))]
+                else:
+                    results.append(ordered)
+                next_index += 1
+                window.release()
+            if last_position is not None and format_progress:
+                print(f"\n进度: 已完成 {completed} 条，{format_progress(last_position)}")
+        
+        def publish(parsed: tuple, result: dict):
+            """将结果交给等待同一记录的重复记录"""
+            query_futures[parsed].set_result(result)
+            if dedupe_limit is None or read_result:
+                return
+            # 按入队顺序丢弃最早的已完成结果（仍在查询中的记录必须保留）
+            while len(query_futures) > dedupe_limit:
+                oldest = next(iter(query_futures))
+                if not query_futures[oldest].done():
+                    break
+                del query_futures[oldest]
+        
+        async def run_worker(worker_id: int, worker: 'ImprovedCertificateChecker'):
+            nonlocal queued, completed
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                queued -= 1
+                index, position, row, parsed = item
+                cert_number, name, query_type = parsed
                 
-                # 从CSV中读取查询类型，如果没有则使用默认值
-                query_type_str = cert.get('查询类型', str(default_query_type)).strip()
-                try:
-                    query_type = int(query_type_str)
-                    if query_type not in [1, 2]:
-                        print(f"警告: 无效的查询类型 {query_type}，使用默认值 {default_query_type}")
-                        query_type = default_query_type
-                except ValueError:
-                    print(f"警告: 查询类型格式错误 '{query_type_str}'，使用默认值 {default_query_type}")
-                    query_type = default_query_type
-                
-                if not cert_number or not name:
-                    print(f"跳过无效记录: {cert}")
+                # 缓存命中时不占用页面，也不需要延时
+                result = worker._cached_result(cert_type, cert_number, name, query_type)
+                if result is not None:
+                    completed += 1
+                    publish(parsed, result)
+                    emit(index, position, row, result, parsed)
                     continue
                 
-                print(f"查询: {name} ({cert_number}) - 查询类型: {query_type}")
-                result = await self.query_single_certificate(cert_type, cert_number, name, query_type)
-                results.append(result)
+                print(f"[页面{worker_id}] 查询: {name} ({cert_number}) - 查询类型: {query_type}")
+                if not pool:
+                    result = await worker._query_and_cache(cert_type, cert_number, name, query_type)
+                else:
+                    slot = await pool.acquire(query_type)
+                    worker.context, worker.page = slot.context, slot.page
+                    try:
+                        result = await worker._query_and_cache(cert_type, cert_number, name, query_type)
+                    finally:
+                        await pool.release(slot, query_type)
+                completed += 1
+                publish(parsed, result)
+                emit(index, position, row, result, parsed)
                 
-                # 延时避免请求过于频繁
-                if i < len(certificates):
-                    print(f"等待 {delay} 秒后继续下一个查询...")
+                # 每个页面独立延时，避免单页请求过于频繁
+                if queued > 0 or not producer_done:
                     await asyncio.sleep(delay)
-                    
-            # 计算总用时
-            if self.stats['start_time']:
-                self.stats['total_time'] = time.time() - self.stats['start_time']
-                print(f"\n批量查询总用时: {self.stats['total_time']:.2f}秒")
-            
-            # 保存批量查询结果
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            batch_result_path = os.path.join(self.results_dir, f"batch_query_results_{timestamp}.json")
-            
-            with open(batch_result_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'query_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'total_count': len(results),
-                    'statistics': self.get_statistics(),
-                    'results': results
-                }, f, ensure_ascii=False, indent=2)
-                
-            print(f"\n批量查询完成，结果已保存到: {batch_result_path}")
-            return results
+        
+        tasks = [asyncio.ensure_future(produce())]
+        tasks += [asyncio.ensure_future(run_worker(i, worker)) for i, worker in enumerate(workers, 1)]
+        try:
+            await asyncio.gather(*tasks)
+            # 等待最后一批重复记录输出
+            if fan_out_tasks:
+                await asyncio.gather(*fan_out_tasks)
+        except BaseException as e:
+            # 任一工作者出错时先停止其他工作者和重复记录的等待，再关闭它们正在使用的上下文池
+            print(f"并发查询中止: {e!r}")
+            for future in query_futures.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("批量查询已中止"))
+                    future.exception()
+            pending = tasks + list(fan_out_tasks)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        finally:
+            self._merge_worker_stats(workers)
+            for worker in workers:
+                await worker._close_worker()
+            if pool:
+                print(f"上下文池统计: {pool.get_statistics()}")
+                await pool.close()
+        
+        return results
+        
+    async def _close_worker(self):
+        """关闭工作者自有的资源（直连会话、回退到浏览器查询时自行创建的上下文）"""
+        if self.http_engine:
+            await self.http_engine.close()
+        if self._owns_context and self.context:
+            try:
+                await self.context.close()
+            except Exception:
+                pass
+            self.context, self.page = None, None
+            self._owns_context = False
+        
+    async def _stop_playwright(self):
+        """停止本查询器启动的Playwright驱动进程"""
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
             
-        except Exception as e:
-            print(f"批量查询失败: {e}")
-            return results
+    def _merge_worker_stats(self, workers: list):
+        """将工作者的统计计数合并到当前查询器"""
+        for worker in workers:
+            merge_statistics(self.stats, worker.stats)
+            for key, value in worker.captcha_recognizer.fast_path_stats.items():
+                self.captcha_recognizer.fast_path_stats[key] += value
             
     def get_statistics(self) -> dict:
         """获取查询统计信息"""
@@ -1048,12 +1955,28 @@ class ImprovedCertificateChecker:
         
     async def close(self):
         """关闭浏览器"""
+        # 保存验证码组合的自适应权重和字符模板，供下次运行继续使用
+        self.captcha_recognizer.combo_policy.save()
+        if self.captcha_recognizer.digit_classifier is not None:
+            self.captcha_recognizer.digit_classifier.save()
+        self.captcha_recognizer.answer_cache.save()
+        self.captcha_recognizer.calibrator.save()
+        self.debug_writer.close()
+        if self.result_cache:
+            self.result_cache.close()
+        if self.result_sink is not None:
+            self.result_sink.close()
+        
+        if self.http_engine:
+            await self.http_engine.close()
+            
         if self.browser:
             try:
                 await self.browser.close()
             except Exception:
                 pass
             print("浏览器已关闭")
+        await self._stop_playwright()
             
         # 打印统计信息
         stats = self.get_statistics()
@@ -1067,6 +1990,51 @@ class ImprovedCertificateChecker:
         print(f"  - 结果类型未知: {stats['unknown_results']}")
         print(f"  - 其他失败: {stats['failed_queries'] - stats['input_error_results'] - stats['unknown_results']}")
         print(f"验证码识别成功率: {stats['captcha_success_rate']:.2%}")
+        model_stats = self.captcha_recognizer.model_registry.get_statistics()
+        if model_stats['loaded_models']:
+            print(f"OCR模型加载耗时: {model_stats['total_load_time']:.2f}秒 ({', '.join(model_stats['loaded_models'])})")
+        combo_stats = self.captcha_recognizer.combo_policy.get_statistics()
+        learned = sorted(
+            ((combo, values) for combo, values in combo_stats.items() if values['feedback'] > 0),
+            key=lambda item: -item[1]['success_rate']
+        )
+        if learned:
+            print("验证码组合反馈成功率: " + ", ".join(
+                f"{combo} {values['success_rate']:.0%}" for combo, values in learned[:3]
+            ))
+        cache_stats = self.captcha_recognizer.answer_cache.get_statistics()
+        if cache_stats['lookups'] > 0:
+            print(f"验证码答案缓存命中率: {cache_stats['hit_rate']:.2%} "
+                  f"({cache_stats['hits']}/{cache_stats['lookups']}，缓存 {cache_stats['size']} 条)")
+        calibration_stats = self.captcha_recognizer.calibrator.get_statistics()
+        for source, bins in calibration_stats.items():
+            print(f"验证码置信度校准（{source}）: " + ", ".join(
+                f"{bin_range} 正确率 {values['accuracy']:.0%}/{values['total']}次" for bin_range, values in bins.items()
+            ))
+        if self.result_cache:
+            result_cache_stats = self.result_cache.get_statistics()
+            print(f"查询结果缓存命中率: {result_cache_stats['hit_rate']:.2%} "
+                  f"({result_cache_stats['hits']}/{result_cache_stats['lookups']}，过期 {result_cache_stats['expired']}，"
+                  f"跳过读取 {result_cache_stats['bypassed']}，写入 {result_cache_stats['stores']})")
+        screenshot_stats = self.screenshot_policy.get_statistics()
+        if screenshot_stats['queries'] > 0:
+            print(f"查询截图（{screenshot_stats['mode']}）: {screenshot_stats['captured']}/{screenshot_stats['queries']} 次查询截图 "
+                  f"{screenshot_stats['images']} 张，平均每次查询截图耗时 {screenshot_stats['avg_capture_time_per_query'] * 1000:.0f}ms，"
+                  f"后台编码 {screenshot_stats['avg_encode_time'] * 1000:.0f}ms/张")
+        writer_stats = self.debug_writer.get_statistics()
+        if writer_stats['groups'] > 0:
+            print(f"调试图片: 保存 {writer_stats['written']} 个文件（{writer_stats['bytes_written'] / 1024:.1f}KB），"
+                  f"队列满丢弃 {writer_stats['dropped']} 个")
+        fast_path_stats = self.captcha_recognizer.fast_path_stats
+        if fast_path_stats['attempts'] > 0:
+            print(f"字符模板快速识别: 采用 {fast_path_stats['accepted']}/{fast_path_stats['attempts']} 次，"
+                  f"提交后被判错误 {fast_path_stats['rejected']} 次")
+        ocr_stats = self.captcha_recognizer.ocr_dispatcher.get_statistics()
+        if ocr_stats['tasks'] > 0:
+            print(f"验证码识别平均排队: {ocr_stats['avg_queue_wait'] * 1000:.0f}ms，平均计算: {ocr_stats['avg_compute_time'] * 1000:.0f}ms")
+        if stats['blocked_requests'] > 0:
+            print(f"拦截非必要请求: {stats['blocked_requests']} 个，估算节省 {stats['estimated_bytes_saved'] / 1024:.1f}KB"
+                  f"（按已加载同类资源的平均大小估算），实际加载 {stats['loaded_bytes'] / 1024:.1f}KB")
         if stats['total_time'] > 0:
             print(f"总用时: {stats['total_time']:.2f}秒")
             if stats['total_queries'] > 0:
@@ -1184,7 +2152,7 @@ class ImprovedCertificateChecker:
     
     def save_results(self) -> tuple:
         """
-        保存查询结果为JSON和CSV格式
+        保存查询结果为JSON和CSV格式（逐条查询的结果；批量查询的结果在批量报告中）
         
         Returns:
             tuple: (json_file_path, csv_file_path)
@@ -1196,48 +2164,22 @@ class ImprovedCertificateChecker:
             json_filename = f"query_results_{timestamp}.json"
             json_path = os.path.join(self.results_dir, json_filename)
             
-            # 收集所有查询结果
-            results_data = {
+            # 由会话JSONL结果文件逐条生成，不依赖内存中的结果列表
+            jsonl_paths = []
+            if self.result_sink is not None:
+                self.result_sink.sync()
+                jsonl_paths.append(self.result_sink.path)
+            elif self.last_batch_result_path:
+                print(f"警告: 没有逐条查询的结果，批量查询的结果已保存在 {self.last_batch_result_path}")
+            write_json_report(jsonl_paths, json_path, 'query_results', {
                 'export_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'statistics': self.get_statistics(),
-                'query_results': getattr(self, 'query_results', [])
-            }
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(results_data, f, ensure_ascii=False, indent=2)
+                'statistics': self.get_statistics()
+            })
             
-            # 保存为CSV格式
+            # 保存为CSV格式（没有查询结果时只有表头）
             csv_filename = f"query_results_{timestamp}.csv"
             csv_path = os.path.join(self.results_dir, csv_filename)
-            
-            if hasattr(self, 'query_results') and self.query_results:
-                with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.DictWriter(f, fieldnames=[
-                        'cert_number', 'name', 'status', 'query_time', 
-                        'response_time', 'captcha_attempts', 'error_message'
-                    ])
-                    writer.writeheader()
-                    
-                    for result in self.query_results:
-                        # 提取基本信息
-                        row = {
-                            'cert_number': result.get('cert_number', ''),
-                            'name': result.get('name', ''),
-                            'status': result.get('status', ''),
-                            'query_time': result.get('query_time', ''),
-                            'response_time': result.get('response_time', ''),
-                            'captcha_attempts': result.get('captcha_attempts', ''),
-                            'error_message': result.get('error_message', '')
-                        }
-                        writer.writerow(row)
-            else:
-                # 如果没有查询结果，创建空的CSV文件
-                with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.DictWriter(f, fieldnames=[
-                        'cert_number', 'name', 'status', 'query_time', 
-                        'response_time', 'captcha_attempts', 'error_message'
-                    ])
-                    writer.writeheader()
+            write_csv_report(jsonl_paths, csv_path, RESULT_CSV_FIELDS)
             
             print(f"\n查询结果已保存:")
             print(f"JSON文件: {json_path}")
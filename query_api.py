@@ -0,0 +1,184 @@
+"""
+查询接口约定
+集中描述 cx.mem.gov.cn 查询接口的地址、字段和返回结果的分类规则，
+供直连接口查询引擎和浏览器查询的响应监听使用
+
+注意：网站没有公开接口文档，API_ENDPOINTS、QUERY_FIELDS 和 RECORD_LIST_KEYS 中的接口路径和字段名
+是根据常见写法推测的默认值，未经官方网站验证。使用前请在浏览器开发者工具的网络面板中核对实际的请求地址、
+请求字段和返回字段；不一致时通过 ImprovedCertificateChecker 的 api_url_patterns、api_fields、
+api_record_keys 参数（或 HttpQueryEngine 的 endpoints、fields、record_keys 参数）覆盖，无需修改代码。
+浏览器查询在接口响应无法识别时改为解析页面，直连查询则回退到浏览器
+"""
+
+import asyncio
+
+# 接口地址（推测值，未经验证，见模块说明）
+API_BASE_URL = "https://cx.mem.gov.cn"
+API_ENDPOINTS = {
+    'captcha': '/api/captcha',
+    'query': {
+        1: '/api/special/query',  # 特种作业操作证查询
+        2: '/api/safety/query'    # 安全生产知识和管理能力考核合格信息查询
+    }
+}
+
+# 查询请求字段（推测值，未经验证）
+QUERY_FIELDS = {
+    'cert_type': 'certType',
+    'cert_number': 'certNo',
+    'name': 'name',
+    'captcha': 'code',
+    'captcha_id': 'uuid'
+}
+
+# 表示请求成功的返回码
+SUCCESS_CODES = (200, 0, '200', '0')
+
+# 返回数据中可能承载记录列表的字段（推测值，未经验证）
+RECORD_LIST_KEYS = ('list', 'records', 'rows', 'items')
+
+# 验证码错误提示关键字
+CAPTCHA_ERROR_KEYWORDS = ('验证码',)
+
+class ContractChangedError(Exception):
+    """接口返回格式与约定不一致（网站接口可能已调整）"""
+
+def is_query_api_response(response, url_patterns: tuple = None) -> bool:
+    """
+    判断响应是否来自查询接口：必须是 xhr/fetch 请求且URL匹配配置的查询接口路径
+    （不匹配时宁可不捕获而改为解析页面，避免把验证码校验等其他接口的返回误判为查询结果）
+
+    Args:
+        response: Playwright响应对象
+        url_patterns: 查询接口URL特征，默认使用 API_ENDPOINTS 中的查询接口路径
+    """
+    if response.request.resource_type not in ('xhr', 'fetch'):
+        return False
+    patterns = url_patterns or tuple(API_ENDPOINTS['query'].values())
+    return any(pattern in response.url for pattern in patterns)
+
+def _extract_records(data, record_keys: tuple = RECORD_LIST_KEYS):
+    """
+    从返回数据中提取记录列表
+
+    Returns:
+        (是否找到约定的记录字段, 记录)
+    """
+    if isinstance(data, dict):
+        for key in record_keys:
+            if key in data:
+                return True, data[key]
+    return False, None
+
+def classify_api_payload(payload, record_keys: tuple = None) -> dict:
+    """
+    根据查询接口返回的JSON分类查询结果
+
+    Args:
+        payload: 接口返回的JSON对象
+        record_keys: 承载记录列表的字段，默认使用 RECORD_LIST_KEYS
+
+    成功返回码只有在记录字段（record_keys）存在且为空时才判为 not_found，
+    没有记录字段的成功返回（如 {"code": 200, "msg": "ok"}）不符合约定
+
+    Returns:
+        {'status': 'found' | 'not_found' | 'input_error' | 'captcha_wrong', 'message': str, 'data': ...}
+
+    Raises:
+        ContractChangedError: 返回内容不符合约定
+    """
+    if not isinstance(payload, dict) or ('code' not in payload and 'data' not in payload):
+        raise ContractChangedError(f"无法识别的查询接口返回: {str(payload)[:200]}")
+
+    code = payload.get('code')
+    message = payload.get('msg') or payload.get('message') or ''
+
+    if code is not None and code not in SUCCESS_CODES:
+        if any(keyword in message for keyword in CAPTCHA_ERROR_KEYWORDS):
+            return {'status': 'captcha_wrong', 'message': message, 'data': None}
+        return {'status': 'input_error', 'message': message or f'返回码 {code}', 'data': None}
+
+    has_records, records = _extract_records(payload.get('data'), record_keys or RECORD_LIST_KEYS)
+    if not has_records:
+        raise ContractChangedError(f"查询接口返回中没有记录字段: {str(payload)[:200]}")
+
+    if records is not None and not isinstance(records, (list, dict)):
+        raise ContractChangedError(f"查询接口返回的数据类型无法识别: {type(records).__name__}")
+
+    if not records:
+        return {'status': 'not_found', 'message': message or '查询成功，但未查询到相关信息', 'data': None}
+
+    return {'status': 'found', 'message': message, 'data': records}
+
+class QueryResponseListener:
+    """
+    查询接口响应监听器
+    通过 page.on('response') 捕获提交查询后查询接口返回的JSON，
+    使浏览器查询可以直接根据接口字段分类结果，而不必解析页面HTML
+    """
+
+    def __init__(self, url_patterns: tuple = None):
+        """
+        Args:
+            url_patterns: 查询接口URL特征，默认使用 API_ENDPOINTS 中的查询接口路径
+        """
+        self.url_patterns = url_patterns or tuple(API_ENDPOINTS['query'].values())
+        self._armed = {}
+        self._payloads = {}
+        self._events = {}
+
+    def is_query_response(self, response) -> bool:
+        """判断响应是否来自查询接口（见 is_query_api_response）"""
+        return is_query_api_response(response, self.url_patterns)
+
+    def attach(self, page):
+        """为页面注册响应监听"""
+        self._events[page] = asyncio.Event()
+
+        async def handle_response(response):
+            if not self._armed.get(page) or not self.is_query_response(response):
+                return
+            try:
+                payload = await response.json()
+            except Exception:
+                return
+            if self._armed.get(page):
+                self._armed[page] = False
+                self._payloads[page] = payload
+                self._events[page].set()
+
+        def handle_close(_):
+            for store in (self._armed, self._payloads, self._events):
+                store.pop(page, None)
+
+        page.on("response", handle_response)
+        page.on("close", handle_close)
+
+    def arm(self, page):
+        """开始捕获下一次查询接口响应（提交查询前调用）"""
+        if page not in self._events:
+            return
+        self._payloads.pop(page, None)
+        self._events[page].clear()
+        self._armed[page] = True
+
+    async def wait_for_payload(self, page, timeout: float = 0.5):
+        """
+        等待捕获到的查询接口JSON
+
+        Args:
+            page: Playwright页面对象
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            接口返回的JSON，未捕获到时返回None
+        """
+        event = self._events.get(page)
+        if event is None:
+            return None
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._armed[page] = False
+            return None
+        return self._payloads.pop(page, None)
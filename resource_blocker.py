@@ -0,0 +1,146 @@
+from urllib.parse import urlparse
+from query_api import API_BASE_URL
+
+# 默认拦截的资源类型（查询流程不需要）
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media')
+
+# 默认拦截的域名（统计分析脚本等，同时匹配其子域名）
+DEFAULT_BLOCKED_HOSTS = (
+    'hm.baidu.com',
+    'google-analytics.com',
+    'googletagmanager.com',
+    'cnzz.com',
+    'umeng.com',
+    'growingio.com',
+    'zhuge.io'
+)
+
+# 始终放行的请求：(资源类型, 主机名+路径前缀)。
+# 网站自身的图片（含验证码，验证码地址调整后仍然放行）和接口调用不拦截；
+# 按前缀而不是子串匹配，第三方地址中即使带有 captcha 等字样也不会被误放行
+SITE_HOST = urlparse(API_BASE_URL).hostname
+DEFAULT_ALLOW_RULES = (
+    (('image', 'xhr', 'fetch'), f"{SITE_HOST}/"),
+)
+
+# 始终放行的资源类型（页面本身和查询接口调用）
+ALWAYS_ALLOWED_RESOURCE_TYPES = ('document', 'xhr', 'fetch')
+
+# 被拦截资源的默认估算大小（字节）：被拦截的请求没有实际下载，节省的流量只能估算，
+# 优先按本次运行已加载的同类资源的平均大小（content-length）估算，没有样本时使用该默认值
+DEFAULT_SIZE_ESTIMATES = {
+    'image': 20 * 1024,
+    'font': 60 * 1024,
+    'media': 200 * 1024,
+    'stylesheet': 30 * 1024,
+    'script': 50 * 1024,
+    'other': 5 * 1024
+}
+
+class ResourceBlocker:
+    """
+    页面资源拦截器
+    通过 page.route 拦截查询流程不需要的图片、字体和统计脚本，缩短 networkidle 等待，
+    并按页面统计每次查询拦截的请求数、估算节省的流量和实际加载的流量
+    """
+
+    def __init__(self, blocked_resource_types: tuple = DEFAULT_BLOCKED_RESOURCE_TYPES,
+                 blocked_hosts: tuple = DEFAULT_BLOCKED_HOSTS,
+                 allow_rules: tuple = DEFAULT_ALLOW_RULES,
+                 size_estimates: dict = None):
+        """
+        Args:
+            blocked_resource_types: 拦截的资源类型（Playwright resource_type）
+            blocked_hosts: 拦截的域名（与请求主机名相同或为其上级域名时拦截）
+            allow_rules: 始终放行的 (资源类型元组, 主机名+路径前缀)，优先级高于拦截规则，
+                         如 (('image',), 'cx.mem.gov.cn/captcha/')，不区分大小写
+            size_estimates: 各资源类型的默认估算大小（字节），没有同类资源的实际大小样本时使用
+        """
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_hosts = tuple(host.lower() for host in blocked_hosts)
+        self.allow_rules = tuple((set(types), prefix.lower()) for types, prefix in allow_rules)
+        self.size_estimates = dict(DEFAULT_SIZE_ESTIMATES)
+        if size_estimates:
+            self.size_estimates.update(size_estimates)
+
+        self._page_stats = {}
+        # 已加载资源的实际大小样本：{资源类型: [响应数, 总字节数]}
+        self._observed_sizes = {}
+
+    @staticmethod
+    def _new_stats() -> dict:
+        return {
+            'blocked_requests': 0,
+            'estimated_bytes_saved': 0,
+            'allowed_requests': 0,
+            'loaded_bytes': 0
+        }
+
+    def estimate_size(self, resource_type: str) -> int:
+        """估算被拦截资源的大小：优先使用已加载同类资源的平均大小，没有样本时使用默认估算值"""
+        observed = self._observed_sizes.get(resource_type)
+        if observed and observed[0]:
+            return observed[1] // observed[0]
+        return self.size_estimates.get(resource_type, self.size_estimates['other'])
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        """判断请求是否应被拦截"""
+        parsed = urlparse(url.lower())
+        host = parsed.hostname or ''
+        location = f"{host}{parsed.path}"
+
+        # 放行规则同时匹配资源类型和主机名+路径前缀（不看查询参数）
+        if any(resource_type in types and location.startswith(prefix) for types, prefix in self.allow_rules):
+            return False
+
+        if any(host == blocked or host.endswith(f".{blocked}") for blocked in self.blocked_hosts):
+            return True
+
+        if resource_type in ALWAYS_ALLOWED_RESOURCE_TYPES:
+            return False
+
+        return resource_type in self.blocked_resource_types
+
+    async def attach(self, page):
+        """为页面安装拦截规则和流量统计"""
+        stats = self._new_stats()
+        self._page_stats[page] = stats
+
+        async def handle_route(route, request):
+            try:
+                if self.should_block(request.url, request.resource_type):
+                    stats['blocked_requests'] += 1
+                    stats['estimated_bytes_saved'] += self.estimate_size(request.resource_type)
+                    await route.abort()
+                else:
+                    stats['allowed_requests'] += 1
+                    await route.continue_()
+            except Exception:
+                # 页面关闭或请求已被处理时忽略
+                pass
+
+        def handle_response(response):
+            try:
+                content_length = response.headers.get('content-length')
+                if content_length:
+                    size = int(content_length)
+                    stats['loaded_bytes'] += size
+                    observed = self._observed_sizes.setdefault(response.request.resource_type, [0, 0])
+                    observed[0] += 1
+                    observed[1] += size
+            except Exception:
+                pass
+
+        await page.route("**/*", handle_route)
+        page.on("response", handle_response)
+        page.on("close", lambda _: self._page_stats.pop(page, None))
+
+    def pop_page_stats(self, page) -> dict:
+        """获取并清零页面自上次调用以来的拦截统计"""
+        stats = self._page_stats.get(page)
+        if stats is None:
+            return self._new_stats()
+        snapshot = stats.copy()
+        for key in stats:
+            stats[key] = 0
+        return snapshot
@@ -0,0 +1,144 @@
+"""
+查询结果持久化缓存
+以 (证件类型, 证件号码, 姓名, 查询类型) 为键，将查询结果保存在本地SQLite数据库中，
+同一个人在有效期内再次查询时直接返回缓存结果，不访问网站。有效期按结果状态分别设置，
+验证码失败和出错的结果不缓存。多个进程（如分片批量查询）可以共享同一个数据库文件
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# 各结果状态的默认缓存有效期（秒），未列出或为0的状态不缓存
+DEFAULT_RESULT_TTLS = {
+    'found': 30 * 24 * 3600,
+    'not_found': 7 * 24 * 3600,
+    'input_error': 24 * 3600,
+    'unknown': 0,
+    'captcha_failed': 0,
+    'error': 0
+}
+
+def normalize_cert_number(cert_number: str) -> str:
+    """规范化证件号码：去除所有空白（含全角空格），校验位 x 转为大写"""
+    return ''.join(cert_number.split()).upper()
+
+def cache_key(cert_type: str, cert_number: str, name: str, query_type: int) -> tuple:
+    """缓存键（证件号码按 normalize_cert_number 规范化，与批量查询识别重复记录的规则一致；姓名去除首尾空白）"""
+    return (str(cert_type).strip(), normalize_cert_number(str(cert_number)), str(name).strip(), int(query_type))
+
+class ResultCache:
+    """
+    按状态设置有效期的查询结果缓存（SQLite）
+
+    bypass 为True时不读取缓存（每次都访问网站），但仍写入新结果，用于强制刷新
+    """
+
+    def __init__(self, path: str, ttls: dict = None, bypass: bool = False):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            ttls: 各状态的有效期（秒），与 DEFAULT_RESULT_TTLS 合并
+            bypass: 是否跳过缓存读取
+        """
+        self.path = path
+        self.ttls = dict(DEFAULT_RESULT_TTLS, **(ttls or {}))
+        self.bypass = bypass
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'bypassed': 0, 'stores': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' cert_type TEXT NOT NULL, cert_number TEXT NOT NULL, name TEXT NOT NULL, query_type INTEGER NOT NULL,'
+            ' status TEXT NOT NULL, result TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL,'
+            ' PRIMARY KEY (cert_type, cert_number, name, query_type))'
+        )
+        self._conn.commit()
+        removed = self.purge_expired()
+        print(f"已打开查询结果缓存: {path}（{self.size()} 条，清理过期 {removed} 条）")
+
+    def get(self, cert_type: str, cert_number: str, name: str, query_type: int):
+        """
+        查找未过期的缓存结果
+
+        Returns:
+            缓存的结果（增加 cached、cached_at 字段），未命中时返回None
+        """
+        with self._lock:
+            self.stats['lookups'] += 1
+            if self.bypass:
+                self.stats['bypassed'] += 1
+                return None
+            row = self._conn.execute(
+                'SELECT result, stored_at, expires_at FROM results'
+                ' WHERE cert_type=? AND cert_number=? AND name=? AND query_type=?',
+                cache_key(cert_type, cert_number, name, query_type)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            result_json, stored_at, expires_at = row
+            if expires_at <= time.time():
+                self.stats['misses'] += 1
+                self.stats['expired'] += 1
+                return None
+            self.stats['hits'] += 1
+
+        result = json.loads(result_json)
+        result['cached'] = True
+        result['cached_at'] = datetime.fromtimestamp(stored_at).strftime('%Y-%m-%d %H:%M:%S')
+        return result
+
+    def put(self, cert_type: str, cert_number: str, name: str, query_type: int, result: dict) -> bool:
+        """
+        保存查询结果（有效期为0的状态和缓存命中的结果不保存）
+
+        Returns:
+            是否已保存
+        """
+        ttl = self.ttls.get(result.get('status'), 0)
+        if ttl <= 0 or result.get('cached'):
+            return False
+        now = time.time()
+        result_json = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                cache_key(cert_type, cert_number, name, query_type) + (result['status'], result_json, now, now + ttl)
+            )
+            self._conn.commit()
+            self.stats['stores'] += 1
+        return True
+
+    def purge_expired(self) -> int:
+        """删除已过期的结果，返回删除的条数"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def size(self) -> int:
+        """缓存的结果条数（含未清理的过期结果）"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get_statistics(self) -> dict:
+        """缓存统计（含命中率）"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
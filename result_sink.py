@@ -0,0 +1,277 @@
+"""
+查询结果增量落盘
+每条结果完成后立即追加到JSONL文件（每行一个JSON对象），按批次调用fsync，
+进程崩溃时最多丢失正在写入的一行；汇总JSON和CSV在结束时逐行读取JSONL生成，不在内存中保留全部结果。
+批量查询的JSONL同时作为进度日志，中断后重新运行时据此跳过已完成的记录
+"""
+
+import csv
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from result_cache import normalize_cert_number
+
+def jsonl_path_for(result_path: str) -> str:
+    """结果JSON对应的JSONL文件路径"""
+    return os.path.splitext(result_path)[0] + '.jsonl'
+
+def _journal_prefix(csv_file: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(csv_file).encode('utf-8')).hexdigest()[:8]
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return f"{stem}_{digest}_"
+
+def journal_path_for(csv_file: str, directory: str) -> str:
+    """为输入CSV的本次运行创建带时间戳的进度日志路径（每次运行使用新的日志，不覆盖之前的结果）"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(directory, f"{_journal_prefix(csv_file)}{timestamp}.journal.jsonl")
+
+def latest_journal_for(csv_file: str, directory: str):
+    """输入CSV最近一次运行的进度日志路径，没有时返回None"""
+    pattern = os.path.join(glob.escape(directory), glob.escape(_journal_prefix(csv_file)) + '*.journal.jsonl')
+    journals = sorted(glob.glob(pattern))
+    return journals[-1] if journals else None
+
+def rotate_existing(path: str):
+    """文件已存在且不为空时改名保留（加时间戳后缀），返回新路径，否则返回None"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    rotated = f"{path}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    os.replace(path, rotated)
+    return rotated
+
+def _row_sort_key(row):
+    """按CSV行号排序，没有行号的结果排在最后"""
+    return (0, row) if isinstance(row, int) else (1, 0)
+
+class JsonlResultSink:
+    """
+    追加写入的JSONL结果文件
+
+    每条结果写入后立即 flush 到操作系统（进程崩溃不丢失），
+    每 fsync_every 条或距上次同步超过 fsync_interval 秒时 fsync（断电不丢失已同步的部分）
+    """
+
+    def __init__(self, path: str, fsync_every: int = 20, fsync_interval: float = 1.0, append: bool = True):
+        """
+        Args:
+            path: JSONL文件路径
+            fsync_every: 每写入多少条同步一次磁盘
+            fsync_interval: 两次同步的最长间隔（秒）
+            append: 文件已存在时在末尾追加，为False时清空重写
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 上次崩溃时写了一半的行没有换行符，先补上，避免与新写入的第一行连在一起
+        needs_newline = False
+        self._size = 0
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            self._size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        # 不转换换行符，使写入的字节数与文件位置一致（read 按位置读取）
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+        if needs_newline:
+            self._file.write('\n')
+            self._size += 1
+        self.stats = {'written': 0, 'fsyncs': 0, 'fsync_time': 0.0}
+
+    def write(self, result: dict) -> int:
+        """追加一条结果，返回该行在文件中的起始字节位置（供 read 读回）"""
+        line = json.dumps(result, ensure_ascii=False) + '\n'
+        with self._lock:
+            offset = self._size
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode('utf-8'))
+            self.count += 1
+            self.stats['written'] += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        return offset
+
+    def read(self, offset: int) -> dict:
+        """读回 write 返回的位置上的结果（已写入的行都已 flush，无需等待同步到磁盘）"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def _sync(self):
+        start = time.perf_counter()
+        os.fsync(self._file.fileno())
+        self.stats['fsyncs'] += 1
+        self.stats['fsync_time'] += time.perf_counter() - start
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """将已写入的结果同步到磁盘"""
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                self._file.flush()
+                self._sync()
+
+    def close(self):
+        """同步并关闭文件"""
+        self.sync()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+def iter_jsonl(path: str):
+    """
+    逐行读取JSONL结果文件
+
+    崩溃时写了一半的行无法解析，跳过并提示
+    """
+    if not path or not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"警告: {path} 第 {line_number} 行不完整，已跳过")
+
+def result_identity(result: dict):
+    """
+    结果对应的查询记录 (证件号码, 姓名, 查询类型)，与批量查询解析CSV行的规则一致；
+    缺少字段时返回None
+    """
+    try:
+        return (normalize_cert_number(str(result['cert_number'])), str(result['name']).strip(),
+                int(result['query_type']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def load_completed_rows(path: str, retry_statuses: tuple = ()) -> dict:
+    """
+    读取进度日志中已完成的CSV行
+
+    以批量查询写入的行号（row 字段）区分记录，同一个人在CSV中出现多次时每一行分别记录；
+    同时记录每行结果对应的 (证件号码, 姓名, 查询类型)，CSV在两次运行之间被修改或调整顺序时，
+    调用方只跳过行号和记录都一致的行
+
+    Args:
+        path: 进度日志（JSONL）路径
+        retry_statuses: 最后一次结果为这些状态的行视为未完成
+
+    Returns:
+        {行号: (证件号码, 姓名, 查询类型)}（所有已完成的行都保留在内存中）
+    """
+    latest = {}
+    for result in iter_jsonl(path):
+        if isinstance(result.get('row'), int):
+            latest[result['row']] = (result.get('status'), result_identity(result))
+    return {row: identity for row, (status, identity) in latest.items()
+            if status not in retry_statuses and identity is not None}
+
+def _iter_jsonl_offsets(path: str):
+    """逐行读取JSONL结果文件，产生 (行起始字节位置, 结果)，不完整的行跳过"""
+    if not path or not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            try:
+                yield start, json.loads(line)
+            except ValueError:
+                continue
+
+def iter_results(jsonl_paths: list, latest_only: bool = False):
+    """
+    按顺序逐条读取多个JSONL文件
+
+    latest_only 为True时每个CSV行（row 字段，断点续查时同一行可能有多次结果）只保留最后一次结果，
+    并按行号顺序输出：先扫描一遍记录各行最后一次结果所在的文件位置（内存中保留所有行号和位置），
+    再按行号逐条读取；没有行号的结果按原顺序排在最后
+    """
+    if not latest_only:
+        for path in jsonl_paths:
+            yield from iter_jsonl(path)
+        return
+
+    latest = {}
+    for path_index, path in enumerate(jsonl_paths):
+        for offset, result in _iter_jsonl_offsets(path):
+            row = result.get('row')
+            key = row if isinstance(row, int) else ('position', path_index, offset)
+            latest[key] = (path_index, offset)
+
+    files = [open(path, 'rb') if path and os.path.exists(path) else None for path in jsonl_paths]
+    try:
+        for key in sorted(latest, key=_row_sort_key):
+            path_index, offset = latest[key]
+            files[path_index].seek(offset)
+            yield json.loads(files[path_index].readline())
+    finally:
+        for f in files:
+            if f:
+                f.close()
+
+def write_json_report(jsonl_paths: list, output_path: str, results_key: str, fields: dict,
+                      count_key: str = None, latest_only: bool = False) -> int:
+    """
+    将一个或多个JSONL文件的结果逐条写入汇总JSON
+
+    Args:
+        jsonl_paths: JSONL文件路径列表（按顺序合并）
+        output_path: 汇总JSON路径
+        results_key: 结果列表的键名
+        fields: 汇总JSON的其他字段（写在结果列表之后）
+        count_key: 不为None时额外写入结果总数
+        latest_only: 同一条记录只保留最后一次结果（见 iter_results）
+
+    Returns:
+        结果总数
+    """
+    count = 0
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('{\n  ' + json.dumps(results_key) + ': [')
+        for result in iter_results(jsonl_paths, latest_only):
+            f.write((',\n    ' if count else '\n    ') + json.dumps(result, ensure_ascii=False))
+            count += 1
+        f.write('\n  ]')
+        if count_key:
+            fields = dict(fields, **{count_key: count})
+        for key, value in fields.items():
+            f.write(',\n  ' + json.dumps(key, ensure_ascii=False) + ': ' + json.dumps(value, ensure_ascii=False))
+        f.write('\n}\n')
+    os.replace(temp_path, output_path)
+    return count
+
+def write_csv_report(jsonl_paths: list, output_path: str, fieldnames: list, latest_only: bool = False) -> int:
+    """
+    将JSONL文件的结果逐条写入CSV（每条结果取 fieldnames 中的字段，latest_only 见 iter_results）
+
+    Returns:
+        写入的行数
+    """
+    count = 0
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for result in iter_results(jsonl_paths, latest_only):
+            writer.writerow({field: result.get(field, '') for field in fieldnames})
+            count += 1
+    return count
@@ -0,0 +1,172 @@
+"""
+查询截图策略
+决定每次查询保存哪些截图（不保存、只保存失败、只截结果区域、整页、抽样），截图格式可选PNG/JPEG/WebP并可缩小尺寸。
+缩放和重新编码交给调试图片写入线程进行，查询流程只承担浏览器截图本身的耗时；
+两部分耗时分别统计，用于评估每次查询保存截图的开销
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# 截图模式：
+#   off      不截图
+#   failures 只为失败/结果未知的查询截整页
+#   element  找到信息时只截结果区域，失败时截可见区域（不截整页）
+#   full     每次查询都截整页和结果区域
+#   sampled  与 full 相同的截图，由调试图片写入器抽样决定是否保存（默认）
+SCREENSHOT_MODES = ('off', 'failures', 'element', 'full', 'sampled')
+
+# 截图格式及文件扩展名
+SCREENSHOT_FORMATS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+def transcode_image(image_data: bytes, image_format: str, quality: int = 80, max_width: int = None) -> bytes:
+    """
+    将截图缩小到 max_width 宽度以内并编码为指定格式
+
+    Args:
+        image_data: 浏览器截图（PNG）
+        image_format: 'png'、'jpeg' 或 'webp'
+        quality: JPEG/WebP 编码质量（1-100）
+        max_width: 最大宽度（像素），为None时不缩放
+    """
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("无法解码截图")
+    height, width = image.shape[:2]
+    if max_width and width > max_width:
+        image = cv2.resize(image, (max_width, max(1, round(height * max_width / width))),
+                           interpolation=cv2.INTER_AREA)
+    if image_format == 'jpeg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = []
+    success, buffer = cv2.imencode(SCREENSHOT_FORMATS[image_format], image, params)
+    if not success:
+        raise ValueError(f"截图编码为 {image_format} 失败")
+    return buffer.tobytes()
+
+class ScreenshotPolicy:
+    """
+    查询截图策略
+
+    capture() 在页面上截图并返回交给 DebugImageWriter.save_group 的图片列表；
+    需要缩放或转换格式时，列表中是在写入线程中调用的编码函数
+    """
+
+    def __init__(self, mode: str = 'sampled', image_format: str = 'png', quality: int = 80, max_width: int = None):
+        """
+        Args:
+            mode: 截图模式，见 SCREENSHOT_MODES
+            image_format: 截图格式，'png'、'jpeg' 或 'webp'
+            quality: JPEG/WebP 编码质量（1-100）
+            max_width: 截图最大宽度（像素），超过时等比缩小，为None时保持原尺寸
+        """
+        if mode not in SCREENSHOT_MODES:
+            raise ValueError(f"未知的截图模式: {mode}，可选 {', '.join(SCREENSHOT_MODES)}")
+        if image_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"未知的截图格式: {image_format}，可选 {', '.join(SCREENSHOT_FORMATS)}")
+        self.mode = mode
+        self.image_format = image_format
+        self.quality = quality
+        self.max_width = max_width
+        self._lock = threading.Lock()
+        self.stats = {
+            'queries': 0,         # 经过截图策略的查询数
+            'captured': 0,        # 实际截图的查询数
+            'images': 0,          # 截图张数
+            'capture_time': 0.0,  # 页面截图耗时（在查询关键路径上）
+            'encodes': 0,         # 后台缩放/转换格式的张数
+            'encode_time': 0.0    # 后台缩放/转换格式耗时（不在查询关键路径上）
+        }
+
+    @property
+    def extension(self) -> str:
+        """截图文件扩展名"""
+        return SCREENSHOT_FORMATS[self.image_format]
+
+    def decide(self, failed: bool, debug_writer):
+        """
+        决定本次查询是否截图
+
+        Args:
+            failed: 查询是否失败或结果未知
+            debug_writer: 抽样模式下由其决定是否保存
+
+        Returns:
+            交给 DebugImageWriter.save_group 的 decision，不截图时返回None
+        """
+        with self._lock:
+            self.stats['queries'] += 1
+        if self.mode == 'off':
+            return None
+        if self.mode == 'failures':
+            return 'write' if failed else None
+        if self.mode == 'sampled':
+            return debug_writer.decide(failed)
+        return 'write'
+
+    async def capture(self, page, element, prefix: str) -> list:
+        """
+        按截图模式在页面上截图
+
+        Args:
+            page: 查询页面
+            element: 结果区域元素（没有时为None）
+            prefix: 截图文件路径前缀
+
+        Returns:
+            [(路径, 图片字节或编码函数), ...]（截图失败时只包含已完成的截图）
+        """
+        start = time.perf_counter()
+        images = []
+        try:
+            if self.mode == 'element':
+                if element:
+                    images.append((f"{prefix}_结果截图{self.extension}", await self._screenshot(element)))
+                else:
+                    images.append((f"{prefix}_截图{self.extension}", await self._screenshot(page)))
+            else:
+                images.append((f"{prefix}_截图{self.extension}", await self._screenshot(page, full_page=True)))
+                if element and self.mode != 'failures':
+                    images.append((f"{prefix}_结果截图{self.extension}", await self._screenshot(element)))
+        except Exception as e:
+            # 保留截图失败前已完成的截图
+            print(f"截图失败: {e}")
+        finally:
+            with self._lock:
+                self.stats['captured'] += 1
+                self.stats['images'] += len(images)
+                self.stats['capture_time'] += time.perf_counter() - start
+        return images
+
+    async def _screenshot(self, target, **kwargs):
+        """截图；原尺寸JPEG直接由浏览器编码，其余需要缩放或转换格式的截图返回后台编码函数"""
+        if self.image_format == 'jpeg' and not self.max_width:
+            return await target.screenshot(type='jpeg', quality=self.quality, **kwargs)
+        image_data = await target.screenshot(**kwargs)
+        if self.image_format == 'png' and not self.max_width:
+            return image_data
+        return lambda: self._transcode(image_data)
+
+    def _transcode(self, image_data: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            return transcode_image(image_data, self.image_format, self.quality, self.max_width)
+        finally:
+            with self._lock:
+                self.stats['encodes'] += 1
+                self.stats['encode_time'] += time.perf_counter() - start
+
+    def get_statistics(self) -> dict:
+        """截图统计（含每次查询的平均截图耗时和每张图片的平均后台编码耗时）"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['mode'] = self.mode
+        stats['avg_capture_time_per_query'] = stats['capture_time'] / stats['queries'] if stats['queries'] else 0.0
+        stats['avg_encode_time'] = stats['encode_time'] / stats['encodes'] if stats['encodes'] else 0.0
+        return stats
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分片批量查询
+将大型CSV文件按行切分为多个分片，每个进程拥有独立的 ImprovedCertificateChecker 和浏览器，
+全部完成后将各分片的结果（JSONL）和统计信息逐条合并为与 batch_query_from_csv 相同格式的报告
+"""
+
+import asyncio
+import csv
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from enhanced_captcha_recognizer import preload_ocr_models
+from improved_certificate_checker import ImprovedCertificateChecker, merge_statistics, save_batch_report
+from result_sink import JsonlResultSink, iter_jsonl, jsonl_path_for
+
+def split_csv(csv_file: str, shard_count: int, shard_dir: str) -> list:
+    """
+    将CSV文件按连续行切分为多个分片文件，保留表头
+
+    Args:
+        csv_file: 输入CSV文件
+        shard_count: 分片数量
+        shard_dir: 分片文件保存目录
+
+    Returns:
+        [(分片文件路径, 分片第一行之前的数据行数), ...]（按原始顺序）。分片内的行号从1开始，
+        加上该偏移量即为原始CSV中的行号
+    """
+    # 第一遍只统计行数，避免将整个文件读入内存
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        total_rows = sum(1 for _ in reader)
+
+    if header is None or total_rows == 0:
+        return []
+
+    shard_count = max(1, min(shard_count, total_rows))
+    rows_per_shard = math.ceil(total_rows / shard_count)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shard_files = []
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+
+        shard_file = None
+        writer = None
+        for row_index, row in enumerate(reader):
+            if row_index % rows_per_shard == 0:
+                if shard_file:
+                    shard_file.close()
+                shard_path = os.path.join(shard_dir, f"shard_{len(shard_files):03d}.csv")
+                shard_files.append((shard_path, row_index))
+                shard_file = open(shard_path, 'w', encoding='utf-8', newline='')
+                writer = csv.writer(shard_file)
+                writer.writerow(header)
+            writer.writerow(row)
+
+        if shard_file:
+            shard_file.close()
+
+    return shard_files
+
+def _run_shard(shard_csv: str, result_path: str, cert_type: str, default_query_type: int,
+               delay: int, concurrency: int, headless: bool, stream: bool, result_cache_path: str) -> tuple:
+    """子进程入口：使用独立的查询器和浏览器处理一个分片"""
+    return asyncio.run(_run_shard_async(
+        shard_csv, result_path, cert_type, default_query_type, delay, concurrency, headless, stream, result_cache_path
+    ))
+
+async def _run_shard_async(shard_csv: str, result_path: str, cert_type: str, default_query_type: int,
+                           delay: int, concurrency: int, headless: bool, stream: bool,
+                           result_cache_path: str) -> tuple:
+    checker = ImprovedCertificateChecker(result_cache_path=result_cache_path)
+    try:
+        await checker.initialize(headless=headless)
+        await checker.batch_query_from_csv(
+            csv_file=shard_csv,
+            cert_type=cert_type,
+            default_query_type=default_query_type,
+            delay=delay,
+            concurrency=concurrency,
+            result_path=result_path,
+            stream=stream,
+            journal_path=jsonl_path_for(result_path)
+        )
+        return checker.last_batch_result_path, checker.get_statistics()
+    finally:
+        await checker.close()
+
+def merge_shard_reports(shard_outputs: list, result_path: str, start_time: float, row_offsets: list = None) -> str:
+    """
+    合并各分片的结果，生成最终报告
+    各分片的结果逐条写入与报告同名的合并JSONL（分片内的行号 row 加上分片偏移量换算为原始CSV行号），
+    再由合并JSONL生成报告，不将全部结果读入内存
+
+    Args:
+        shard_outputs: 各分片的 (结果JSON路径, 统计信息) 列表（按原始顺序）
+        result_path: 最终报告路径
+        start_time: 整体开始时间，用于计算总用时
+        row_offsets: 各分片第一行之前的数据行数（split_csv 的返回值），为None时不换算行号
+
+    Returns:
+        最终报告路径
+    """
+    statistics = {
+        'captcha_success_rate': 0,
+        'total_time': 0.0,
+        'start_time': start_time
+    }
+
+    merged_sink = JsonlResultSink(jsonl_path_for(result_path), append=False)
+    try:
+        for index, (shard_path, shard_statistics) in enumerate(shard_outputs):
+            shard_jsonl = jsonl_path_for(shard_path) if shard_path else None
+            if not shard_jsonl or not os.path.exists(shard_jsonl):
+                print(f"警告: 分片结果缺失，已跳过: {shard_path}")
+                continue
+            offset = row_offsets[index] if row_offsets else 0
+            for result in iter_jsonl(shard_jsonl):
+                if isinstance(result.get('row'), int):
+                    result['row'] += offset
+                merged_sink.write(result)
+            merge_statistics(statistics, shard_statistics)
+    finally:
+        merged_sink.close()
+
+    statistics['total_time'] = time.time() - start_time
+    return save_batch_report(result_path, [merged_sink.path], statistics)
+
+def run_sharded_batch(csv_file: str, shard_count: int = 4, cert_type: str = "身份证",
+                      default_query_type: int = 1, delay: int = 3, concurrency: int = 1,
+                      headless: bool = True, results_dir: str = "查询结果",
+                      preload_models: bool = True, stream: bool = False, result_cache_path: str = None) -> str:
+    """
+    多进程分片批量查询
+
+    Args:
+        csv_file: 输入CSV文件
+        shard_count: 进程（分片）数量
+        cert_type: 证件类型
+        default_query_type: CSV中没有查询类型列时的默认值
+        delay: 查询间隔（秒）
+        concurrency: 每个进程内的并发页面数
+        headless: 是否无头模式运行浏览器
+        results_dir: 结果保存目录
+        preload_models: 是否在子进程启动时预加载OCR模型（否则在首次识别时加载）。
+                        子进程始终以spawn方式创建并各自加载模型：ONNX Runtime 的线程池不能安全地跨fork使用，
+                        在父进程加载模型后fork，子进程推理时可能死锁
+        stream: 各分片是否使用流式模式（见 batch_query_from_csv）
+        result_cache_path: 查询结果缓存文件（各进程共享同一个SQLite数据库），为None时不使用缓存
+
+    Returns:
+        合并后的报告路径
+    """
+    start_time = time.time()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    shard_dir = os.path.join(results_dir, f"shards_{timestamp}")
+
+    shards = split_csv(csv_file, shard_count, shard_dir)
+    if not shards:
+        print(f"{csv_file} 中没有可查询的记录")
+        return None
+    shard_files = [shard_csv for shard_csv, _ in shards]
+    row_offsets = [offset for _, offset in shards]
+
+    print(f"已将 {csv_file} 切分为 {len(shard_files)} 个分片，启动 {len(shard_files)} 个查询进程")
+
+    shard_result_paths = [
+        os.path.join(shard_dir, f"shard_{index:03d}_results.json") for index in range(len(shard_files))
+    ]
+
+    # 子进程以spawn方式创建，各自加载OCR模型、启动Playwright和浏览器（父进程不创建ONNX Runtime会话）
+    with ProcessPoolExecutor(max_workers=len(shard_files),
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=preload_ocr_models if preload_models else None) as executor:
+        futures = [
+            executor.submit(_run_shard, shard_csv, shard_result_path, cert_type,
+                            default_query_type, delay, concurrency, headless, stream, result_cache_path)
+            for shard_csv, shard_result_path in zip(shard_files, shard_result_paths)
+        ]
+
+        shard_outputs = []
+        for index, future in enumerate(futures):
+            try:
+                shard_outputs.append(future.result())
+                print(f"分片 {index} 查询完成")
+            except Exception as e:
+                print(f"分片 {index} 查询失败: {e}")
+                # 进程中途失败时，分片JSONL中已完成的结果仍然合并（统计信息缺失）
+                shard_outputs.append((shard_result_paths[index], {}))
+
+    result_path = os.path.join(results_dir, f"batch_query_results_{timestamp}.json")
+    merge_shard_reports(shard_outputs, result_path, start_time, row_offsets)
+    print(f"\n分片批量查询完成，合并结果已保存到: {result_path}")
+    return result_path
+
+if __name__ == "__main__":
+    csv_file = "证书查询样例.csv"
+    if os.path.exists(csv_file):
+        run_sharded_batch(csv_file, shard_count=2, cert_type="身份证", default_query_type=1, delay=3)
+    else:
+        print(f"CSV文件不存在: {csv_file}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地查询接口模拟服务
+按 query_api 中约定的接口地址和字段模拟验证码接口和查询接口，
+用于在不访问官方网站的情况下验证直连接口查询引擎
+"""
+
+import asyncio
+import base64
+import random
+import uuid
+import cv2
+import numpy as np
+from aiohttp import web
+from query_api import API_ENDPOINTS, QUERY_FIELDS
+
+# 模拟数据：证件号码 -> 姓名
+KNOWN_CERTIFICATES = {
+    '110101199001011234': '张三',
+    '310101199201022345': '李四'
+}
+
+def render_captcha(code: str) -> bytes:
+    """生成4位数字验证码PNG图片"""
+    image = np.full((40, 100, 3), 255, dtype=np.uint8)
+    for index, digit in enumerate(code):
+        cv2.putText(image, digit, (8 + index * 22, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0,
+                    (random.randint(0, 80), random.randint(0, 80), random.randint(0, 80)), 2)
+    ok, buffer = cv2.imencode('.png', image)
+    return buffer.tobytes()
+
+class StubQueryServer:
+    """
+    查询接口模拟服务
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765):
+        self.host = host
+        self.port = port
+        self.captcha_codes = {}
+        self.runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def handle_captcha(self, request):
+        code = ''.join(random.choice('0123456789') for _ in range(4))
+        captcha_id = uuid.uuid4().hex
+        self.captcha_codes[captcha_id] = code
+        img = base64.b64encode(render_captcha(code)).decode()
+        return web.json_response({'code': 200, 'data': {'img': f"data:image/png;base64,{img}", 'uuid': captcha_id}})
+
+    async def handle_query(self, request):
+        body = await request.json()
+        captcha_id = body.get(QUERY_FIELDS['captcha_id'])
+        expected = self.captcha_codes.pop(captcha_id, None)
+        if not expected or body.get(QUERY_FIELDS['captcha']) != expected:
+            return web.json_response({'code': 500, 'msg': '验证码错误'})
+
+        cert_number = body.get(QUERY_FIELDS['cert_number'], '')
+        name = body.get(QUERY_FIELDS['name'], '')
+        if len(cert_number) != 18:
+            return web.json_response({'code': 400, 'msg': '证件号码格式错误'})
+
+        if KNOWN_CERTIFICATES.get(cert_number) == name:
+            record = {'name': name, 'certNo': cert_number, 'operationItem': '低压电工作业', 'status': '有效'}
+            return web.json_response({'code': 200, 'data': {'list': [record]}})
+        return web.json_response({'code': 200, 'data': {'list': []}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(API_ENDPOINTS['captcha'], self.handle_captcha)
+        for path in API_ENDPOINTS['query'].values():
+            app.router.add_post(path, self.handle_query)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"模拟查询服务已启动: {self.base_url}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+async def main():
+    """启动模拟服务并用直连接口引擎执行示例查询"""
+    from enhanced_captcha_recognizer import EnhancedCaptchaRecognizer
+    from http_query_engine import HttpQueryEngine
+
+    server = StubQueryServer()
+    await server.start()
+
+    engine = HttpQueryEngine(EnhancedCaptchaRecognizer(), base_url=server.base_url)
+    try:
+        samples = [
+            ('110101199001011234', '张三', 1),
+            ('310101199201022345', '王五', 2),
+            ('12345', '赵六', 1)
+        ]
+        for cert_number, name, query_type in samples:
+            result = await engine.query_single_certificate('身份证', cert_number, name, query_type)
+            print(f"{name} ({cert_number}): {result['status']} - {result['data']}")
+    finally:
+        await engine.close()
+        await server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
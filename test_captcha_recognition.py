@@ -18,7 +18,7 @@ class CaptchaRecognitionTester:
     """
     
     def __init__(self):
-        self.recognizer = EnhancedCaptchaRecognizer()
+        self.recognizer = EnhancedCaptchaRecognizer(save_images=False)
         self.browser = None
         self.page = None
         self.test_results = []
@@ -69,17 +69,17 @@ class CaptchaRecognitionTester:
             dict: 测试结果
         """
         try:
-            # 获取验证码
-            captcha_result = await self.recognizer.get_captcha_from_page(self.page)
+            # 获取验证码图片
+            image_data = await self.recognizer.fetch_captcha_image(self.page)
             
-            if not captcha_result['success']:
+            if not image_data:
                 return {
                     'success': False,
-                    'error': captcha_result['error'],
+                    'error': '无法获取验证码图片',
                     'timestamp': datetime.now().isoformat()
                 }
             
-            # 保存验证码图片（可选）
+            # 保存验证码图片（可选，可标注后用于 captcha_benchmark.py 离线测试）
             image_path = None
             if save_image:
                 os.makedirs('test_captcha', exist_ok=True)
@@ -87,26 +87,24 @@ class CaptchaRecognitionTester:
                 image_path = f'test_captcha/captcha_{timestamp}.png'
                 
                 with open(image_path, 'wb') as f:
-                    f.write(captcha_result['image_data'])
+                    f.write(image_data)
             
             # 识别验证码
-            recognition_result = await self.recognizer.recognize_with_retry(
-                captcha_result['image_data'],
-                max_retries=1  # 单次测试不重试
-            )
+            start_time = time.time()
+            text, confidence = await self.recognizer.recognize_async(image_data)
+            processing_time = time.time() - start_time
             
             result = {
-                'success': recognition_result['success'],
-                'recognized_text': recognition_result.get('text', ''),
-                'confidence': recognition_result.get('confidence', 0),
-                'method_used': recognition_result.get('method', ''),
-                'processing_time': recognition_result.get('processing_time', 0),
+                'success': bool(text) and confidence >= self.recognizer.min_confidence,
+                'recognized_text': text or '',
+                'confidence': confidence,
+                'processing_time': processing_time,
                 'image_path': image_path,
                 'timestamp': datetime.now().isoformat()
             }
             
-            if not recognition_result['success']:
-                result['error'] = recognition_result.get('error', 'Unknown error')
+            if not result['success']:
+                result['error'] = '识别失败' if not text else f'置信度较低: {text} ({confidence:.2f})'
                 
             return result
             
@@ -141,9 +139,8 @@ class CaptchaRecognitionTester:
             # 刷新验证码
             if i > 0:
                 try:
-                    await self.page.click('.yzm-style-img')
-                    await asyncio.sleep(1)
-                except:
+                    await self.recognizer.refresh_captcha(self.page)
+                except Exception:
                     pass
             
             # 测试识别
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直连接口查询引擎测试
+启动本地模拟服务，检查找到信息、未找到信息、验证码错误重试以及接口变化时回退到浏览器查询
+
+运行: python -m unittest test_http_query_engine
+"""
+
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from http_query_engine import HttpQueryEngine
+from query_api import ContractChangedError
+from stub_query_server import StubQueryServer
+
+def free_port() -> int:
+    """获取一个空闲的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class StubRecognizer:
+    """
+    按模拟服务最近下发的验证码作答的识别器
+    wrong_answers 次之前的回答故意答错，用于检查验证码错误后的重试
+    """
+
+    def __init__(self, server: StubQueryServer, wrong_answers: int = 0):
+        self.server = server
+        self.wrong_answers = wrong_answers
+        self.min_confidence = 0.3
+        self.feedback = []
+
+    async def recognize_async(self, image_data: bytes):
+        code = list(self.server.captcha_codes.values())[-1]
+        if self.wrong_answers > 0:
+            self.wrong_answers -= 1
+            return ('0000' if code != '0000' else '1111'), 0.9
+        return code, 0.9
+
+    def record_feedback(self, captcha_text: str, correct: bool):
+        self.feedback.append((captcha_text, correct))
+
+class BrokenCaptchaServer(StubQueryServer):
+    """验证码接口返回无法解码的base64内容的模拟服务"""
+
+    async def handle_captcha(self, request):
+        return web.json_response({'code': 200, 'data': {'img': 'abc', 'uuid': 'broken'}})
+
+class ChangedQueryServer(StubQueryServer):
+    """查询接口返回字段已变化的模拟服务"""
+
+    async def handle_query(self, request):
+        await request.json()
+        return web.json_response({'code': 200, 'data': {'result': []}})
+
+class HttpQueryEngineTest(unittest.IsolatedAsyncioTestCase):
+
+    async def start_server(self, server_class=StubQueryServer) -> StubQueryServer:
+        server = server_class(port=free_port())
+        await server.start()
+        self.addAsyncCleanup(server.stop)
+        return server
+
+    async def start_engine(self, server: StubQueryServer, recognizer) -> HttpQueryEngine:
+        engine = HttpQueryEngine(recognizer, base_url=server.base_url, timeout=5)
+        self.addAsyncCleanup(engine.close)
+        return engine
+
+    async def test_found(self):
+        server = await self.start_server()
+        engine = await self.start_engine(server, StubRecognizer(server))
+        result = await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+        self.assertEqual(result['status'], 'found')
+        self.assertEqual(result['engine'], 'http')
+        self.assertEqual(result['captcha_attempts'], 1)
+
+    async def test_not_found(self):
+        server = await self.start_server()
+        engine = await self.start_engine(server, StubRecognizer(server))
+        result = await engine.query_single_certificate('身份证', '310101199201022345', '王五', 2)
+        self.assertEqual(result['status'], 'not_found')
+
+    async def test_captcha_wrong_retries(self):
+        server = await self.start_server()
+        recognizer = StubRecognizer(server, wrong_answers=2)
+        engine = await self.start_engine(server, recognizer)
+        result = await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+        self.assertEqual(result['status'], 'found')
+        self.assertEqual(result['captcha_attempts'], 3)
+        self.assertEqual([correct for _, correct in recognizer.feedback], [False, False, True])
+
+    async def test_captcha_wrong_exhausts_attempts(self):
+        server = await self.start_server()
+        engine = await self.start_engine(server, StubRecognizer(server, wrong_answers=10))
+        engine.max_captcha_attempts = 2
+        result = await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+        self.assertEqual(result['status'], 'captcha_failed')
+        self.assertEqual(result['captcha_attempts'], 2)
+
+    async def test_undecodable_captcha_is_contract_change(self):
+        server = await self.start_server(BrokenCaptchaServer)
+        engine = await self.start_engine(server, StubRecognizer(server))
+        with self.assertRaises(ContractChangedError):
+            await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+
+    async def test_changed_query_payload_is_contract_change(self):
+        server = await self.start_server(ChangedQueryServer)
+        engine = await self.start_engine(server, StubRecognizer(server))
+        with self.assertRaises(ContractChangedError):
+            await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+
+    async def test_record_keys_override(self):
+        """返回字段与默认约定不同时，通过 record_keys 覆盖后可以正常分类"""
+        server = await self.start_server(ChangedQueryServer)
+        engine = HttpQueryEngine(StubRecognizer(server), base_url=server.base_url, timeout=5, record_keys=('result',))
+        self.addAsyncCleanup(engine.close)
+        result = await engine.query_single_certificate('身份证', '110101199001011234', '张三', 1)
+        self.assertEqual(result['status'], 'not_found')
+
+    async def test_checker_falls_back_to_browser(self):
+        """接口变化时所有工作者停用直连引擎，共用主查询器启动的一个浏览器"""
+        from improved_certificate_checker import ImprovedCertificateChecker
+
+        server = await self.start_server(BrokenCaptchaServer)
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(workdir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        checker = ImprovedCertificateChecker(engine='http', http_engine_options={'base_url': server.base_url})
+        self.addAsyncCleanup(checker.http_engine.close)
+        workers = [checker._create_worker() for _ in range(3)]
+        for worker in workers:
+            self.addAsyncCleanup(worker._close_worker)
+
+        async def launch_browser(headless):
+            # 模拟启动浏览器：工作者在其中创建各自的上下文
+            checker.browser = mock.MagicMock()
+            checker.browser.new_context = mock.AsyncMock(return_value=mock.MagicMock(
+                new_page=mock.AsyncMock(return_value=mock.MagicMock()), close=mock.AsyncMock()))
+            checker.page = mock.MagicMock()
+
+        with mock.patch.object(checker, '_launch_browser', side_effect=launch_browser) as launch:
+            results = await asyncio.gather(*(
+                worker._query_via_http('身份证', '110101199001011234', '张三', 1) for worker in workers
+            ))
+        self.assertEqual(results, [None, None, None])
+        # 停用标志由主查询器和所有工作者共享，整个批量查询只启动一个浏览器
+        self.assertTrue(checker._http_engine_disabled)
+        self.assertTrue(all(worker._http_engine_disabled for worker in workers))
+        launch.assert_awaited_once()
+        self.assertTrue(all(worker.browser is checker.browser and worker.page for worker in workers))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源拦截规则测试
+检查放行规则按资源类型和主机名+路径前缀匹配：第三方地址中带有验证码字样时仍被拦截，
+网站自身的验证码（路径调整后）和接口调用始终放行
+
+运行: python -m unittest test_resource_blocker
+"""
+
+import unittest
+
+from resource_blocker import ResourceBlocker, SITE_HOST
+
+class ResourceBlockerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.blocker = ResourceBlocker()
+
+    def test_third_party_captcha_substring_is_blocked(self):
+        """第三方地址的查询参数或路径中带有 captcha 字样不会被误放行"""
+        self.assertTrue(self.blocker.should_block('https://hm.baidu.com/hm.gif?si=captcha', 'image'))
+        self.assertTrue(self.blocker.should_block('https://cdn.example.com/img/captcha-banner.png', 'image'))
+        self.assertTrue(self.blocker.should_block('https://hm.baidu.com/hm.js?code=1', 'script'))
+
+    def test_site_captcha_and_api_are_allowed(self):
+        """网站自身的验证码换成不含关键字的路径后仍然放行，接口调用始终放行"""
+        self.assertFalse(self.blocker.should_block(f"https://{SITE_HOST}/auth/picture?t=1", 'image'))
+        self.assertFalse(self.blocker.should_block(f"https://{SITE_HOST}/prod-api/query", 'xhr'))
+        self.assertFalse(self.blocker.should_block(f"https://{SITE_HOST}/", 'document'))
+
+    def test_site_fonts_are_blocked(self):
+        self.assertTrue(self.blocker.should_block(f"https://{SITE_HOST}/static/font.woff2", 'font'))
+
+    def test_custom_allow_rule(self):
+        """验证码改由其他域名提供时，通过 allow_rules 按前缀放行"""
+        blocker = ResourceBlocker(allow_rules=((('image',), 'captcha.example.com/img/'),))
+        self.assertFalse(blocker.should_block('https://captcha.example.com/img/1.png', 'image'))
+        self.assertTrue(blocker.should_block('https://captcha.example.com/other/1.png', 'image'))
+        self.assertTrue(blocker.should_block('https://captcha.example.com/img/1.woff', 'font'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分片批量查询的切分与合并测试
+不启动浏览器：按切分结果为每个分片写入模拟的结果JSONL，检查合并报告中的行号唯一且完整
+
+运行: python -m unittest test_sharded_batch_runner
+"""
+
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from result_sink import JsonlResultSink, iter_results, jsonl_path_for
+from sharded_batch_runner import merge_shard_reports, split_csv
+
+class ShardMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.csv_file = os.path.join(self.workdir, 'input.csv')
+        with open(self.csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['证件号码', '姓名', '查询类型'])
+            for index in range(1, 11):
+                writer.writerow([f"1101011990010{index:05d}", f"姓名{index}", 1])
+
+    def write_shard_results(self, shards: list) -> list:
+        """模拟各分片的查询结果：分片内行号从1开始，与 batch_query_from_csv 写入的一致"""
+        shard_outputs = []
+        for index, (shard_csv, _) in enumerate(shards):
+            result_path = os.path.join(self.workdir, f"shard_{index:03d}_results.json")
+            sink = JsonlResultSink(jsonl_path_for(result_path))
+            with open(shard_csv, 'r', encoding='utf-8') as f:
+                for row, record in enumerate(csv.DictReader(f), 1):
+                    sink.write({'row': row, 'cert_number': record['证件号码'], 'name': record['姓名'],
+                                'status': 'not_found'})
+            sink.close()
+            shard_outputs.append((result_path, {'total_queries': row}))
+        return shard_outputs
+
+    def test_split_offsets(self):
+        shards = split_csv(self.csv_file, 3, os.path.join(self.workdir, 'shards'))
+        self.assertEqual([offset for _, offset in shards], [0, 4, 8])
+
+    def test_merged_rows_are_unique_and_complete(self):
+        shards = split_csv(self.csv_file, 3, os.path.join(self.workdir, 'shards'))
+        shard_outputs = self.write_shard_results(shards)
+        result_path = os.path.join(self.workdir, 'merged.json')
+
+        merge_shard_reports(shard_outputs, result_path, time.time(), [offset for _, offset in shards])
+
+        with open(result_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual([result['row'] for result in report['results']], list(range(1, 11)))
+        self.assertEqual(report['results'][6]['name'], '姓名7')
+        self.assertEqual(report['statistics']['total_queries'], 10)
+
+        # 按行号只保留最后一次结果时（断点续查的报告方式）也不会丢失结果
+        latest = list(iter_results([jsonl_path_for(result_path)], latest_only=True))
+        self.assertEqual([result['row'] for result in latest], list(range(1, 11)))
+
+if __name__ == "__main__":
+    unittest.main()